@@ -0,0 +1,89 @@
+{#
+  Latest-state compaction of a CDC events view (one row per key).
+
+  First run: latest event per key over the whole history.
+  Incremental runs: only events ingested since the table's high-water mark
+  (max ingested_at, minus a lookback for late-committing loads) are parsed,
+  unioned with the current silver rows for the same keys, and the newest
+  wins by source_ts_ms / kafka_offset. Use with
+  incremental_strategy='delete+insert' and a post_hook that removes keys
+  whose latest event is a delete (cdc_operation = 'd').
+
+  Lookback: var('silver_lookback', '1 hour').
+#}
+{% macro cdc_silver(events_relation, key) %}
+
+with new_events as (
+    select * from {{ events_relation }}
+    {% if is_incremental() %}
+    where ingested_at > (
+        select coalesce(max(ingested_at), '-infinity'::timestamp) from {{ this }}
+    ) - interval '{{ var("silver_lookback", "1 hour") }}'
+    {% endif %}
+),
+
+candidates as (
+    select * from new_events
+    {% if is_incremental() %}
+    union all
+    select * from {{ this }}
+    where {{ key }} in (select {{ key }} from new_events)
+    {% endif %}
+)
+
+select distinct on ({{ key }}) *
+from candidates
+where {{ key }} is not null
+order by {{ key }}, source_ts_ms desc nulls last, kafka_offset desc, ingested_at desc
+
+{% endmacro %}
+
+
+{#
+  Prune bronze CDC rows superseded by a newer event for the same key.
+  Silver tables only need the latest event per key, so older ones can go;
+  with archive=true they are moved to bronze.<table>_archive first.
+
+  dbt run-operation prune_superseded_cdc --args '{bronze_table: product_availability_cdc}'
+#}
+{% macro prune_superseded_cdc(bronze_table, key_field='ID', archive=true) %}
+
+{% set key_expr -%}
+coalesce(cdc_payload->'payload'->'after'->>'{{ key_field }}', cdc_payload->'payload'->'before'->>'{{ key_field }}')
+{%- endset %}
+
+{% set prune_sql %}
+    {% if archive %}
+    create table if not exists bronze.{{ bronze_table }}_archive (like bronze.{{ bronze_table }});
+    {% endif %}
+
+    with ranked as (
+        select
+            id,
+            row_number() over (
+                partition by {{ key_expr }}
+                order by (cdc_payload->'payload'->'source'->>'ts_ms')::bigint desc nulls last, kafka_offset desc
+            ) as rn
+        from bronze.{{ bronze_table }}
+        where {{ key_expr }} is not null
+    ),
+
+    superseded as (
+        delete from bronze.{{ bronze_table }} b
+        using ranked r
+        where b.id = r.id and r.rn > 1
+        returning b.*
+    )
+
+    {% if archive %}
+    insert into bronze.{{ bronze_table }}_archive
+    select * from superseded;
+    {% else %}
+    select count(*) from superseded;
+    {% endif %}
+{% endset %}
+
+{% do run_query(prune_sql) %}
+{% do log("Pruned superseded rows from bronze." ~ bronze_table ~ (" (archived)" if archive else ""), info=true) %}
+
+{% endmacro %}
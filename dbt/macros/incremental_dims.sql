@@ -0,0 +1,45 @@
+{#
+  Helpers for the incremental product marts (dim_product, dim_product_search).
+
+  Incremental runs rebuild only products whose silver row or dependent rows
+  (availability, original numbers, analogues) have a CDC source_ts_ms newer
+  than the mart's watermark (max cdc_watermark_ms, minus var('dim_lookback_ms')
+  for events that land late). Every var('dim_full_rebuild_days') days the
+  whole catalog is recomputed in place (delete+insert of every product), which
+  also refreshes date-derived columns and catches hard deletes and rows that
+  moved between products; the table and its indexes are never dropped.
+#}
+
+{% macro dim_full_rebuild_due() %}
+    {% if not is_incremental() %}
+        {{ return(true) }}
+    {% endif %}
+    {% if not execute %}
+        {{ return(false) }}
+    {% endif %}
+    {% set result = run_query("select extract(epoch from now() - min(refreshed_at)) / 86400 from " ~ this) %}
+    {% set age_days = result.columns[0].values()[0] %}
+    {{ return(age_days is none or age_days >= var('dim_full_rebuild_days', 7)) }}
+{% endmacro %}
+
+
+{% macro changed_product_ids() %}
+    {%- set since -%}
+        (select coalesce(max(cdc_watermark_ms), 0) - {{ var('dim_lookback_ms', 3600000) }} from {{ this }})
+    {%- endset %}
+    select product_id from {{ ref('silver_product') }} where source_ts_ms > {{ since }}
+    union
+    select product_i_d from {{ ref('silver_product_availability') }} where source_ts_ms > {{ since }}
+    union
+    select product_i_d from {{ ref('silver_product_original_number') }} where source_ts_ms > {{ since }}
+    union
+    select base_product_i_d from {{ ref('silver_product_analogue') }} where source_ts_ms > {{ since }}
+{% endmacro %}
+
+
+{#- Filter a CTE to the changed products (no-op on full rebuilds) -#}
+{% macro only_changed_products(column, full_rebuild) %}
+    {%- if not full_rebuild -%}
+    and {{ column }} in (select product_id from changed_products)
+    {%- endif -%}
+{% endmacro %}
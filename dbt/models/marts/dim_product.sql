@@ -1,13 +1,23 @@
 {{
   config(
-    materialized='table',
-    schema='marts'
+    materialized='incremental',
+    schema='marts',
+    unique_key='product_id',
+    incremental_strategy='delete+insert',
+    post_hook="delete from {{ this }} d where not exists (select 1 from {{ ref('silver_product') }} p where p.product_id = d.product_id and p.deleted = false)"
   )
 }}
 
-with product_base as (
-    select * from {{ ref('stg_product') }}
+{% set full_rebuild = dim_full_rebuild_due() %}
+
+with {% if not full_rebuild %}changed_products as (
+    {{ changed_product_ids() }}
+),
+
+{% endif %}product_base as (
+    select * from {{ ref('silver_product') }}
     where deleted = false
+    {{ only_changed_products('product_id', full_rebuild) }}
 ),
 
 -- Aggregate availability by product across all storages
@@ -16,9 +26,11 @@ availability_agg as (
         product_i_d as product_id,
         sum(amount) as total_available_amount,
         max(case when amount > 0 then 1 else 0 end)::boolean as is_available,
-        count(distinct storage_i_d) as storage_count
-    from {{ ref('stg_product_availability') }}
+        count(distinct storage_i_d) as storage_count,
+        max(source_ts_ms) as max_source_ts_ms
+    from {{ ref('silver_product_availability') }}
     where deleted = false
+    {{ only_changed_products('product_i_d', full_rebuild) }}
     group by product_i_d
 ),
 
@@ -26,9 +38,11 @@ availability_agg as (
 original_numbers_agg as (
     select
         product_i_d as product_id,
-        array_agg(distinct original_number_i_d) filter (where original_number_i_d is not null) as original_number_ids
-    from {{ ref('stg_product_original_number') }}
+        array_agg(distinct original_number_i_d) filter (where original_number_i_d is not null) as original_number_ids,
+        max(source_ts_ms) as max_source_ts_ms
+    from {{ ref('silver_product_original_number') }}
     where deleted = false
+    {{ only_changed_products('product_i_d', full_rebuild) }}
     group by product_i_d
 ),
 
@@ -36,9 +50,11 @@ original_numbers_agg as (
 analogues_agg as (
     select
         base_product_i_d as product_id,
-        array_agg(distinct analogue_product_i_d) filter (where analogue_product_i_d is not null) as analogue_product_ids
-    from {{ ref('stg_product_analogue') }}
+        array_agg(distinct analogue_product_i_d) filter (where analogue_product_i_d is not null) as analogue_product_ids,
+        max(source_ts_ms) as max_source_ts_ms
+    from {{ ref('silver_product_analogue') }}
     where deleted = false
+    {{ only_changed_products('base_product_i_d', full_rebuild) }}
     group by base_product_i_d
 ),
 
@@ -138,7 +154,8 @@ enriched as (
 
         -- Metadata
         p.source_timestamp,
-        p.ingested_at
+        p.ingested_at,
+        greatest(p.source_ts_ms, av.max_source_ts_ms, on_agg.max_source_ts_ms, an_agg.max_source_ts_ms) as cdc_watermark_ms
 
     from product_base p
     left join availability_agg av on p.product_id = av.product_id
@@ -209,6 +226,8 @@ select
 
     -- Metadata
     source_timestamp as last_modified_in_source,
-    ingested_at as ingested_timestamp
+    ingested_at as ingested_timestamp,
+    cdc_watermark_ms,
+    now() as refreshed_at
 
 from enriched
@@ -1,7 +1,10 @@
 {{
   config(
-    materialized='table',
+    materialized='incremental',
     schema='marts',
+    unique_key='product_id',
+    incremental_strategy='delete+insert',
+    post_hook="delete from {{ this }} d where not exists (select 1 from {{ ref('silver_product') }} p where p.product_id = d.product_id and p.deleted = false)",
     indexes=[
       {'columns': ['product_id'], 'unique': True},
       {'columns': ['search_name']},
@@ -17,9 +20,16 @@
 -- Eliminates need for runtime JOINs to ProductAvailability, OriginalNumber, Analogue, etc.
 -- Optimized for world-class AI/ML search performance
 
-with product_base as (
-    select * from {{ ref('stg_product') }}
+{% set full_rebuild = dim_full_rebuild_due() %}
+
+with {% if not full_rebuild %}changed_products as (
+    {{ changed_product_ids() }}
+),
+
+{% endif %}product_base as (
+    select * from {{ ref('silver_product') }}
     where deleted = false
+    {{ only_changed_products('product_id', full_rebuild) }}
 ),
 
 -- Aggregate availability by product across all storages
@@ -29,11 +39,13 @@ availability_agg as (
         sum(amount) as total_available_amount,
         max(case when amount > 0 then 1 else 0 end) as is_available,
         count(distinct storage_i_d) as storage_count,
+        max(source_ts_ms) as max_source_ts_ms,
         -- For multilingual support, we'll need to join with storage later
         -- For now, just track if product is available
         max(updated) as last_availability_update
-    from {{ ref('stg_product_availability') }}
+    from {{ ref('silver_product_availability') }}
     where deleted = false
+    {{ only_changed_products('product_i_d', full_rebuild) }}
     group by product_i_d
 ),
 
@@ -43,9 +55,11 @@ original_numbers_agg as (
         pon.product_i_d as product_id,
         array_agg(distinct pon.original_number_i_d) filter (where pon.original_number_i_d is not null) as original_number_ids,
         count(distinct pon.original_number_i_d) as original_number_count,
-        max(case when pon.is_main_original_number = true then pon.original_number_i_d end) as main_original_number_id
-    from {{ ref('stg_product_original_number') }}  pon
+        max(case when pon.is_main_original_number = true then pon.original_number_i_d end) as main_original_number_id,
+        max(pon.source_ts_ms) as max_source_ts_ms
+    from {{ ref('silver_product_original_number') }}  pon
     where pon.deleted = false
+    {{ only_changed_products('pon.product_i_d', full_rebuild) }}
     group by pon.product_i_d
 ),
 
@@ -54,9 +68,11 @@ analogues_agg as (
     select
         base_product_i_d as product_id,
         array_agg(distinct analogue_product_i_d) filter (where analogue_product_i_d is not null) as analogue_product_ids,
-        count(distinct analogue_product_i_d) as analogue_count
-    from {{ ref('stg_product_analogue') }}
+        count(distinct analogue_product_i_d) as analogue_count,
+        max(source_ts_ms) as max_source_ts_ms
+    from {{ ref('silver_product_analogue') }}
     where deleted = false
+    {{ only_changed_products('base_product_i_d', full_rebuild) }}
     group by base_product_i_d
 ),
 
@@ -181,7 +197,8 @@ enriched as (
 
         -- Metadata
         p.source_timestamp,
-        p.ingested_at
+        p.ingested_at,
+        greatest(p.source_ts_ms, av.max_source_ts_ms, on_agg.max_source_ts_ms, an_agg.max_source_ts_ms) as cdc_watermark_ms
 
     from product_base p
     left join availability_agg av on p.product_id = av.product_id
@@ -279,6 +296,8 @@ select
 
     -- Metadata
     source_timestamp as last_modified_in_source,
-    ingested_at as ingested_timestamp
+    ingested_at as ingested_timestamp,
+    cdc_watermark_ms,
+    now() as refreshed_at
 
 from enriched
@@ -0,0 +1,16 @@
+{{
+  config(
+    materialized='incremental',
+    schema='silver',
+    unique_key='product_id',
+    incremental_strategy='delete+insert',
+    indexes=[
+      {'columns': ['product_id'], 'unique': True},
+      {'columns': ['source_ts_ms']}
+    ],
+    post_hook="delete from {{ this }} where cdc_operation = 'd'"
+  )
+}}
+
+-- Latest Product row per product_id, compacted incrementally from bronze
+{{ cdc_silver(ref('stg_product_events'), 'product_id') }}
@@ -0,0 +1,16 @@
+{{
+  config(
+    materialized='incremental',
+    schema='silver',
+    unique_key='i_d',
+    incremental_strategy='delete+insert',
+    indexes=[
+      {'columns': ['i_d'], 'unique': True},
+      {'columns': ['source_ts_ms']}
+    ],
+    post_hook="delete from {{ this }} where cdc_operation = 'd'"
+  )
+}}
+
+-- Latest ProductAnalogue row per i_d, compacted incrementally from bronze
+{{ cdc_silver(ref('stg_product_analogue_events'), 'i_d') }}
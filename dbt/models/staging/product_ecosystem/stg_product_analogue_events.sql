@@ -0,0 +1,32 @@
+{{
+  config(
+    materialized='view',
+    schema='staging'
+  )
+}}
+
+-- Every parsed ProductAnalogue CDC event (no dedup, deletes included); compacted by silver_product_analogue
+
+with source as (
+    select * from {{ source('bronze', 'product_analogue_cdc') }}
+)
+
+select
+        coalesce(cdc_payload->'payload'->'after'->>'ID', cdc_payload->'payload'->'before'->>'ID')::bigint as i_d,
+        (cdc_payload->'payload'->'after'->>'AnalogueProductID')::bigint as analogue_product_i_d,
+        (cdc_payload->'payload'->'after'->>'BaseProductID')::bigint as base_product_i_d,
+        to_timestamp((cdc_payload->'payload'->'after'->>'Created')::bigint / 1000) as created,
+        (cdc_payload->'payload'->'after'->>'Deleted')::boolean as deleted,
+        (cdc_payload->'payload'->'after'->>'NetUID')::uuid as net_u_i_d,
+        to_timestamp((cdc_payload->'payload'->'after'->>'Updated')::bigint / 1000) as updated,
+        -- CDC Metadata
+        cdc_payload->'payload'->>'op' as cdc_operation,
+        (cdc_payload->'payload'->'source'->>'ts_ms')::bigint as source_ts_ms,
+        to_timestamp((cdc_payload->'payload'->'source'->>'ts_ms')::bigint / 1000) as source_timestamp,
+        (cdc_payload->'payload'->'source'->>'snapshot')::text as is_snapshot,
+        kafka_offset,
+        kafka_partition,
+        kafka_topic,
+        ingested_at,
+        cdc_payload->'payload'->'after' is not null as has_after_image
+from source
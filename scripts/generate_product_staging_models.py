@@ -2,9 +2,13 @@
 """
 Generate dbt staging models for all Product-related tables.
 Automatically creates SQL models from schema DDL.
+
+--silver generates only the events views and incremental silver models
+for SILVER_TABLES.
 """
 
 import re
+import sys
 from pathlib import Path
 from typing import List, Dict
 
@@ -42,6 +46,26 @@ PRODUCT_TABLES = [
     'MeasureUnit'  # Referenced by Product table
 ]
 
+# Tables compacted into latest-state silver tables (read by dim_product / dim_product_search)
+SILVER_TABLES = [
+    'ProductAvailability',
+    'ProductOriginalNumber',
+    'ProductAnalogue',
+]
+
+def to_snake_case(name: str) -> str:
+    """ProductAvailabilityCartLimits -> product_availability_cart_limits (column names: ProductID -> product_i_d)"""
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+def table_snake_case(name: str) -> str:
+    """
+    Table name -> model / bronze table name, keeping acronyms whole.
+
+    ProductSKU -> product_sku. Must agree with the Kafka bronze router's
+    bronze_table_for_topic, which names the <model>_cdc tables these models read.
+    """
+    return re.sub(r'(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])', '_', name).lower()
+
 def parse_table_schema(schema_file: Path, table_name: str) -> List[Dict]:
     """
     Extract column definitions from SQL DDL.
@@ -80,7 +104,8 @@ def parse_table_schema(schema_file: Path, table_name: str) -> List[Dict]:
         col_type = parts[1]
 
         # Skip if it's a constraint keyword
-        if col_name.lower() in ['constraint', 'primary', 'foreign', 'unique', 'check']:
+        # (with / references are continuation lines of inline constraints)
+        if col_name.lower() in ['constraint', 'primary', 'foreign', 'unique', 'check', 'with', 'references']:
             continue
 
         # Determine nullability
@@ -131,21 +156,22 @@ def map_sql_type_to_pg(sql_type: str) -> str:
     base_type = sql_type.split('(')[0].lower()
     return type_map.get(base_type, 'text')
 
-def generate_dbt_model(table_name: str, columns: List[Dict]) -> str:
-    """Generate dbt SQL model for a table."""
-
-    # Convert table name to snake_case
-    model_name = re.sub(r'(?<!^)(?=[A-Z])', '_', table_name).lower()
+def generate_column_selects(columns: List[Dict], epoch_ms_datetimes: bool = False,
+                            key_column: str = None) -> str:
+    """
+    Typed select expressions for every column of the CDC after-image.
 
-    # Generate column selections
+    key_column (if given) falls back to the before-image, so delete events
+    still carry their primary key.
+    """
     column_lines = []
     for col in columns:
-        col_lower = re.sub(r'(?<!^)(?=[A-Z])', '_', col['name']).lower()
+        col_lower = to_snake_case(col['name'])
 
         # Handle special conversions
         if col['type'] == 'datetime2' or col['type'] == 'datetime':
             # Check if it's a timestamp in milliseconds
-            if col['name'] in ['Created', 'Updated']:
+            if epoch_ms_datetimes or col['name'] in ['Created', 'Updated']:
                 cast_expr = f"to_timestamp((cdc_payload->'payload'->'after'->>'{col['name']}')::bigint / 1000)"
             else:
                 cast_expr = f"(cdc_payload->'payload'->'after'->>'{col['name']}')::timestamp"
@@ -156,9 +182,32 @@ def generate_dbt_model(table_name: str, columns: List[Dict]) -> str:
         else:
             cast_expr = f"(cdc_payload->'payload'->'after'->>'{col['name']}')::{col['pg_type']}"
 
+        if col['name'] == key_column:
+            cast_expr = (
+                f"coalesce(cdc_payload->'payload'->'after'->>'{col['name']}', "
+                f"cdc_payload->'payload'->'before'->>'{col['name']}')::{col['pg_type']}"
+            )
+
         column_lines.append(f"        {cast_expr} as {col_lower}")
 
-    columns_sql = ',\n'.join(column_lines)
+    return ',\n'.join(column_lines)
+
+def generate_dbt_model(table_name: str, columns: List[Dict], key_column: str = 'ID',
+                       soft_delete: bool = True, epoch_ms_datetimes: bool = False) -> str:
+    """
+    Generate dbt SQL model for a table.
+
+    Args:
+        key_column: Column the latest-state deduplication partitions by
+        soft_delete: Filter out rows with deleted = true (table has a Deleted column)
+        epoch_ms_datetimes: Every datetime is epoch milliseconds (direct loads),
+            not just Created/Updated
+    """
+
+    # Convert table name to snake_case
+    model_name = table_snake_case(table_name)
+
+    columns_sql = generate_column_selects(columns, epoch_ms_datetimes)
 
     # Generate model
     model = f"""{{{{
@@ -192,7 +241,7 @@ deduplicated as (
     select
         *,
         row_number() over (
-            partition by id
+            partition by {to_snake_case(key_column)}
             order by source_ts_ms desc, kafka_offset desc
         ) as rn
     from parsed
@@ -201,11 +250,85 @@ deduplicated as (
 select
     *
 from deduplicated
-where rn = 1 and deleted = false
+where rn = 1{' and deleted = false' if soft_delete else ''}
 """
 
     return model
 
+def generate_events_model(table_name: str, columns: List[Dict], key_column: str = 'ID',
+                          epoch_ms_datetimes: bool = False) -> str:
+    """Generate a view over every parsed CDC event of a table (no dedup, deletes included)."""
+    model_name = table_snake_case(table_name)
+    columns_sql = generate_column_selects(columns, epoch_ms_datetimes, key_column=key_column)
+
+    return f"""{{{{
+  config(
+    materialized='view',
+    schema='staging'
+  )
+}}}}
+
+-- Every parsed {table_name} CDC event (no dedup, deletes included); compacted by silver_{model_name}
+
+with source as (
+    select * from {{{{ source('bronze', '{model_name}_cdc') }}}}
+)
+
+select
+{columns_sql},
+        -- CDC Metadata
+        cdc_payload->'payload'->>'op' as cdc_operation,
+        (cdc_payload->'payload'->'source'->>'ts_ms')::bigint as source_ts_ms,
+        to_timestamp((cdc_payload->'payload'->'source'->>'ts_ms')::bigint / 1000) as source_timestamp,
+        (cdc_payload->'payload'->'source'->>'snapshot')::text as is_snapshot,
+        kafka_offset,
+        kafka_partition,
+        kafka_topic,
+        ingested_at,
+        cdc_payload->'payload'->'after' is not null as has_after_image
+from source
+"""
+
+def generate_silver_model(table_name: str, key_column: str = 'ID') -> str:
+    """Generate the incremental latest-state silver table over a table's events view."""
+    model_name = table_snake_case(table_name)
+    key = to_snake_case(key_column)
+
+    return f"""{{{{
+  config(
+    materialized='incremental',
+    schema='silver',
+    unique_key='{key}',
+    incremental_strategy='delete+insert',
+    indexes=[
+      {{'columns': ['{key}'], 'unique': True}},
+      {{'columns': ['source_ts_ms']}}
+    ],
+    post_hook="delete from {{{{ this }}}} where cdc_operation = 'd'"
+  )
+}}}}
+
+-- Latest {table_name} row per {key}, compacted incrementally from bronze
+{{{{ cdc_silver(ref('stg_{model_name}_events'), '{key}') }}}}
+"""
+
+def generate_silver_models(schema_file: Path, staging_dir: Path, silver_dir: Path):
+    """Generate events views + silver models for SILVER_TABLES."""
+    silver_dir.mkdir(parents=True, exist_ok=True)
+    for table_name in SILVER_TABLES:
+        columns = parse_table_schema(schema_file, table_name)
+        if not columns:
+            print(f"  ❌ Skipped {table_name} (no columns found)")
+            continue
+
+        model_name = table_snake_case(table_name)
+        with open(staging_dir / f"stg_{model_name}_events.sql", 'w', encoding='utf-8') as f:
+            f.write(generate_events_model(table_name, columns))
+        with open(silver_dir / f"silver_{model_name}.sql", 'w', encoding='utf-8') as f:
+            f.write(generate_silver_model(table_name))
+
+        print(f"  ✅ Created stg_{model_name}_events.sql and silver_{model_name}.sql")
+
 def generate_schema_yml(table_configs: List[Dict]) -> str:
     """Generate schema.yml for all Product tables."""
 
@@ -221,7 +344,7 @@ def generate_schema_yml(table_configs: List[Dict]) -> str:
 
     # Add bronze sources
     for config in table_configs:
-        model_name = re.sub(r'(?<!^)(?=[A-Z])', '_', config['table_name']).lower()
+        model_name = table_snake_case(config['table_name'])
         lines.append(f"      - name: {model_name}_cdc")
         lines.append(f"        description: 'Raw {config['table_name']} CDC events'")
         lines.append("")
@@ -230,7 +353,7 @@ def generate_schema_yml(table_configs: List[Dict]) -> str:
 
     # Add model definitions
     for config in table_configs:
-        model_name = re.sub(r'(?<!^)(?=[A-Z])', '_', config['table_name']).lower()
+        model_name = table_snake_case(config['table_name'])
         lines.append(f"  - name: stg_{model_name}")
         lines.append(f"    description: 'Staging model for {config['table_name']} table'")
         lines.append("    columns:")
@@ -252,6 +375,10 @@ def main():
     # Create output directory
     output_dir.mkdir(parents=True, exist_ok=True)
 
+    if '--silver' in sys.argv:
+        generate_silver_models(schema_file, output_dir, base_dir / "dbt" / "models" / "silver")
+        return
+
     print(f"Reading schema from: {schema_file}")
     print(f"Output directory: {output_dir}")
     print("")
@@ -272,7 +399,7 @@ def main():
         model_sql = generate_dbt_model(table_name, columns)
 
         # Write model file
-        model_name = re.sub(r'(?<!^)(?=[A-Z])', '_', table_name).lower()
+        model_name = table_snake_case(table_name)
         output_file = output_dir / f"stg_{model_name}.sql"
 
         with open(output_file, 'w', encoding='utf-8') as f:
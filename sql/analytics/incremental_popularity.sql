@@ -0,0 +1,310 @@
+-- ============================================================================
+-- Incremental, Time-Decayed Product Popularity
+-- Purpose: Replace the full mv_product_popularity refresh with an aggregator
+--          that consumes only new click rows and keeps exponentially decayed
+--          counters per product
+-- Date: 2025-10-21
+-- Requires: sql/analytics/product_popularity.sql, sql/search/create_search_analytics.sql
+-- ============================================================================
+--
+-- Each counter is stored together with the time it was last decayed to:
+--
+--     value(t) = value(t0) * 2 ^ (-(t - t0) / half_life) + sum of new events e: 2 ^ (-(t - e) / half_life)
+--
+-- so a refresh only touches products with new events, and the work is
+-- proportional to the number of new click rows (not all-time log volume).
+--
+-- Two horizons replace the old all-time / 7-day FILTER split:
+--   decayed_*  half-life 30 days  -> popularity_score (log(1 + 3c + v) / log(100))
+--   trend_*    half-life 3 days   -> trending_score   (log(1 + 3c + v) / log(50))
+--
+-- A "view" is the first click on a product from a given search (the same
+-- thing the old MV counted as COUNT(DISTINCT query_id)), timestamped by the
+-- search; a "click" is every click row.
+-- ============================================================================
+
+-- ============================================================================
+-- Decayed counter columns
+-- ============================================================================
+
+ALTER TABLE analytics_features.product_popularity_scores
+    ADD COLUMN IF NOT EXISTS decayed_clicks FLOAT NOT NULL DEFAULT 0.0,
+    ADD COLUMN IF NOT EXISTS decayed_views FLOAT NOT NULL DEFAULT 0.0,
+    ADD COLUMN IF NOT EXISTS trend_clicks FLOAT NOT NULL DEFAULT 0.0,
+    ADD COLUMN IF NOT EXISTS trend_views FLOAT NOT NULL DEFAULT 0.0,
+    ADD COLUMN IF NOT EXISTS decayed_at TIMESTAMPTZ;
+
+-- Rows with live counters, for the decay sweep
+CREATE INDEX IF NOT EXISTS idx_product_popularity_decaying
+ON analytics_features.product_popularity_scores(decayed_at)
+WHERE decayed_clicks > 0 OR decayed_views > 0;
+
+-- ============================================================================
+-- High-water marks
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS analytics_features.popularity_state (
+    source VARCHAR(100) PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    rows_consumed BIGINT NOT NULL DEFAULT 0,
+    last_run_at TIMESTAMPTZ
+);
+
+INSERT INTO analytics_features.popularity_state (source, last_id)
+VALUES ('search_click_log', 0)
+ON CONFLICT (source) DO NOTHING;
+
+-- ============================================================================
+-- Helpers
+-- ============================================================================
+
+-- Weight of an event (or stored counter) from `event_at` as seen at `as_of`
+CREATE OR REPLACE FUNCTION analytics_features.popularity_decay(
+    event_at TIMESTAMPTZ,
+    as_of TIMESTAMPTZ,
+    half_life INTERVAL
+)
+RETURNS FLOAT AS $$
+    SELECT CASE
+        WHEN event_at IS NULL THEN 0.0
+        ELSE POWER(2.0, -GREATEST(EXTRACT(EPOCH FROM (as_of - event_at)), 0) / EXTRACT(EPOCH FROM half_life))
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION analytics_features.popularity_log_score(
+    clicks FLOAT,
+    views FLOAT,
+    saturation FLOAT
+)
+RETURNS FLOAT AS $$
+    SELECT LEAST(1.0, LN(1 + clicks * 3 + views) / LN(saturation))
+$$ LANGUAGE sql IMMUTABLE;
+
+-- ============================================================================
+-- Function: Incremental Refresh
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION analytics_features.refresh_popularity_incremental(
+    p_half_life INTERVAL DEFAULT '30 days',
+    p_trend_half_life INTERVAL DEFAULT '3 days',
+    p_settle INTERVAL DEFAULT '10 seconds'
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_now TIMESTAMPTZ := NOW();
+    v_last_id BIGINT;
+    v_max_id BIGINT;
+    v_products INTEGER;
+BEGIN
+    -- Row lock serializes concurrent refreshes
+    SELECT last_id INTO v_last_id
+    FROM analytics_features.popularity_state
+    WHERE source = 'search_click_log'
+    FOR UPDATE;
+
+    -- Only consume clicks older than p_settle: BIGSERIAL ids can commit out
+    -- of order, and a click skipped below the high-water mark is lost
+    SELECT MAX(click_id) INTO v_max_id
+    FROM analytics_features.search_click_log
+    WHERE click_id > v_last_id
+      AND clicked_at < v_now - p_settle;
+
+    IF v_max_id IS NULL THEN
+        UPDATE analytics_features.popularity_state
+        SET last_run_at = v_now
+        WHERE source = 'search_click_log';
+        RETURN 0;
+    END IF;
+
+    WITH new_clicks AS (
+        SELECT
+            cl.product_id,
+            cl.clicked_at,
+            COALESCE(ql.timestamp, cl.clicked_at) AS viewed_at,
+            -- First click on this product from this search = one view
+            NOT EXISTS (
+                SELECT 1 FROM analytics_features.search_click_log prev
+                WHERE prev.query_id = cl.query_id
+                  AND prev.product_id = cl.product_id
+                  AND prev.click_id < cl.click_id
+            ) AS is_view
+        FROM analytics_features.search_click_log cl
+        LEFT JOIN analytics_features.search_query_log ql ON ql.query_id = cl.query_id
+        WHERE cl.click_id > v_last_id
+          AND cl.click_id <= v_max_id
+    ),
+    deltas AS (
+        SELECT
+            product_id,
+            COUNT(*) FILTER (WHERE is_view) AS views,
+            COUNT(*) AS clicks,
+            SUM(analytics_features.popularity_decay(clicked_at, v_now, p_half_life)) AS d_clicks,
+            COALESCE(SUM(analytics_features.popularity_decay(viewed_at, v_now, p_half_life)) FILTER (WHERE is_view), 0) AS d_views,
+            SUM(analytics_features.popularity_decay(clicked_at, v_now, p_trend_half_life)) AS t_clicks,
+            COALESCE(SUM(analytics_features.popularity_decay(viewed_at, v_now, p_trend_half_life)) FILTER (WHERE is_view), 0) AS t_views,
+            MAX(viewed_at) FILTER (WHERE is_view) AS last_viewed,
+            MAX(clicked_at) AS last_clicked
+        FROM new_clicks
+        GROUP BY product_id
+    )
+    INSERT INTO analytics_features.product_popularity_scores AS s (
+        product_id,
+        view_count,
+        click_count,
+        decayed_clicks,
+        decayed_views,
+        trend_clicks,
+        trend_views,
+        decayed_at,
+        popularity_score,
+        trending_score,
+        last_viewed,
+        last_clicked,
+        updated_at
+    )
+    SELECT
+        product_id,
+        views,
+        clicks,
+        d_clicks,
+        d_views,
+        t_clicks,
+        t_views,
+        v_now,
+        analytics_features.popularity_log_score(d_clicks, d_views, 100),
+        analytics_features.popularity_log_score(t_clicks, t_views, 50),
+        last_viewed,
+        last_clicked,
+        v_now
+    FROM deltas
+    ON CONFLICT (product_id) DO UPDATE SET
+        view_count = COALESCE(s.view_count, 0) + EXCLUDED.view_count,
+        click_count = COALESCE(s.click_count, 0) + EXCLUDED.click_count,
+        decayed_clicks = s.decayed_clicks * analytics_features.popularity_decay(s.decayed_at, v_now, p_half_life) + EXCLUDED.decayed_clicks,
+        decayed_views = s.decayed_views * analytics_features.popularity_decay(s.decayed_at, v_now, p_half_life) + EXCLUDED.decayed_views,
+        trend_clicks = s.trend_clicks * analytics_features.popularity_decay(s.decayed_at, v_now, p_trend_half_life) + EXCLUDED.trend_clicks,
+        trend_views = s.trend_views * analytics_features.popularity_decay(s.decayed_at, v_now, p_trend_half_life) + EXCLUDED.trend_views,
+        decayed_at = v_now,
+        popularity_score = analytics_features.popularity_log_score(
+            s.decayed_clicks * analytics_features.popularity_decay(s.decayed_at, v_now, p_half_life) + EXCLUDED.decayed_clicks,
+            s.decayed_views * analytics_features.popularity_decay(s.decayed_at, v_now, p_half_life) + EXCLUDED.decayed_views,
+            100
+        ),
+        trending_score = analytics_features.popularity_log_score(
+            s.trend_clicks * analytics_features.popularity_decay(s.decayed_at, v_now, p_trend_half_life) + EXCLUDED.trend_clicks,
+            s.trend_views * analytics_features.popularity_decay(s.decayed_at, v_now, p_trend_half_life) + EXCLUDED.trend_views,
+            50
+        ),
+        last_viewed = GREATEST(s.last_viewed, EXCLUDED.last_viewed),
+        last_clicked = GREATEST(s.last_clicked, EXCLUDED.last_clicked),
+        updated_at = v_now;
+
+    GET DIAGNOSTICS v_products = ROW_COUNT;
+
+    UPDATE analytics_features.popularity_state
+    SET rows_consumed = rows_consumed + (
+            SELECT COUNT(*) FROM analytics_features.search_click_log
+            WHERE click_id > v_last_id AND click_id <= v_max_id
+        ),
+        last_id = v_max_id,
+        last_run_at = v_now
+    WHERE source = 'search_click_log';
+
+    RETURN v_products;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- Function: Decay Sweep
+-- ============================================================================
+
+-- Products without new clicks are not touched by the incremental refresh, so
+-- their stored scores would stay at their last value. The sweep re-bases
+-- counters that haven't been decayed for p_older_than and recomputes scores.
+CREATE OR REPLACE FUNCTION analytics_features.decay_popularity_scores(
+    p_half_life INTERVAL DEFAULT '30 days',
+    p_trend_half_life INTERVAL DEFAULT '3 days',
+    p_older_than INTERVAL DEFAULT '1 hour'
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_now TIMESTAMPTZ := NOW();
+    v_products INTEGER;
+BEGIN
+    UPDATE analytics_features.product_popularity_scores s
+    SET decayed_clicks = d.decayed_clicks,
+        decayed_views = d.decayed_views,
+        trend_clicks = d.trend_clicks,
+        trend_views = d.trend_views,
+        decayed_at = v_now,
+        popularity_score = analytics_features.popularity_log_score(d.decayed_clicks, d.decayed_views, 100),
+        trending_score = analytics_features.popularity_log_score(d.trend_clicks, d.trend_views, 50),
+        updated_at = v_now
+    FROM (
+        SELECT
+            product_id,
+            decayed_clicks * analytics_features.popularity_decay(decayed_at, v_now, p_half_life) AS decayed_clicks,
+            decayed_views * analytics_features.popularity_decay(decayed_at, v_now, p_half_life) AS decayed_views,
+            trend_clicks * analytics_features.popularity_decay(decayed_at, v_now, p_trend_half_life) AS trend_clicks,
+            trend_views * analytics_features.popularity_decay(decayed_at, v_now, p_trend_half_life) AS trend_views
+        FROM analytics_features.product_popularity_scores
+        WHERE (decayed_clicks > 0 OR decayed_views > 0)
+          AND decayed_at < v_now - p_older_than
+    ) d
+    WHERE s.product_id = d.product_id;
+
+    GET DIAGNOSTICS v_products = ROW_COUNT;
+    RETURN v_products;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- Existing entry point
+-- ============================================================================
+
+-- Schedulers calling refresh_popularity_scores() now get the incremental path.
+-- mv_product_popularity is no longer refreshed; dim_product rows without
+-- analytics need no placeholder row (readers LEFT JOIN with COALESCE).
+CREATE OR REPLACE FUNCTION analytics_features.refresh_popularity_scores()
+RETURNS void AS $$
+BEGIN
+    PERFORM analytics_features.refresh_popularity_incremental();
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- One-time Backfill
+-- ============================================================================
+
+-- Rows written by the old MV refresh carry all-time view/click counts and a
+-- popularity_score, but zero decayed counters (decayed_at IS NULL): the first
+-- incremental refresh or decay sweep would add new clicks to those counts or
+-- rescore them from nothing. Before the first run, reset them and rebuild
+-- every counter from the full click log (ids start at 0).
+DO $$
+BEGIN
+    IF (SELECT last_id FROM analytics_features.popularity_state WHERE source = 'search_click_log') = 0 THEN
+        UPDATE analytics_features.product_popularity_scores
+        SET view_count = 0, click_count = 0, popularity_score = 0, trending_score = 0
+        WHERE decayed_at IS NULL;
+
+        PERFORM analytics_features.refresh_popularity_incremental();
+    END IF;
+END $$;
+
+-- ============================================================================
+-- Usage Notes
+-- ============================================================================
+
+-- Every minute (cron / pg_cron / Prefect):
+-- SELECT analytics_features.refresh_popularity_incremental();
+
+-- Hourly, so products without new clicks decay too:
+-- SELECT analytics_features.decay_popularity_scores();
+
+-- Rebuild from scratch (e.g. after changing half-lives):
+-- UPDATE analytics_features.product_popularity_scores
+--     SET view_count = 0, click_count = 0, decayed_clicks = 0, decayed_views = 0,
+--         trend_clicks = 0, trend_views = 0, popularity_score = 0, trending_score = 0, decayed_at = NULL;
+-- UPDATE analytics_features.popularity_state SET last_id = 0, rows_consumed = 0 WHERE source = 'search_click_log';
+-- SELECT analytics_features.refresh_popularity_incremental();
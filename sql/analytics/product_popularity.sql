@@ -154,6 +154,8 @@ FROM analytics_features.product_popularity_scores;
 
 -- Refresh popularity scores (run daily or hourly):
 -- SELECT analytics_features.refresh_popularity_scores();
+-- After incremental_popularity.sql is applied this runs the incremental,
+-- time-decayed refresh instead (cheap enough to run every minute).
 
 -- Get top popular products:
 -- SELECT p.product_id, p.vendor_code, p.name, pop.popularity_score, pop.click_count
@@ -0,0 +1,67 @@
+-- Embedding Pipeline State (Checkpoints and Watermarks)
+-- Purpose: Record committed progress of embedding runs so crashed runs resume
+--          from the last committed chunk and incremental runs use the source
+--          `updated` timestamp instead of product_embeddings.updated_at
+-- Date: 2026-10-19
+-- Used by: src/ml/embedding_pipeline_v2.py
+
+CREATE SCHEMA IF NOT EXISTS analytics_features;
+
+-- ==============================================================================
+-- PIPELINE STATE TABLE
+-- ==============================================================================
+-- One row per (pipeline, model). The row is updated in the same transaction as
+-- each chunk of embeddings, so (source_watermark, last_product_id) always points
+-- at the last chunk that is durably stored.
+--
+-- Products are processed in (updated, product_id) order, which makes the pair a
+-- keyset cursor: the next run continues with rows strictly greater than it.
+
+CREATE TABLE IF NOT EXISTS analytics_features.embedding_pipeline_state (
+    pipeline_name VARCHAR(100) NOT NULL,
+    model_id VARCHAR(255) NOT NULL,
+    run_id UUID NOT NULL,
+    run_mode VARCHAR(20) NOT NULL,              -- full, incremental
+    status VARCHAR(20) NOT NULL,                -- running, completed, failed
+    source_watermark TIMESTAMPTZ,               -- max dim_product.updated committed
+    last_product_id BIGINT,                     -- tie-breaker within source_watermark
+    products_committed BIGINT NOT NULL DEFAULT 0,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    completed_at TIMESTAMPTZ,
+    PRIMARY KEY (pipeline_name, model_id)
+);
+
+COMMENT ON TABLE analytics_features.embedding_pipeline_state IS
+'Checkpoint and watermark per embedding pipeline/model. Updated atomically with each committed chunk.';
+
+COMMENT ON COLUMN analytics_features.embedding_pipeline_state.source_watermark IS
+'Source dim_product.updated of the last committed product (not the embedding write time)';
+
+COMMENT ON COLUMN analytics_features.embedding_pipeline_state.status IS
+'running = in progress or crashed (resumable), completed = finished, failed = aborted with an error';
+
+-- ==============================================================================
+-- CONCURRENCY
+-- ==============================================================================
+-- Parallel runs are prevented with a session-level advisory lock taken by the
+-- pipeline before it reads the checkpoint:
+--   SELECT pg_try_advisory_lock(hashtext('embedding_pipeline_v2:' || <model_id>));
+-- The lock is released automatically when the pipeline connection closes.
+
+-- ==============================================================================
+-- VERIFICATION
+-- ==============================================================================
+
+SELECT
+    pipeline_name,
+    model_id,
+    run_id,
+    run_mode,
+    status,
+    source_watermark,
+    last_product_id,
+    products_committed,
+    updated_at
+FROM analytics_features.embedding_pipeline_state
+ORDER BY updated_at DESC;
@@ -0,0 +1,77 @@
+-- Versioned Embedding Store
+-- Purpose: Keep embeddings of several encoder versions side by side, each in its
+--          own table with its own HNSW index, and switch the search API between
+--          them through a single-row "active version" pointer
+-- Date: 2026-10-19
+-- Used by: src/ml/embedding_store.py, src/ml/embedding_pipeline_v2.py, src/api/hybrid_search.py
+
+CREATE EXTENSION IF NOT EXISTS vector;
+CREATE SCHEMA IF NOT EXISTS analytics_features;
+
+-- ==============================================================================
+-- VERSION REGISTRY
+-- ==============================================================================
+-- Each model_version owns analytics_features.<table_name>
+-- (product_id, embedding vector(embedding_dim), source_updated_at, updated_at).
+-- Lifecycle: building -> ready (HNSW index built) -> active -> ready -> retired
+
+CREATE TABLE IF NOT EXISTS analytics_features.embedding_model_versions (
+    model_version VARCHAR(64) PRIMARY KEY,
+    model_name VARCHAR(255) NOT NULL,
+    embedding_dim INTEGER NOT NULL,
+    table_name VARCHAR(63) NOT NULL UNIQUE,
+    status VARCHAR(20) NOT NULL DEFAULT 'building',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    ready_at TIMESTAMPTZ,
+    activated_at TIMESTAMPTZ,
+    retired_at TIMESTAMPTZ,
+    CHECK (status IN ('building', 'ready', 'active', 'retired'))
+);
+
+COMMENT ON TABLE analytics_features.embedding_model_versions IS
+'Registry of embedding model versions. Each version stores vectors in its own table so re-embedding never touches live vectors.';
+
+-- ==============================================================================
+-- ACTIVE VERSION POINTER
+-- ==============================================================================
+-- Exactly one row. Swapping versions is a single-row UPDATE, so readers see
+-- either the old or the new version, never a partially built one.
+
+CREATE TABLE IF NOT EXISTS analytics_features.embedding_active_version (
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    model_version VARCHAR(64) NOT NULL
+        REFERENCES analytics_features.embedding_model_versions(model_version),
+    activated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE analytics_features.embedding_active_version IS
+'Single-row pointer to the embedding version served by vector search. Without a row, search falls back to analytics_features.product_embeddings.';
+
+-- ==============================================================================
+-- VERIFICATION
+-- ==============================================================================
+
+SELECT
+    v.model_version,
+    v.model_name,
+    v.embedding_dim,
+    v.table_name,
+    v.status,
+    (a.model_version IS NOT NULL) AS is_active,
+    v.created_at,
+    v.activated_at
+FROM analytics_features.embedding_model_versions v
+LEFT JOIN analytics_features.embedding_active_version a USING (model_version)
+ORDER BY v.created_at DESC;
+
+-- ==============================================================================
+-- USAGE
+-- ==============================================================================
+-- 1. Embed into a new version (vectors land in their own table, no index yet):
+--      python -m src.ml.embedding_pipeline_v2 --full --model-version=minilm-q8-2026-10
+-- 2. Build its HNSW index in the background (CREATE INDEX CONCURRENTLY):
+--      python -m src.ml.embedding_store build-index minilm-q8-2026-10
+-- 3. Swap the search API to it:
+--      python -m src.ml.embedding_store activate minilm-q8-2026-10
+-- 4. Drop tables of old inactive versions:
+--      python -m src.ml.embedding_store gc --keep=1
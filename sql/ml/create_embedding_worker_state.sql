@@ -0,0 +1,60 @@
+-- Embedding Worker Offsets and Lag
+-- Purpose: Track how far the continuous embedding worker has read the product
+--          change stream and how far behind the source it is
+-- Date: 2026-10-19
+-- Used by: src/ml/embedding_worker.py
+
+CREATE SCHEMA IF NOT EXISTS analytics_features;
+
+-- ==============================================================================
+-- WORKER OFFSETS TABLE
+-- ==============================================================================
+-- One row per worker. For the bronze source, (last_position_ts, last_position)
+-- is the (ingested_at, id) of the last bronze.product_cdc row read; direct
+-- loads update rows in place with a new ingested_at, so the id alone is not
+-- a cursor. It is updated in the same transaction as the embeddings, so a
+-- restarted worker neither skips nor re-reads committed events. For the Kafka source offsets live in the consumer
+-- group and last_position is informational only.
+
+CREATE TABLE IF NOT EXISTS analytics_features.embedding_worker_offsets (
+    worker_name VARCHAR(100) PRIMARY KEY,
+    source VARCHAR(20) NOT NULL,                -- bronze, kafka
+    last_position BIGINT NOT NULL DEFAULT 0,
+    last_source_ts TIMESTAMPTZ,                 -- newest Debezium source.ts_ms flushed
+    lag_seconds NUMERIC(12, 3),                 -- flush time - oldest event in last batch
+    backlog BIGINT,                             -- events not yet read at last flush
+    products_embedded BIGINT NOT NULL DEFAULT 0,
+    products_deleted BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE analytics_features.embedding_worker_offsets
+    ADD COLUMN IF NOT EXISTS last_position_ts TIMESTAMP;   -- bronze.product_cdc.ingested_at of last_position
+
+-- Keyset index for the worker's (ingested_at, id) cursor
+CREATE INDEX IF NOT EXISTS idx_product_cdc_ingested_id
+ON bronze.product_cdc(ingested_at, id);
+
+COMMENT ON TABLE analytics_features.embedding_worker_offsets IS
+'Read position and lag metrics of the CDC-driven embedding worker. Updated atomically with each flushed micro-batch.';
+
+COMMENT ON COLUMN analytics_features.embedding_worker_offsets.lag_seconds IS
+'End-to-end freshness: seconds between the source change (Debezium ts_ms) and the embedding commit';
+
+-- ==============================================================================
+-- VERIFICATION
+-- ==============================================================================
+
+SELECT
+    worker_name,
+    source,
+    last_position,
+    last_position_ts,
+    last_source_ts,
+    lag_seconds,
+    backlog,
+    products_embedded,
+    products_deleted,
+    NOW() - updated_at AS since_last_flush
+FROM analytics_features.embedding_worker_offsets
+ORDER BY worker_name;
@@ -0,0 +1,68 @@
+-- ============================================================================
+-- Search Impressions (server-side)
+-- Purpose: Record which products each search returned, at which rank, on the
+--          search log row itself (no per-product fan-out on write)
+-- Date: 2025-10-21
+-- Requires: partition_search_logs.sql
+-- ============================================================================
+--
+-- result_product_ids holds the returned page as a packed int4 array in rank
+-- order (~4 bytes per product, TOASTed and compressed with the row);
+-- result_offset is the page offset, so rank = result_offset + array index.
+-- Product ids come from SQL Server INT keys and fit int4.
+--
+-- Impressions are expanded only at read time (v_search_impressions, the LTR
+-- export in src/ml/ltr_export.py). This is the single impression source for
+-- CTR; client-reported views in search_impression_log (/events) only add a
+-- `viewed` label to the export.
+-- ============================================================================
+
+ALTER TABLE analytics_features.search_query_log
+    ADD COLUMN IF NOT EXISTS result_product_ids INTEGER[],
+    ADD COLUMN IF NOT EXISTS result_offset INTEGER NOT NULL DEFAULT 0;
+
+COMMENT ON COLUMN analytics_features.search_query_log.result_product_ids IS
+'Product ids returned for this search, in rank order (rank = result_offset + index)';
+
+-- ============================================================================
+-- Impressions View
+-- ============================================================================
+
+CREATE OR REPLACE VIEW analytics_features.v_search_impressions AS
+SELECT
+    ql.query_id,
+    ql.timestamp AS searched_at,
+    ql.query_text,
+    ql.query_type,
+    r.product_id::BIGINT AS product_id,
+    ql.result_offset + r.ordinality::INTEGER AS rank_position
+FROM analytics_features.search_query_log ql
+CROSS JOIN LATERAL unnest(ql.result_product_ids) WITH ORDINALITY AS r(product_id, ordinality)
+WHERE ql.result_product_ids IS NOT NULL;
+
+-- Superseded by v_search_ctr_by_rank (served impressions, not client reports)
+DROP VIEW IF EXISTS analytics_features.v_impression_ctr_by_rank;
+
+-- Impression-based CTR by rank (last 30 days; the timestamp filter prunes partitions)
+CREATE OR REPLACE VIEW analytics_features.v_search_ctr_by_rank AS
+SELECT
+    i.rank_position,
+    COUNT(*) AS impression_count,
+    COUNT(c.query_id) AS clicked_count,
+    ROUND(100.0 * COUNT(c.query_id) / NULLIF(COUNT(*), 0), 2) AS ctr_percentage
+FROM analytics_features.v_search_impressions i
+LEFT JOIN (
+    SELECT DISTINCT query_id, product_id
+    FROM analytics_features.search_click_log
+    WHERE clicked_at >= NOW() - INTERVAL '30 days'
+) c ON c.query_id = i.query_id AND c.product_id = i.product_id
+WHERE i.searched_at >= NOW() - INTERVAL '30 days'
+GROUP BY i.rank_position
+ORDER BY i.rank_position;
+
+-- ============================================================================
+-- Usage Notes
+-- ============================================================================
+
+-- Export a learning-to-rank training set:
+--   python -m src.ml.ltr_export --since=2025-10-01 --output=ltr_train.parquet
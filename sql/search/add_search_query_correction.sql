@@ -0,0 +1,32 @@
+-- ============================================================================
+-- Search Query Correction
+-- Purpose: Record the typo-corrected query /search retried with after the
+--          original query matched nothing
+-- Date: 2025-10-21
+-- Requires: partition_search_logs.sql
+-- ============================================================================
+--
+-- query_text stays the query as typed; corrected_query is NULL unless the
+-- typo index (src/ml/typo_index.py) rewrote it. result_count and
+-- result_product_ids describe the corrected search when it is set.
+-- ============================================================================
+
+ALTER TABLE analytics_features.search_query_log
+    ADD COLUMN IF NOT EXISTS corrected_query TEXT;
+
+COMMENT ON COLUMN analytics_features.search_query_log.corrected_query IS
+'Typo-corrected query used for the results when the original query matched nothing';
+
+-- Corrections by original query (last 30 days; the timestamp filter prunes partitions)
+CREATE OR REPLACE VIEW analytics_features.v_search_query_corrections AS
+SELECT
+    query_text,
+    corrected_query,
+    COUNT(*) AS search_count,
+    COUNT(*) FILTER (WHERE result_count > 0) AS rescued_count,
+    MAX(timestamp) AS last_searched
+FROM analytics_features.search_query_log
+WHERE corrected_query IS NOT NULL
+  AND timestamp >= NOW() - INTERVAL '30 days'
+GROUP BY query_text, corrected_query
+ORDER BY search_count DESC;
@@ -11,14 +11,22 @@
 -- - ~95-99% recall accuracy
 -- - 10-100x speed improvement over exact search
 
--- Drop existing index if present (for recreation)
-DROP INDEX IF EXISTS analytics_features.idx_product_embeddings_hnsw;
+-- Initial creation only. Do NOT drop and recreate the index on a live table:
+-- vector search runs unindexed for the whole build. To rebuild, use the online
+-- rebuild (CREATE INDEX CONCURRENTLY under a new name, then swap names):
+--   python -m src.ml.embedding_index rebuild --maintenance-work-mem=2GB --parallel-workers=4
+-- For full re-embedding, load a shadow table and swap it in:
+--   python -m src.ml.embedding_pipeline_v2 --full --shadow
+
+-- More memory keeps the HNSW graph in RAM during the build (much faster)
+SET maintenance_work_mem = '2GB';
+SET max_parallel_maintenance_workers = 4;
 
 -- Create HNSW index with optimal parameters for 278k products
 -- Parameters:
 --   m = 16: Number of connections per layer (trade-off between recall and build time)
 --   ef_construction = 64: Size of dynamic candidate list during construction
-CREATE INDEX idx_product_embeddings_hnsw
+CREATE INDEX IF NOT EXISTS idx_product_embeddings_hnsw
 ON analytics_features.product_embeddings
 USING hnsw (embedding vector_cosine_ops)
 WITH (m = 16, ef_construction = 64);
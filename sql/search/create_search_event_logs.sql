@@ -0,0 +1,81 @@
+-- ============================================================================
+-- Search Event Logs (batched ingestion)
+-- Purpose: Append-only impression and feedback logs written by the /events
+--          endpoint's write-behind queue (src/api/search_events.py)
+-- Date: 2025-10-21
+-- Requires: partition_search_logs.sql
+-- ============================================================================
+--
+-- The writer COPYs each flushed batch into a session temp table, then moves
+-- it into the logs with one INSERT ... SELECT per event type; search ids are
+-- validated there by a single semi-join against search_query_log instead of
+-- a lookup per event. Feedback is also applied to search_query_log (latest
+-- feedback per search) so the existing feedback views keep working.
+--
+-- Served impressions are recorded on search_query_log.result_product_ids
+-- (add_search_impressions.sql), which is the source for CTR by rank.
+-- search_impression_log only holds what the client reports as actually
+-- viewed; the LTR export reads it as the `viewed` label.
+-- ============================================================================
+
+-- ============================================================================
+-- Impression Log
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS analytics_features.search_impression_log (
+    impression_id BIGSERIAL,
+    query_id BIGINT NOT NULL,
+    product_id BIGINT NOT NULL,
+    rank_position INTEGER,
+    impressed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    session_id VARCHAR(100),
+    PRIMARY KEY (impression_id, impressed_at)
+) PARTITION BY RANGE (impressed_at);
+
+CREATE TABLE IF NOT EXISTS analytics_features.search_impression_log_default
+PARTITION OF analytics_features.search_impression_log DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_search_impression_log_impressed_at_brin
+ON analytics_features.search_impression_log USING brin (impressed_at);
+
+CREATE INDEX IF NOT EXISTS idx_search_impression_log_query_id
+ON analytics_features.search_impression_log(query_id);
+
+CREATE INDEX IF NOT EXISTS idx_search_impression_log_product_id
+ON analytics_features.search_impression_log(product_id);
+
+-- ============================================================================
+-- Feedback Log
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS analytics_features.search_feedback_log (
+    feedback_id BIGSERIAL,
+    query_id BIGINT NOT NULL,
+    feedback_type VARCHAR(50) NOT NULL,
+    feedback_comment TEXT,
+    submitted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    session_id VARCHAR(100),
+    PRIMARY KEY (feedback_id, submitted_at)
+) PARTITION BY RANGE (submitted_at);
+
+CREATE TABLE IF NOT EXISTS analytics_features.search_feedback_log_default
+PARTITION OF analytics_features.search_feedback_log DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_search_feedback_log_submitted_at_brin
+ON analytics_features.search_feedback_log USING brin (submitted_at);
+
+CREATE INDEX IF NOT EXISTS idx_search_feedback_log_query_id
+ON analytics_features.search_feedback_log(query_id);
+
+-- Monthly partitions (search_log_tables() already lists both tables)
+SELECT analytics_features.ensure_search_log_partitions();
+
+-- ============================================================================
+-- Success!
+-- ============================================================================
+
+SELECT
+    'Search Event Logs Created' as status,
+    (SELECT COUNT(*) FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhparent
+        WHERE c.relname IN ('search_impression_log', 'search_feedback_log')) as partitions;
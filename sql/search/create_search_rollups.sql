@@ -0,0 +1,358 @@
+-- ============================================================================
+-- Search Analytics Rollups
+-- Purpose: Pre-aggregated query/click counts so dashboards and the query
+--          cache warmer read small keyed tables instead of the raw logs
+-- Date: 2025-10-21
+-- Requires: create_search_analytics.sql, migrate_search_analytics_v2.sql
+-- ============================================================================
+--
+-- Tables (key: md5(query_text), query_type, bucket):
+--   search_query_rollup_hourly   bucket = hour, kept 90 days
+--   search_query_rollup_daily    bucket = day, kept indefinitely
+--   search_query_totals          all-time, one row per (query, type)
+--
+-- refresh_search_rollups() consumes query and click rows above their
+-- high-water marks and folds them into all three tables in one statement
+-- per log. Clicks are attributed to the bucket of the search they belong
+-- to; clicked_query_count counts each search once (first click), which is
+-- what CTR needs.
+--
+-- query_type is stored as '' when NULL so it can be part of the key; the
+-- views map it back to NULL.
+-- ============================================================================
+
+-- ============================================================================
+-- Rollup Tables
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS analytics_features.search_query_rollup_hourly (
+    query_hash CHAR(32) NOT NULL,
+    query_type VARCHAR(50) NOT NULL DEFAULT '',
+    bucket TIMESTAMPTZ NOT NULL,
+    query_text TEXT NOT NULL,
+    query_count BIGINT NOT NULL DEFAULT 0,
+    execution_time_ms_sum FLOAT NOT NULL DEFAULT 0,
+    result_count_sum BIGINT NOT NULL DEFAULT 0,
+    zero_result_count BIGINT NOT NULL DEFAULT 0,
+    click_count BIGINT NOT NULL DEFAULT 0,
+    clicked_query_count BIGINT NOT NULL DEFAULT 0,
+    last_queried TIMESTAMPTZ,
+    PRIMARY KEY (query_hash, query_type, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS idx_search_query_rollup_hourly_bucket
+ON analytics_features.search_query_rollup_hourly(bucket DESC);
+
+CREATE TABLE IF NOT EXISTS analytics_features.search_query_rollup_daily (
+    query_hash CHAR(32) NOT NULL,
+    query_type VARCHAR(50) NOT NULL DEFAULT '',
+    bucket DATE NOT NULL,
+    query_text TEXT NOT NULL,
+    query_count BIGINT NOT NULL DEFAULT 0,
+    execution_time_ms_sum FLOAT NOT NULL DEFAULT 0,
+    result_count_sum BIGINT NOT NULL DEFAULT 0,
+    zero_result_count BIGINT NOT NULL DEFAULT 0,
+    click_count BIGINT NOT NULL DEFAULT 0,
+    clicked_query_count BIGINT NOT NULL DEFAULT 0,
+    last_queried TIMESTAMPTZ,
+    PRIMARY KEY (query_hash, query_type, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS idx_search_query_rollup_daily_bucket
+ON analytics_features.search_query_rollup_daily(bucket DESC);
+
+CREATE TABLE IF NOT EXISTS analytics_features.search_query_totals (
+    query_hash CHAR(32) NOT NULL,
+    query_type VARCHAR(50) NOT NULL DEFAULT '',
+    query_text TEXT NOT NULL,
+    query_count BIGINT NOT NULL DEFAULT 0,
+    execution_time_ms_sum FLOAT NOT NULL DEFAULT 0,
+    result_count_sum BIGINT NOT NULL DEFAULT 0,
+    zero_result_count BIGINT NOT NULL DEFAULT 0,
+    click_count BIGINT NOT NULL DEFAULT 0,
+    clicked_query_count BIGINT NOT NULL DEFAULT 0,
+    first_queried TIMESTAMPTZ,
+    last_queried TIMESTAMPTZ,
+    PRIMARY KEY (query_hash, query_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_search_query_totals_query_count
+ON analytics_features.search_query_totals(query_count DESC);
+
+CREATE INDEX IF NOT EXISTS idx_search_query_totals_query_type
+ON analytics_features.search_query_totals(query_type);
+
+-- ============================================================================
+-- High-water marks
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS analytics_features.search_rollup_state (
+    source VARCHAR(100) PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    last_run_at TIMESTAMPTZ
+);
+
+INSERT INTO analytics_features.search_rollup_state (source, last_id)
+VALUES ('search_query_log', 0), ('search_click_log', 0)
+ON CONFLICT (source) DO NOTHING;
+
+-- ============================================================================
+-- Function: Incremental Rollup Refresh
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION analytics_features.refresh_search_rollups(
+    p_settle INTERVAL DEFAULT '10 seconds'
+)
+RETURNS TABLE (queries_consumed BIGINT, clicks_consumed BIGINT) AS $$
+DECLARE
+    v_now TIMESTAMPTZ := NOW();
+    v_last_query BIGINT;
+    v_last_click BIGINT;
+    v_max_query BIGINT;
+    v_max_click BIGINT;
+BEGIN
+    -- Row locks serialize concurrent refreshes
+    SELECT last_id INTO v_last_query FROM analytics_features.search_rollup_state
+    WHERE source = 'search_query_log' FOR UPDATE;
+    SELECT last_id INTO v_last_click FROM analytics_features.search_rollup_state
+    WHERE source = 'search_click_log' FOR UPDATE;
+
+    -- Settle window: BIGSERIAL ids can commit out of order
+    SELECT MAX(query_id) INTO v_max_query
+    FROM analytics_features.search_query_log
+    WHERE query_id > v_last_query AND timestamp < v_now - p_settle;
+
+    SELECT MAX(click_id) INTO v_max_click
+    FROM analytics_features.search_click_log
+    WHERE click_id > v_last_click AND clicked_at < v_now - p_settle;
+
+    queries_consumed := 0;
+    clicks_consumed := 0;
+
+    IF v_max_query IS NOT NULL THEN
+        WITH delta AS (
+            SELECT
+                md5(query_text) AS query_hash,
+                COALESCE(query_type, '') AS query_type,
+                date_trunc('hour', timestamp) AS bucket,
+                MIN(query_text) AS query_text,
+                COUNT(*) AS query_count,
+                COALESCE(SUM(execution_time_ms), 0) AS execution_time_ms_sum,
+                COALESCE(SUM(result_count), 0) AS result_count_sum,
+                COUNT(*) FILTER (WHERE result_count = 0) AS zero_result_count,
+                MIN(timestamp) AS first_queried,
+                MAX(timestamp) AS last_queried
+            FROM analytics_features.search_query_log
+            WHERE query_id > v_last_query AND query_id <= v_max_query
+            GROUP BY 1, 2, 3
+        ),
+        hourly AS (
+            INSERT INTO analytics_features.search_query_rollup_hourly AS r (
+                query_hash, query_type, bucket, query_text, query_count,
+                execution_time_ms_sum, result_count_sum, zero_result_count, last_queried
+            )
+            SELECT query_hash, query_type, bucket, query_text, query_count,
+                   execution_time_ms_sum, result_count_sum, zero_result_count, last_queried
+            FROM delta
+            ON CONFLICT (query_hash, query_type, bucket) DO UPDATE SET
+                query_count = r.query_count + EXCLUDED.query_count,
+                execution_time_ms_sum = r.execution_time_ms_sum + EXCLUDED.execution_time_ms_sum,
+                result_count_sum = r.result_count_sum + EXCLUDED.result_count_sum,
+                zero_result_count = r.zero_result_count + EXCLUDED.zero_result_count,
+                last_queried = GREATEST(r.last_queried, EXCLUDED.last_queried)
+        ),
+        daily AS (
+            INSERT INTO analytics_features.search_query_rollup_daily AS r (
+                query_hash, query_type, bucket, query_text, query_count,
+                execution_time_ms_sum, result_count_sum, zero_result_count, last_queried
+            )
+            SELECT query_hash, query_type, bucket::date, MIN(query_text), SUM(query_count),
+                   SUM(execution_time_ms_sum), SUM(result_count_sum), SUM(zero_result_count), MAX(last_queried)
+            FROM delta
+            GROUP BY query_hash, query_type, bucket::date
+            ON CONFLICT (query_hash, query_type, bucket) DO UPDATE SET
+                query_count = r.query_count + EXCLUDED.query_count,
+                execution_time_ms_sum = r.execution_time_ms_sum + EXCLUDED.execution_time_ms_sum,
+                result_count_sum = r.result_count_sum + EXCLUDED.result_count_sum,
+                zero_result_count = r.zero_result_count + EXCLUDED.zero_result_count,
+                last_queried = GREATEST(r.last_queried, EXCLUDED.last_queried)
+        )
+        INSERT INTO analytics_features.search_query_totals AS r (
+            query_hash, query_type, query_text, query_count, execution_time_ms_sum,
+            result_count_sum, zero_result_count, first_queried, last_queried
+        )
+        SELECT query_hash, query_type, MIN(query_text), SUM(query_count), SUM(execution_time_ms_sum),
+               SUM(result_count_sum), SUM(zero_result_count), MIN(first_queried), MAX(last_queried)
+        FROM delta
+        GROUP BY query_hash, query_type
+        ON CONFLICT (query_hash, query_type) DO UPDATE SET
+            query_count = r.query_count + EXCLUDED.query_count,
+            execution_time_ms_sum = r.execution_time_ms_sum + EXCLUDED.execution_time_ms_sum,
+            result_count_sum = r.result_count_sum + EXCLUDED.result_count_sum,
+            zero_result_count = r.zero_result_count + EXCLUDED.zero_result_count,
+            first_queried = LEAST(r.first_queried, EXCLUDED.first_queried),
+            last_queried = GREATEST(r.last_queried, EXCLUDED.last_queried);
+
+        SELECT COUNT(*) INTO queries_consumed
+        FROM analytics_features.search_query_log
+        WHERE query_id > v_last_query AND query_id <= v_max_query;
+
+        UPDATE analytics_features.search_rollup_state
+        SET last_id = v_max_query
+        WHERE source = 'search_query_log';
+    END IF;
+
+    IF v_max_click IS NOT NULL THEN
+        WITH delta AS (
+            SELECT
+                md5(ql.query_text) AS query_hash,
+                COALESCE(ql.query_type, '') AS query_type,
+                date_trunc('hour', ql.timestamp) AS bucket,
+                MIN(ql.query_text) AS query_text,
+                COUNT(*) AS click_count,
+                -- A search counts as clicked once, on its first click
+                COUNT(*) FILTER (WHERE NOT EXISTS (
+                    SELECT 1 FROM analytics_features.search_click_log prev
+                    WHERE prev.query_id = cl.query_id
+                      AND prev.click_id < cl.click_id
+                )) AS clicked_query_count
+            FROM analytics_features.search_click_log cl
+            JOIN analytics_features.search_query_log ql ON ql.query_id = cl.query_id
+            WHERE cl.click_id > v_last_click AND cl.click_id <= v_max_click
+            GROUP BY 1, 2, 3
+        ),
+        hourly AS (
+            INSERT INTO analytics_features.search_query_rollup_hourly AS r (
+                query_hash, query_type, bucket, query_text, click_count, clicked_query_count
+            )
+            SELECT query_hash, query_type, bucket, query_text, click_count, clicked_query_count
+            FROM delta
+            ON CONFLICT (query_hash, query_type, bucket) DO UPDATE SET
+                click_count = r.click_count + EXCLUDED.click_count,
+                clicked_query_count = r.clicked_query_count + EXCLUDED.clicked_query_count
+        ),
+        daily AS (
+            INSERT INTO analytics_features.search_query_rollup_daily AS r (
+                query_hash, query_type, bucket, query_text, click_count, clicked_query_count
+            )
+            SELECT query_hash, query_type, bucket::date, MIN(query_text), SUM(click_count), SUM(clicked_query_count)
+            FROM delta
+            GROUP BY query_hash, query_type, bucket::date
+            ON CONFLICT (query_hash, query_type, bucket) DO UPDATE SET
+                click_count = r.click_count + EXCLUDED.click_count,
+                clicked_query_count = r.clicked_query_count + EXCLUDED.clicked_query_count
+        )
+        INSERT INTO analytics_features.search_query_totals AS r (
+            query_hash, query_type, query_text, click_count, clicked_query_count
+        )
+        SELECT query_hash, query_type, MIN(query_text), SUM(click_count), SUM(clicked_query_count)
+        FROM delta
+        GROUP BY query_hash, query_type
+        ON CONFLICT (query_hash, query_type) DO UPDATE SET
+            click_count = r.click_count + EXCLUDED.click_count,
+            clicked_query_count = r.clicked_query_count + EXCLUDED.clicked_query_count;
+
+        SELECT COUNT(*) INTO clicks_consumed
+        FROM analytics_features.search_click_log
+        WHERE click_id > v_last_click AND click_id <= v_max_click;
+
+        UPDATE analytics_features.search_rollup_state
+        SET last_id = v_max_click
+        WHERE source = 'search_click_log';
+    END IF;
+
+    UPDATE analytics_features.search_rollup_state
+    SET last_run_at = v_now
+    WHERE source IN ('search_query_log', 'search_click_log');
+
+    RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- Function: Rollup Retention
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION analytics_features.prune_search_rollups(
+    p_keep_hourly INTERVAL DEFAULT '90 days'
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_deleted INTEGER;
+BEGIN
+    DELETE FROM analytics_features.search_query_rollup_hourly
+    WHERE bucket < date_trunc('hour', NOW() - p_keep_hourly);
+
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+    RETURN v_deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- Re-point Analytics Views at the Rollups
+-- ============================================================================
+
+-- CREATE OR REPLACE VIEW cannot change a column's type (or typmod), so
+-- columns keep the types of the raw-log definitions: COUNT() is bigint
+-- while SUM(bigint) is numeric, and query_type stays VARCHAR(50)
+
+-- Top queries by frequency
+CREATE OR REPLACE VIEW analytics_features.v_top_queries AS
+SELECT
+    query_text,
+    NULLIF(query_type, '')::VARCHAR(50) as query_type,
+    query_count,
+    execution_time_ms_sum / NULLIF(query_count, 0) as avg_execution_time,
+    result_count_sum::numeric / NULLIF(query_count, 0) as avg_result_count,
+    last_queried
+FROM analytics_features.search_query_totals
+WHERE query_count > 0
+ORDER BY query_count DESC;
+
+-- Click-through rate by query type
+CREATE OR REPLACE VIEW analytics_features.v_ctr_by_query_type AS
+SELECT
+    NULLIF(query_type, '')::VARCHAR(50) as query_type,
+    SUM(query_count)::bigint as total_queries,
+    SUM(clicked_query_count)::bigint as queries_with_clicks,
+    ROUND(100.0 * SUM(clicked_query_count) / NULLIF(SUM(query_count), 0), 2) as ctr_percentage
+FROM analytics_features.search_query_totals
+GROUP BY query_type;
+
+-- Daily trend for dashboards (bounded by bucket, served from the daily rollup)
+CREATE OR REPLACE VIEW analytics_features.v_search_volume_daily AS
+SELECT
+    bucket as day,
+    NULLIF(query_type, '') as query_type,
+    SUM(query_count) as query_count,
+    SUM(click_count) as click_count,
+    ROUND(100.0 * SUM(clicked_query_count) / NULLIF(SUM(query_count), 0), 2) as ctr_percentage,
+    SUM(zero_result_count) as zero_result_count,
+    SUM(execution_time_ms_sum) / NULLIF(SUM(query_count), 0) as avg_execution_time
+FROM analytics_features.search_query_rollup_daily
+GROUP BY bucket, query_type;
+
+-- ============================================================================
+-- Initial Backfill
+-- ============================================================================
+
+SELECT * FROM analytics_features.refresh_search_rollups(p_settle => INTERVAL '0 seconds');
+
+-- ============================================================================
+-- Usage Notes
+-- ============================================================================
+
+-- Every minute (cron / pg_cron / Prefect):
+-- SELECT * FROM analytics_features.refresh_search_rollups();
+
+-- Daily:
+-- SELECT analytics_features.prune_search_rollups();
+
+-- Run a refresh before archive_search_log_partitions() (partition_search_logs.sql)
+-- so detached months are already counted in the daily rollups and totals.
+
+-- Top queries in the last 7 days:
+-- SELECT query_text, SUM(query_count) AS searches
+-- FROM analytics_features.search_query_rollup_daily
+-- WHERE bucket >= CURRENT_DATE - 7
+-- GROUP BY query_text ORDER BY searches DESC LIMIT 50;
@@ -0,0 +1,401 @@
+-- ============================================================================
+-- Search Log Partitioning Migration
+-- Purpose: Range-partition search_query_log / search_click_log by month,
+--          BRIN timestamp indexes, automatic partition creation, retention
+-- Date: 2025-10-21
+-- Requires: create_search_analytics.sql, migrate_search_analytics_v2.sql,
+--           sql/analytics/incremental_popularity.sql (mv_product_popularity is dropped)
+-- ============================================================================
+--
+-- Layout:
+--   search_query_log  PARTITION BY RANGE (timestamp)   -> search_query_log_pYYYY_MM
+--   search_click_log  PARTITION BY RANGE (clicked_at)  -> search_click_log_pYYYY_MM
+--   plus a DEFAULT partition each, so an insert never fails for lack of a partition
+--
+-- Notes:
+--   - Primary keys become (query_id, timestamp) / (click_id, clicked_at);
+--     ids still come from the original sequences, so API code is unchanged
+--     and lookups by query_id use the per-partition PK index.
+--   - search_click_log.query_id no longer has a foreign key: a partitioned
+--     table can only be referenced through a key that includes its
+--     partition column.
+--   - Queries filtered on timestamp / clicked_at prune to the matching months.
+--   - The old heap tables are kept as *_unpartitioned until verified.
+-- ============================================================================
+
+CREATE SCHEMA IF NOT EXISTS analytics_archive;
+
+-- ============================================================================
+-- Archive Registry
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS analytics_features.search_log_archive (
+    partition_name VARCHAR(100) PRIMARY KEY,
+    source_table VARCHAR(100) NOT NULL,
+    range_start DATE NOT NULL,
+    range_end DATE NOT NULL,
+    row_count BIGINT,
+    dropped BOOLEAN NOT NULL DEFAULT FALSE,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- ============================================================================
+-- Partitioned Log Tables
+-- ============================================================================
+
+-- Parents that aren't created yet are skipped by the functions below
+CREATE OR REPLACE FUNCTION analytics_features.search_log_tables()
+RETURNS TABLE (table_name TEXT, time_column TEXT) AS $$
+    VALUES
+        ('search_query_log', 'timestamp'),
+        ('search_click_log', 'clicked_at'),
+        ('search_impression_log', 'impressed_at'),
+        ('search_feedback_log', 'submitted_at')
+$$ LANGUAGE sql IMMUTABLE;
+
+-- ============================================================================
+-- Function: Create One Monthly Partition
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION analytics_features.create_search_log_partition(
+    p_table TEXT,
+    p_column TEXT,
+    p_month DATE
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_start DATE := date_trunc('month', p_month)::date;
+    v_end DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::date;
+    v_partition TEXT := p_table || '_p' || to_char(v_start, 'YYYY_MM');
+    v_in_default BOOLEAN;
+BEGIN
+    IF to_regclass('analytics_features.' || p_table) IS NULL
+       OR to_regclass('analytics_features.' || v_partition) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    -- Rows that landed in the default partition for this month block a plain
+    -- CREATE ... PARTITION OF, so move them into the new partition first
+    EXECUTE format(
+        'SELECT EXISTS (SELECT 1 FROM analytics_features.%I WHERE %I >= %L AND %I < %L)',
+        p_table || '_default', p_column, v_start, p_column, v_end
+    ) INTO v_in_default;
+
+    IF v_in_default THEN
+        EXECUTE format(
+            'CREATE TABLE analytics_features.%I (LIKE analytics_features.%I INCLUDING DEFAULTS)',
+            v_partition, p_table
+        );
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM analytics_features.%I WHERE %I >= %L AND %I < %L RETURNING *) '
+            'INSERT INTO analytics_features.%I SELECT * FROM moved',
+            p_table || '_default', p_column, v_start, p_column, v_end, v_partition
+        );
+        EXECUTE format(
+            'ALTER TABLE analytics_features.%I ATTACH PARTITION analytics_features.%I FOR VALUES FROM (%L) TO (%L)',
+            p_table, v_partition, v_start, v_end
+        );
+    ELSE
+        EXECUTE format(
+            'CREATE TABLE analytics_features.%I PARTITION OF analytics_features.%I FOR VALUES FROM (%L) TO (%L)',
+            v_partition, p_table, v_start, v_end
+        );
+    END IF;
+
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- Function: Ensure Partitions Exist Ahead of Time
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION analytics_features.ensure_search_log_partitions(
+    p_months_ahead INTEGER DEFAULT 2,
+    p_from DATE DEFAULT NULL
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_month DATE := date_trunc('month', COALESCE(p_from, CURRENT_DATE))::date;
+    v_last DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => p_months_ahead))::date;
+    v_created INTEGER := 0;
+    v_log RECORD;
+BEGIN
+    WHILE v_month <= v_last LOOP
+        FOR v_log IN SELECT * FROM analytics_features.search_log_tables() LOOP
+            IF analytics_features.create_search_log_partition(v_log.table_name, v_log.time_column, v_month) THEN
+                v_created := v_created + 1;
+            END IF;
+        END LOOP;
+        v_month := (v_month + INTERVAL '1 month')::date;
+    END LOOP;
+
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- Function: Retention (detach + archive old partitions)
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION analytics_features.archive_search_log_partitions(
+    p_keep_months INTEGER DEFAULT 13,
+    p_drop BOOLEAN DEFAULT FALSE
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => p_keep_months))::date;
+    v_part RECORD;
+    v_start DATE;
+    v_rows BIGINT;
+    v_archived INTEGER := 0;
+BEGIN
+    FOR v_part IN
+        SELECT parent.relname AS source_table, child.relname AS partition_name
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        JOIN pg_namespace n ON n.oid = parent.relnamespace
+        WHERE n.nspname = 'analytics_features'
+          AND parent.relname IN (SELECT table_name FROM analytics_features.search_log_tables())
+          AND child.relname ~ '_p[0-9]{4}_[0-9]{2}$'
+        ORDER BY child.relname
+    LOOP
+        v_start := to_date(right(v_part.partition_name, 7), 'YYYY_MM');
+        CONTINUE WHEN v_start >= v_cutoff;
+
+        EXECUTE format('SELECT COUNT(*) FROM analytics_features.%I', v_part.partition_name) INTO v_rows;
+        EXECUTE format(
+            'ALTER TABLE analytics_features.%I DETACH PARTITION analytics_features.%I',
+            v_part.source_table, v_part.partition_name
+        );
+
+        IF p_drop THEN
+            EXECUTE format('DROP TABLE analytics_features.%I', v_part.partition_name);
+        ELSE
+            EXECUTE format('ALTER TABLE analytics_features.%I SET SCHEMA analytics_archive', v_part.partition_name);
+        END IF;
+
+        INSERT INTO analytics_features.search_log_archive
+            (partition_name, source_table, range_start, range_end, row_count, dropped)
+        VALUES
+            (v_part.partition_name, v_part.source_table, v_start, (v_start + INTERVAL '1 month')::date, v_rows, p_drop)
+        ON CONFLICT (partition_name) DO UPDATE SET
+            row_count = EXCLUDED.row_count,
+            dropped = EXCLUDED.dropped,
+            archived_at = NOW();
+
+        v_archived := v_archived + 1;
+    END LOOP;
+
+    RETURN v_archived;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- Swap Heap Tables for Partitioned Tables
+-- ============================================================================
+
+BEGIN;
+
+-- mv_product_popularity is dropped below; without the incremental refresh
+-- popularity would silently stop updating, so abort the swap instead
+DO $$
+BEGIN
+    IF to_regproc('analytics_features.refresh_popularity_incremental') IS NULL THEN
+        RAISE EXCEPTION 'Apply sql/analytics/incremental_popularity.sql before partitioning the search logs';
+    END IF;
+END $$;
+
+ALTER TABLE analytics_features.search_query_log RENAME TO search_query_log_unpartitioned;
+ALTER TABLE analytics_features.search_click_log RENAME TO search_click_log_unpartitioned;
+
+-- Free the index / constraint names for the new tables
+ALTER TABLE analytics_features.search_query_log_unpartitioned
+    RENAME CONSTRAINT search_query_log_pkey TO search_query_log_unpartitioned_pkey;
+ALTER TABLE analytics_features.search_click_log_unpartitioned
+    RENAME CONSTRAINT search_click_log_pkey TO search_click_log_unpartitioned_pkey;
+ALTER INDEX IF EXISTS analytics_features.idx_search_query_log_timestamp RENAME TO idx_search_query_log_unpartitioned_timestamp;
+ALTER INDEX IF EXISTS analytics_features.idx_search_query_log_query_text RENAME TO idx_search_query_log_unpartitioned_query_text;
+ALTER INDEX IF EXISTS analytics_features.idx_search_query_log_query_type RENAME TO idx_search_query_log_unpartitioned_query_type;
+ALTER INDEX IF EXISTS analytics_features.idx_search_query_log_feedback RENAME TO idx_search_query_log_unpartitioned_feedback;
+ALTER INDEX IF EXISTS analytics_features.idx_search_click_log_query_id RENAME TO idx_search_click_log_unpartitioned_query_id;
+ALTER INDEX IF EXISTS analytics_features.idx_search_click_log_product_id RENAME TO idx_search_click_log_unpartitioned_product_id;
+ALTER INDEX IF EXISTS analytics_features.idx_search_click_log_clicked_at RENAME TO idx_search_click_log_unpartitioned_clicked_at;
+
+CREATE TABLE analytics_features.search_query_log (
+    query_id BIGINT NOT NULL DEFAULT nextval('analytics_features.search_query_log_query_id_seq'),
+    query_text TEXT NOT NULL,
+    query_type VARCHAR(50),
+    search_type VARCHAR(100),
+    result_count INTEGER,
+    execution_time_ms FLOAT,
+    user_id VARCHAR(100),
+    session_id VARCHAR(100),
+    ip_address INET,
+    timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    metadata JSONB,
+    feedback_type VARCHAR(50),
+    feedback_comment TEXT,
+    feedback_timestamp TIMESTAMPTZ,
+    PRIMARY KEY (query_id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE analytics_features.search_click_log (
+    click_id BIGINT NOT NULL DEFAULT nextval('analytics_features.search_click_log_click_id_seq'),
+    query_id BIGINT,
+    product_id BIGINT NOT NULL,
+    rank_position INTEGER,
+    similarity_score FLOAT,
+    clicked_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    session_id VARCHAR(100),
+    metadata JSONB,
+    PRIMARY KEY (click_id, clicked_at)
+) PARTITION BY RANGE (clicked_at);
+
+ALTER SEQUENCE analytics_features.search_query_log_query_id_seq OWNED BY analytics_features.search_query_log.query_id;
+ALTER SEQUENCE analytics_features.search_click_log_click_id_seq OWNED BY analytics_features.search_click_log.click_id;
+
+CREATE TABLE analytics_features.search_query_log_default PARTITION OF analytics_features.search_query_log DEFAULT;
+CREATE TABLE analytics_features.search_click_log_default PARTITION OF analytics_features.search_click_log DEFAULT;
+
+-- BRIN replaces the btree on time: rows arrive in time order, so the index
+-- stays a few pages per partition and insert cost is negligible
+CREATE INDEX idx_search_query_log_timestamp_brin ON analytics_features.search_query_log USING brin (timestamp);
+CREATE INDEX idx_search_query_log_query_text ON analytics_features.search_query_log(query_text);
+CREATE INDEX idx_search_query_log_query_type ON analytics_features.search_query_log(query_type);
+CREATE INDEX idx_search_query_log_feedback
+ON analytics_features.search_query_log(feedback_type, feedback_timestamp DESC)
+WHERE feedback_type IS NOT NULL;
+
+CREATE INDEX idx_search_click_log_clicked_at_brin ON analytics_features.search_click_log USING brin (clicked_at);
+CREATE INDEX idx_search_click_log_query_id ON analytics_features.search_click_log(query_id);
+CREATE INDEX idx_search_click_log_product_id ON analytics_features.search_click_log(product_id);
+
+-- Monthly partitions from the oldest logged row through two months ahead
+SELECT analytics_features.ensure_search_log_partitions(
+    2,
+    LEAST(
+        (SELECT MIN(timestamp)::date FROM analytics_features.search_query_log_unpartitioned),
+        (SELECT MIN(clicked_at)::date FROM analytics_features.search_click_log_unpartitioned)
+    )
+);
+
+INSERT INTO analytics_features.search_query_log (
+    query_id, query_text, query_type, search_type, result_count, execution_time_ms,
+    user_id, session_id, ip_address, timestamp, metadata,
+    feedback_type, feedback_comment, feedback_timestamp
+)
+SELECT
+    query_id, query_text, query_type, search_type, result_count, execution_time_ms,
+    user_id, session_id, ip_address, timestamp, metadata,
+    feedback_type, feedback_comment, feedback_timestamp
+FROM analytics_features.search_query_log_unpartitioned
+ORDER BY timestamp;
+
+INSERT INTO analytics_features.search_click_log (
+    click_id, query_id, product_id, rank_position, similarity_score,
+    clicked_at, session_id, metadata
+)
+SELECT
+    click_id, query_id, product_id, rank_position, similarity_score,
+    clicked_at, session_id, metadata
+FROM analytics_features.search_click_log_unpartitioned
+ORDER BY clicked_at;
+
+-- ============================================================================
+-- Re-point Dependent Views (they follow the renamed heap tables otherwise)
+-- ============================================================================
+
+CREATE OR REPLACE VIEW analytics_features.v_top_queries AS
+SELECT
+    query_text,
+    query_type,
+    COUNT(*) as query_count,
+    AVG(execution_time_ms) as avg_execution_time,
+    AVG(result_count) as avg_result_count,
+    MAX(timestamp) as last_queried
+FROM analytics_features.search_query_log
+GROUP BY query_text, query_type
+ORDER BY query_count DESC;
+
+CREATE OR REPLACE VIEW analytics_features.v_ctr_by_query_type AS
+SELECT
+    ql.query_type,
+    COUNT(DISTINCT ql.query_id) as total_queries,
+    COUNT(DISTINCT cl.query_id) as queries_with_clicks,
+    ROUND(100.0 * COUNT(DISTINCT cl.query_id) / COUNT(DISTINCT ql.query_id), 2) as ctr_percentage
+FROM analytics_features.search_query_log ql
+LEFT JOIN analytics_features.search_click_log cl ON ql.query_id = cl.query_id
+GROUP BY ql.query_type;
+
+CREATE OR REPLACE VIEW analytics_features.v_top_queries_with_feedback AS
+SELECT
+    query_text,
+    query_type,
+    COUNT(*) as query_count,
+    AVG(execution_time_ms) as avg_execution_time,
+    AVG(result_count) as avg_result_count,
+    COUNT(*) FILTER (WHERE feedback_type = 'helpful') as helpful_count,
+    COUNT(*) FILTER (WHERE feedback_type = 'not_helpful') as not_helpful_count,
+    COUNT(*) FILTER (WHERE feedback_type = 'no_results') as no_results_count,
+    COUNT(*) FILTER (WHERE feedback_type = 'irrelevant') as irrelevant_count,
+    ROUND(100.0 * COUNT(*) FILTER (WHERE feedback_type = 'helpful') /
+          NULLIF(COUNT(*) FILTER (WHERE feedback_type IS NOT NULL), 0), 2) as satisfaction_rate,
+    MAX(timestamp) as last_queried
+FROM analytics_features.search_query_log
+GROUP BY query_text, query_type
+ORDER BY query_count DESC;
+
+CREATE OR REPLACE VIEW analytics_features.v_ctr_by_rank_position AS
+SELECT
+    cl.rank_position,
+    COUNT(*) as click_count,
+    COUNT(DISTINCT cl.query_id) as unique_queries_clicked,
+    ROUND(AVG(cl.similarity_score), 3) as avg_similarity_score
+FROM analytics_features.search_click_log cl
+WHERE cl.rank_position IS NOT NULL
+GROUP BY cl.rank_position
+ORDER BY cl.rank_position;
+
+-- Superseded by refresh_popularity_incremental() (incremental_popularity.sql)
+DROP MATERIALIZED VIEW IF EXISTS analytics_features.mv_product_popularity;
+
+COMMIT;
+
+ANALYZE analytics_features.search_query_log;
+ANALYZE analytics_features.search_click_log;
+
+-- ============================================================================
+-- Usage Notes
+-- ============================================================================
+
+-- Daily (cheap no-op once next months exist):
+-- SELECT analytics_features.ensure_search_log_partitions();
+
+-- Monthly retention: detach partitions older than 13 months into analytics_archive
+-- SELECT analytics_features.archive_search_log_partitions(13);
+-- Archived partitions can be dumped and dropped:
+--   pg_dump -t 'analytics_archive.search_query_log_p2024_*' analytics > search_logs_2024.sql
+-- Or drop without archiving:
+-- SELECT analytics_features.archive_search_log_partitions(13, p_drop => TRUE);
+
+-- Time-bounded queries prune to the matching partitions:
+-- EXPLAIN SELECT COUNT(*) FROM analytics_features.search_query_log
+-- WHERE timestamp >= NOW() - INTERVAL '7 days';
+
+-- After verifying row counts, drop the old heap tables:
+-- DROP TABLE analytics_features.search_click_log_unpartitioned;
+-- DROP TABLE analytics_features.search_query_log_unpartitioned;
+
+-- ============================================================================
+-- Success!
+-- ============================================================================
+
+SELECT
+    'Search Logs Partitioned' as status,
+    (SELECT COUNT(*) FROM analytics_features.search_query_log) as query_rows,
+    (SELECT COUNT(*) FROM analytics_features.search_click_log) as click_rows,
+    (SELECT COUNT(*) FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhparent
+        WHERE c.relname IN ('search_query_log', 'search_click_log')) as partitions;
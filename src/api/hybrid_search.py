@@ -27,6 +27,7 @@ from sentence_transformers import SentenceTransformer
 from src.ml.ranking import rank_search_results, RankingWeights, WEIGHT_PRESETS
 from src.ml.query_normalizer import normalize_query
 from src.config.database import get_postgres_connection
+from src.ml.embedding_store import get_active_embeddings_table, get_active_version
 
 
 # Common SELECT fields for all search queries
@@ -250,13 +251,27 @@ async def vector_semantic_search(
     """
     Vector semantic search using HNSW index
 
+    Reads from the active embedding version (falls back to
+    analytics_features.product_embeddings when none is activated).
+
     Returns results with similarity_score
     """
     # Generate query embedding
     query_embedding: List[float] = model.encode(query).tolist()
 
+    # activate_version refuses mismatched encoders; this covers a pointer
+    # changed by hand or an API started with a different model
+    version = get_active_version()
+    if version is not None and version.embedding_dim != len(query_embedding):
+        print(
+            f"Warning: active embedding version {version.model_version} has {version.embedding_dim} dims, "
+            f"query encoder produces {len(query_embedding)}; skipping vector search"
+        )
+        return []
+
     with get_db_connection() as conn:
         cursor: DictCursor = conn.cursor(cursor_factory=DictCursor)
+        embeddings_table: str = get_active_embeddings_table().as_string(cursor)
 
         sql: str = f"""
             SELECT
@@ -265,7 +280,7 @@ async def vector_semantic_search(
                 0.0 as exact_match_score,
                 0.0 as fulltext_rank,
                 0.0 as trigram_similarity
-            FROM analytics_features.product_embeddings e
+            FROM {embeddings_table} e
             JOIN staging_marts.dim_product p ON e.product_id = p.product_id
             ORDER BY e.embedding <=> %s::vector
             LIMIT %s
@@ -23,6 +23,13 @@ import torch
 
 from dataclasses import dataclass
 from src.ml.ranking import RankingWeights, WEIGHT_PRESETS
+from src.api.search_events import SearchEventWriter, build_event
+from src.ml.learned_ranker import LearnedRanker, LinearRankingModel, ProductFeatureStore
+from src.ml.facet_index import FACETS, FacetIndex
+from src.ml.suggest_index import SuggestIndex
+from src.ml.typo_index import TypoIndex
+from src.ml.snapshot_refresh import SnapshotRefresh, load_and_refresh
+from src.ml.keyword_matcher import KeywordMatcher
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -39,6 +46,8 @@ app = FastAPI(
 DYNAMIC_KEYWORDS: Dict[str, List[str]] = {
     "ukrainian": []
 }
+# Compiled from DYNAMIC_KEYWORDS['ukrainian'] whenever it is (re)loaded
+KEYWORD_MATCHER: KeywordMatcher = KeywordMatcher([])
 
 # CORS middleware
 app.add_middleware(
@@ -66,6 +75,16 @@ ZERO_VECTOR = [0.0] * EMBEDDING_DIM
 # Global model instance (loaded once at startup)
 embedding_model: Optional[SentenceTransformer] = None
 db_pool: Optional[SimpleConnectionPool] = None
+event_writer: Optional[SearchEventWriter] = None
+learned_ranker: Optional[LearnedRanker] = None
+facet_index: Optional[FacetIndex] = None
+suggest_index: Optional[SuggestIndex] = None
+typo_index: Optional[TypoIndex] = None
+
+# Matches fetched for in-memory filtering / facet counting
+FACET_CANDIDATES = int(os.getenv("FACET_CANDIDATES", "1000"))
+# Largest filter match set passed to SQL when the candidate window is full
+FACET_RESTRICT_MAX_IDS = int(os.getenv("FACET_RESTRICT_MAX_IDS", "50000"))
 
 
 # ============================================================================
@@ -83,6 +102,11 @@ class SearchRequest(BaseModel):
 
     # Search-specific fields (for action='search')
     query: Optional[str] = Field(None, description="Natural language search query", min_length=1, max_length=500)
+    filters: Optional[Dict[str, List[str]]] = Field(
+        None,
+        description="Facet filters, e.g. {'supplier_name': ['SEM1'], 'is_for_sale': ['true']} (OR within a facet, AND across)"
+    )
+    include_facets: bool = Field(False, description="Return facet value counts for the matched products")
 
     # Click tracking fields (for action='track_click')
     search_id: Optional[int] = Field(None, description="ID of the search query from search_query_log")
@@ -140,21 +164,78 @@ class SearchResponse(BaseModel):
     # Search-specific fields (for action='search')
     query: Optional[str] = None
     total_results: Optional[int] = None
+    total_results_lower_bound: Optional[bool] = None
     results: Optional[List[ProductResult]] = None
     search_id: Optional[int] = None
+    facets: Optional[Dict[str, Dict[str, int]]] = None
+    corrected_query: Optional[str] = None
+    matched_keywords: Optional[List[str]] = None
 
     # Click tracking fields (for action='track_click')
     click_id: Optional[int] = None
 
 
+class SearchEvent(BaseModel):
+    """One tracking event in a /events batch"""
+    type: str = Field(..., description="Event type: 'click', 'impression' or 'feedback'")
+    search_id: int = Field(..., description="ID of the search query from search_query_log")
+    product_id: Optional[int] = Field(None, description="Product shown or clicked (click/impression)")
+    rank_position: Optional[int] = Field(None, description="Position of product in search results (1-indexed)")
+    feedback_type: Optional[str] = Field(None, description="Type of feedback (feedback)")
+    feedback_comment: Optional[str] = Field(None, description="Optional user comment", max_length=500)
+    session_id: Optional[str] = Field(None, max_length=100)
+
+
+class SearchEventBatch(BaseModel):
+    """Batch of tracking events from one results page"""
+    events: List[SearchEvent] = Field(..., min_length=1, max_length=1000)
+
+
+class SuggestionResult(BaseModel):
+    """One typeahead suggestion"""
+    text: str
+    kind: str = Field(..., description="Source: 'query', 'vendor_code', 'original_number' or 'keyword'")
+    score: float
+
+
+class SuggestResponse(BaseModel):
+    """Response for /suggest"""
+    query: str
+    suggestions: List[SuggestionResult]
+    execution_time_ms: float
+
+
+class SearchEventBatchResponse(BaseModel):
+    """Response for a queued event batch"""
+    success: bool = True
+    accepted: int
+    rejected: int
+    dropped: int
+    execution_time_ms: float
+    errors: Optional[List[str]] = None
+
+
 @dataclass
 class SearchFilters:
-    # No filters - search parses query only
-    pass
+    """Facet filters, applied in memory by the facet index (not in SQL)"""
+    values: Dict[str, Set[str]]
+
+    @classmethod
+    def from_request(cls, filters: Optional[Dict[str, List[str]]]) -> Optional["SearchFilters"]:
+        if not filters:
+            return None
+        unknown = set(filters) - set(FACETS)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown filter(s) {sorted(unknown)}. Must be one of: {list(FACETS)}"
+            )
+        values = {facet: {str(value) for value in selected} for facet, selected in filters.items() if selected}
+        return cls(values) if values else None
 
 
 def _build_filter_clause(filters: Optional[SearchFilters], alias: str = "p") -> Tuple[str, List[Any]]:
-    # No filters - query-only search
+    # Facet filters are applied to the candidate set by the facet index
     return "", []
 
 
@@ -198,6 +279,7 @@ WITH matched_products AS (
     FROM staging_marts.dim_product p
     WHERE 1=1
         {multi_term_where}
+        {restrict_where}
 ),
 scored AS (
     SELECT
@@ -346,7 +428,8 @@ def _execute_unified_search(
     # Build SQL with multi-term placeholders
     sql = UNIFIED_SEARCH_SQL_TEMPLATE.format(
         multi_term_where=multi_term_where,
-        multi_term_conditions=multi_term_conditions
+        multi_term_conditions=multi_term_conditions,
+        restrict_where="AND p.product_id = ANY(%s)" if restrict_product_ids is not None else "",
     )
 
     # Check if we have any terms
@@ -368,6 +451,8 @@ def _execute_unified_search(
 
     # WHERE clause parameters (from all_term_params)
     params.extend(all_term_params)
+    if restrict_product_ids is not None:
+        params.append(list(restrict_product_ids))
 
     # LIMIT and OFFSET
     params.extend([
@@ -446,10 +531,21 @@ def detect_device() -> str:
 # Startup/Shutdown Events
 # ============================================================================
 
+def _start_snapshot(snapshot: SnapshotRefresh, refresh_env: str, unit: str):
+    """Load an in-memory index now and refresh it every `refresh_env` seconds"""
+    load_and_refresh(
+        snapshot,
+        lambda: psycopg2.connect(**DB_CONFIG),
+        interval_seconds=float(os.getenv(refresh_env, str(snapshot.refresh_interval))),
+    )
+    logger.info(f"✅ {snapshot.refresh_label} loaded ({snapshot.size:,} {unit})")
+    return snapshot
+
+
 @app.on_event("startup")
 async def startup_event():
     """Load embedding model and dynamic keywords on startup"""
-    global embedding_model, DYNAMIC_KEYWORDS, db_pool
+    global embedding_model, DYNAMIC_KEYWORDS, KEYWORD_MATCHER, db_pool, event_writer, learned_ranker, facet_index, suggest_index, typo_index
 
     try:
         device = detect_device()
@@ -485,6 +581,63 @@ async def startup_event():
         logger.error(f"Failed to initialise database pool: {e}")
         raise
 
+    event_writer = SearchEventWriter(
+        connect=lambda: psycopg2.connect(**DB_CONFIG),
+        batch_size=int(os.getenv("SEARCH_EVENT_BATCH_SIZE", "1000")),
+        flush_interval=float(os.getenv("SEARCH_EVENT_FLUSH_INTERVAL", "1.0")),
+        max_queue=int(os.getenv("SEARCH_EVENT_QUEUE_SIZE", "50000")),
+    )
+    event_writer.start()
+
+    model_path = os.getenv("LEARNED_RANKER_MODEL", "models/learned_ranker.json")
+    if os.path.exists(model_path):
+        try:
+            model = LinearRankingModel.load(model_path)
+            store = _start_snapshot(
+                ProductFeatureStore(model.feature_names), "LEARNED_RANKER_REFRESH_SECONDS", "products"
+            )
+            learned_ranker = LearnedRanker(
+                model,
+                store,
+                top_n=int(os.getenv("LEARNED_RANKER_TOP_N", "100")),
+                budget_ms=float(os.getenv("LEARNED_RANKER_BUDGET_MS", "5")),
+            )
+            logger.info(f"✅ Learned ranker {model.version} enabled")
+        except Exception as e:
+            learned_ranker = None
+            logger.warning(f"Failed to enable learned ranker: {e}. Using static ranking.")
+    else:
+        logger.info(f"No learned ranker model at {model_path}, using static ranking")
+
+    if os.getenv("FACET_INDEX_ENABLED", "true").lower() == "true":
+        try:
+            facet_index = _start_snapshot(FacetIndex(), "FACET_REFRESH_SECONDS", "products")
+        except Exception as e:
+            facet_index = None
+            logger.warning(f"Failed to load facet index: {e}. Filters and facets disabled.")
+
+    if os.getenv("SUGGEST_INDEX_ENABLED", "true").lower() == "true":
+        try:
+            suggest_index = _start_snapshot(
+                SuggestIndex(max_queries=int(os.getenv("SUGGEST_MAX_QUERIES", "50000"))),
+                "SUGGEST_REFRESH_SECONDS",
+                "keys",
+            )
+        except Exception as e:
+            suggest_index = None
+            logger.warning(f"Failed to load suggest index: {e}. /suggest disabled.")
+
+    if os.getenv("TYPO_INDEX_ENABLED", "true").lower() == "true":
+        try:
+            typo_index = _start_snapshot(
+                TypoIndex(max_distance=int(os.getenv("TYPO_MAX_DISTANCE", "1"))),
+                "TYPO_REFRESH_SECONDS",
+                "terms",
+            )
+        except Exception as e:
+            typo_index = None
+            logger.warning(f"Failed to load typo index: {e}. Typo fallback disabled.")
+
     try:
         logger.info("Loading dynamic keywords from database...")
         with get_db_connection() as conn:
@@ -505,19 +658,36 @@ async def startup_event():
                     ukrainian_keywords.append(row['keyword'])
 
             DYNAMIC_KEYWORDS['ukrainian'] = ukrainian_keywords
+            KEYWORD_MATCHER = KeywordMatcher(ukrainian_keywords)
 
             logger.info(f"✅ Loaded {len(ukrainian_keywords)} Ukrainian keywords")
 
     except Exception as e:
         logger.warning(f"Failed to load dynamic keywords: {e}. Using fallback classification.")
         DYNAMIC_KEYWORDS['ukrainian'] = []
+        KEYWORD_MATCHER = KeywordMatcher([])
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down search API")
-    global db_pool
+    global db_pool, event_writer, learned_ranker, facet_index, suggest_index, typo_index
+    if event_writer is not None:
+        event_writer.stop()
+        event_writer = None
+    if learned_ranker is not None:
+        learned_ranker.store.stop_refresh()
+        learned_ranker = None
+    if facet_index is not None:
+        facet_index.stop_refresh()
+        facet_index = None
+    if suggest_index is not None:
+        suggest_index.stop_refresh()
+        suggest_index = None
+    if typo_index is not None:
+        typo_index.stop_refresh()
+        typo_index = None
     if db_pool is not None:
         db_pool.closeall()
         db_pool = None
@@ -792,6 +962,10 @@ def preprocess_search_query(query: str) -> ProcessedQuery:
     )
 
 
+VENDOR_CODE_PATTERN: re.Pattern = re.compile(r'^[A-Z0-9\-_]{5,30}$', re.IGNORECASE)
+CYRILLIC_PATTERN: re.Pattern = re.compile(r'[А-Яа-яЁёІіЇїЄєҐґ]')
+
+
 def classify_query(query: str) -> QueryType:
     """
     Intelligent query classification using dynamic keyword learning
@@ -803,34 +977,44 @@ def classify_query(query: str) -> QueryType:
 
     Keywords are automatically extracted from 278k products and refreshed periodically.
     This ensures the classifier adapts to the actual product catalog.
+    Keyword lookup is one pass of the Aho-Corasick matcher over the query,
+    independent of the number of keywords.
     """
     query_stripped: str = query.strip()
-    query_lower: str = query_stripped.lower()
 
-    vendor_code_pattern: re.Pattern = re.compile(r'^[A-Z0-9\-_]{5,30}$', re.IGNORECASE)
-    if vendor_code_pattern.match(query_stripped):
+    if VENDOR_CODE_PATTERN.match(query_stripped):
         return QueryType.VENDOR_CODE
 
-    cyrillic_pattern: re.Pattern = re.compile(r'[А-Яа-яЁёІіЇїЄєҐґ]')
-    has_cyrillic: bool = bool(cyrillic_pattern.search(query_stripped))
+    has_cyrillic: bool = bool(CYRILLIC_PATTERN.search(query_stripped))
 
     if has_cyrillic:
         if len(query_stripped.split()) <= 5:
             return QueryType.EXACT_PHRASE
 
-        if DYNAMIC_KEYWORDS['ukrainian']:
-            if any(keyword in query_lower for keyword in DYNAMIC_KEYWORDS['ukrainian']):
-                return QueryType.EXACT_PHRASE
+        if KEYWORD_MATCHER.contains_any(query_stripped):
+            return QueryType.EXACT_PHRASE
 
     return QueryType.NATURAL_LANGUAGE
 
 
+def match_query_keywords(query: str) -> List[str]:
+    """Catalog keywords contained in the query (for ranking and logging)"""
+    return KEYWORD_MATCHER.find(query)
+
+
 def log_search_query(query: str, total_results: int, execution_time_ms: float,
                      search_type: str = "hybrid", user_id: Optional[str] = None,
-                     session_id: Optional[str] = None) -> Optional[int]:
+                     session_id: Optional[str] = None,
+                     result_product_ids: Optional[List[int]] = None,
+                     result_offset: int = 0,
+                     corrected_query: Optional[str] = None) -> Optional[int]:
     """
     Log search query to database for analytics and learning-to-rank
 
+    The returned page is stored as an int4[] of product ids in rank order on
+    the same row (impressions without a row per product). `query` is the
+    query as typed; `corrected_query` is the typo-corrected retry, if any.
+
     Returns:
         search_id (int): ID of the logged search query (query_id), or None if logging failed
     """
@@ -840,10 +1024,12 @@ def log_search_query(query: str, total_results: int, execution_time_ms: float,
 
             cursor.execute("""
                 INSERT INTO analytics_features.search_query_log
-                    (query_text, result_count, execution_time_ms, search_type, user_id, session_id, timestamp)
-                VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                    (query_text, result_count, execution_time_ms, search_type, user_id, session_id,
+                     result_product_ids, result_offset, corrected_query, timestamp)
+                VALUES (%s, %s, %s, %s, %s, %s, %s::integer[], %s, %s, NOW())
                 RETURNING query_id
-            """, (query, total_results, execution_time_ms, search_type, user_id, session_id))
+            """, (query, total_results, execution_time_ms, search_type, user_id, session_id,
+                  result_product_ids, result_offset, corrected_query))
 
             row = cursor.fetchone()
             search_id = row['query_id'] if row else None
@@ -872,12 +1058,14 @@ async def root():
         "description": "Universal AI-powered product search API with single unified endpoint",
         "endpoints": {
             "search": "POST /search - Universal endpoint (handles search, click tracking, and feedback)",
+            "events": "POST /events - Batched clicks, impressions and feedback (queued, written in bulk)",
+            "suggest": "GET /suggest?q=... - Typeahead suggestions from an in-memory prefix index",
             "health": "GET /health - Health check"
         },
         "actions": {
             "search": {
                 "description": "Product search with hybrid AI/ML ranking",
-                "parameters": {"action": "search", "query": "required", "filters": "optional"}
+                "parameters": {"action": "search", "query": "required", "filters": "optional", "include_facets": "optional"}
             },
             "track_click": {
                 "description": "Track user clicks for learning-to-rank",
@@ -1004,9 +1192,13 @@ async def _handle_search(request: SearchRequest, start_time: float, limit: int,
         )
 
     query_type: QueryType = classify_query(request.query)
+    matched_keywords: List[str] = match_query_keywords(request.query)
+    logger.debug(f"Query '{request.query}' classified as {query_type.value}, keywords={matched_keywords}")
 
-    # No filters - query-only search
-    filters = None
+    filters = SearchFilters.from_request(request.filters)
+    faceted = filters is not None or request.include_facets
+    if faceted and facet_index is None:
+        raise HTTPException(status_code=503, detail="Facet index unavailable")
 
     # Auto-select ranking preset based on query type
     preset_key = 'exact_priority' if query_type in {QueryType.VENDOR_CODE, QueryType.EXACT_PHRASE} else 'balanced'
@@ -1029,19 +1221,81 @@ async def _handle_search(request: SearchRequest, start_time: float, limit: int,
 
     fetch_limit = min(limit + offset + 50, 200)
 
+    # Re-ranking and faceting work on a window starting at the first match:
+    # re-ranking always re-scores the same static top-N whatever the offset,
+    # so pages never overlap or skip rows; faceting filters and counts the
+    # top FACET_CANDIDATES matches in memory. The page is sliced afterwards.
+    # Pages starting past the top-N are in static order either way, so SQL
+    # applies LIMIT/OFFSET directly.
+    rerank = learned_ranker is not None and offset < learned_ranker.top_n
+    windowed = rerank or faceted
+    window_size = offset + limit if windowed else limit
+    if rerank:
+        window_size = max(window_size, learned_ranker.top_n)
+    if faceted:
+        window_size = max(window_size, FACET_CANDIDATES)
+    page_target = offset + limit if windowed else limit
+
     rows, total_count = _execute_unified_search(
         query_text=request.query,
         embedding_vector=embedding_vector,
         filters=filters,
         ranking_weights=weights,
         fetch_limit=fetch_limit,
-        result_limit=limit,
-        result_offset=offset,
+        result_limit=window_size,
+        result_offset=0 if windowed else offset,
     )
 
+    # Typo fallback: nothing matched, retry once with unknown terms replaced
+    # by their closest vendor code / keyword (edit distance 1-2)
+    corrected_query: Optional[str] = None
+    if total_count == 0 and typo_index is not None:
+        corrected_query = typo_index.correct_query(request.query)
+        if corrected_query:
+            logger.info(f"No matches for '{request.query}', retrying as '{corrected_query}'")
+            rows, total_count = _execute_unified_search(
+                query_text=corrected_query,
+                embedding_vector=embedding_vector,
+                filters=filters,
+                ranking_weights=weights,
+                fetch_limit=fetch_limit,
+                result_limit=window_size,
+                result_offset=0 if windowed else offset,
+            )
+
+    # Facet counts cover the top FACET_CANDIDATES matches. Filters do too
+    # unless the window is full: then the search is re-run restricted to the
+    # products matching the filters, or, if too many do, the total is only
+    # what the window held and is flagged as a lower bound.
+    facets: Optional[Dict[str, Dict[str, int]]] = None
+    total_lower_bound: Optional[bool] = None
+    if faceted:
+        candidate_ids = [row['product_id'] for row in rows]
+        if request.include_facets:
+            facets = facet_index.facet_counts(candidate_ids, filters.values if filters else None)
+        if filters:
+            window_full = len(rows) >= window_size
+            if window_full and facet_index.match_count(filters.values) <= FACET_RESTRICT_MAX_IDS:
+                rows, total_count = _execute_unified_search(
+                    query_text=corrected_query or request.query,
+                    embedding_vector=embedding_vector,
+                    filters=filters,
+                    ranking_weights=weights,
+                    fetch_limit=fetch_limit,
+                    result_limit=window_size,
+                    result_offset=0,
+                    restrict_product_ids=facet_index.matching_ids(filters.values),
+                )
+            else:
+                kept = set(facet_index.filter(candidate_ids, filters.values))
+                rows = [row for row in rows if row['product_id'] in kept]
+                total_count = len(rows)
+                total_lower_bound = window_full
+
     seen_ids: Set[int] = {row['product_id'] for row in rows}
 
-    if total_count < offset + limit:
+    # Analogue expansion is unfiltered, so it is skipped when filters are set
+    if filters is None and total_count < offset + limit:
         base_ids = [row['product_id'] for row in rows]
         analogue_ids = _fetch_analogue_product_ids(base_ids, seen_ids, limit + fetch_limit)
 
@@ -1063,13 +1317,22 @@ async def _handle_search(request: SearchRequest, start_time: float, limit: int,
                     continue
                 rows.append(row)
                 seen_ids.add(pid)
-                if len(rows) >= limit:
+                if len(rows) >= page_target:
                     break
 
-            total_count = max(total_count, offset + len(rows))
+            total_count = max(total_count, len(rows) if windowed else offset + len(rows))
 
     rows.sort(key=lambda r: (-float(r.get('final_score', 0.0)), r.get('product_id')))
 
+    if rerank:
+        head = rows[:learned_ranker.top_n]
+        if learned_ranker.rerank(head):
+            head.sort(key=lambda r: (-float(r.get('final_score', 0.0)), r.get('product_id')))
+            rows = head + rows[learned_ranker.top_n:]
+
+    if windowed:
+        rows = rows[offset:offset + limit]
+
     execution_time_ms = (time.perf_counter() - start_time) * 1000
 
     products: List[ProductResult] = [
@@ -1103,7 +1366,10 @@ async def _handle_search(request: SearchRequest, start_time: float, limit: int,
         query=request.query,
         total_results=total_count,
         execution_time_ms=execution_time_ms,
-        search_type="adaptive"
+        search_type="adaptive",
+        result_product_ids=[product.product_id for product in products],
+        result_offset=offset,
+        corrected_query=corrected_query,
     )
 
     return SearchResponse(
@@ -1112,8 +1378,12 @@ async def _handle_search(request: SearchRequest, start_time: float, limit: int,
         execution_time_ms=round(execution_time_ms, 2),
         query=request.query,
         total_results=total_count,
+        total_results_lower_bound=total_lower_bound,
         results=products,
-        search_id=search_id
+        search_id=search_id,
+        facets=facets,
+        corrected_query=corrected_query,
+        matched_keywords=matched_keywords or None
     )
 
 
@@ -1211,6 +1481,84 @@ async def _handle_feedback(request: SearchRequest, start_time: float) -> SearchR
     )
 
 
+@app.get("/suggest", response_model=SuggestResponse)
+async def suggest_endpoint(
+    q: str = Query(..., min_length=1, max_length=100, description="Typed prefix"),
+    limit: int = Query(10, ge=1, le=50, description="Maximum suggestions"),
+):
+    """
+    **TYPEAHEAD - vendor codes, original numbers, keywords and popular queries**
+
+    Served from an in-memory prefix index rebuilt in the background; the
+    prefix is matched with dots, dashes, slashes and spaces ignored, and
+    results are ordered by popularity. Suggest requests are not logged.
+
+    **Performance**: no database round-trip on the request path
+    """
+    start_time = time.perf_counter()
+
+    if suggest_index is None:
+        raise HTTPException(status_code=503, detail="Suggest index unavailable")
+
+    suggestions = suggest_index.suggest(q, limit=limit)
+    execution_time_ms = (time.perf_counter() - start_time) * 1000
+
+    return SuggestResponse(
+        query=q,
+        suggestions=[
+            SuggestionResult(text=s.text, kind=s.kind, score=s.score) for s in suggestions
+        ],
+        execution_time_ms=round(execution_time_ms, 3),
+    )
+
+
+@app.post("/events", response_model=SearchEventBatchResponse, status_code=202)
+async def search_events_endpoint(batch: SearchEventBatch):
+    """
+    **BATCHED TRACKING - clicks, impressions and feedback in one request**
+
+    Events are shape-checked and queued; a background writer COPYs them into
+    the search logs in batches and drops events whose search_id is unknown
+    (validated once per batch, not per event). Prefer this over
+    action='track_click' / 'feedback' on /search for results pages that
+    report many events.
+
+    **Performance**: no database round-trip on the request path
+    """
+    start_time = time.perf_counter()
+
+    if event_writer is None:
+        raise HTTPException(status_code=503, detail="Event writer unavailable")
+
+    events = []
+    errors: List[str] = []
+    for index, event in enumerate(batch.events):
+        try:
+            events.append(build_event(
+                event.type,
+                event.search_id,
+                product_id=event.product_id,
+                rank_position=event.rank_position,
+                feedback_type=event.feedback_type,
+                feedback_comment=event.feedback_comment,
+                session_id=event.session_id,
+            ))
+        except ValueError as e:
+            errors.append(f"events[{index}]: {e}")
+
+    accepted = event_writer.enqueue(events)
+    execution_time_ms = (time.perf_counter() - start_time) * 1000
+
+    return SearchEventBatchResponse(
+        success=not errors and accepted == len(events),
+        accepted=accepted,
+        rejected=len(errors),
+        dropped=len(events) - accepted,
+        execution_time_ms=round(execution_time_ms, 2),
+        errors=errors[:20] or None,
+    )
+
+
 # ============================================================================
 # Run with: uvicorn src.api.search_api:app --reload --port 8000
 # ============================================================================
@@ -0,0 +1,328 @@
+"""
+Write-behind queue for search tracking events
+
+The /events endpoint only checks event shape and enqueues; a background
+thread drains the queue every `flush_interval` seconds (or as soon as
+`batch_size` events are waiting) and writes each batch in one transaction:
+
+    COPY batch -> temp staging table
+    INSERT ... SELECT per event type, keeping only events whose search_id
+        exists in search_query_log (one semi-join for the whole batch)
+    UPDATE search_query_log with the latest feedback per search
+
+so a results page reporting 20 impressions and a click costs one round of
+statements per flush instead of a SELECT + INSERT + COMMIT per event.
+
+The writer owns its own connection (psycopg2's SimpleConnectionPool is not
+thread-safe) and reconnects after a failed flush.
+"""
+
+import logging
+import queue
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, List, Optional, Sequence
+
+from src.transform.copy_utils import copy_rows, copy_text_line
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("click", "impression", "feedback")
+FEEDBACK_TYPES = {"helpful", "not_helpful", "no_results", "irrelevant"}
+
+STAGING_TABLE = "search_event_staging"
+STAGING_COLUMNS = (
+    "event_type", "query_id", "product_id", "rank_position",
+    "feedback_type", "feedback_comment", "session_id", "occurred_at",
+)
+
+CREATE_STAGING_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+        event_type TEXT NOT NULL,
+        query_id BIGINT NOT NULL,
+        product_id BIGINT,
+        rank_position INTEGER,
+        feedback_type TEXT,
+        feedback_comment TEXT,
+        session_id TEXT,
+        occurred_at TIMESTAMPTZ NOT NULL
+    ) ON COMMIT DELETE ROWS
+"""
+
+_VALID_SEARCH = """
+    EXISTS (
+        SELECT 1 FROM analytics_features.search_query_log q
+        WHERE q.query_id = s.query_id
+    )
+"""
+
+# Clicks take the insert time: the popularity and rollup refreshes read
+# search_click_log by id high-water mark and rely on clicked_at tracking
+# commit order
+INSERT_CLICKS_SQL = f"""
+    INSERT INTO analytics_features.search_click_log
+        (query_id, product_id, rank_position, clicked_at, session_id)
+    SELECT s.query_id, s.product_id, s.rank_position, NOW(), s.session_id
+    FROM {STAGING_TABLE} s
+    WHERE s.event_type = 'click' AND {_VALID_SEARCH}
+"""
+
+INSERT_IMPRESSIONS_SQL = f"""
+    INSERT INTO analytics_features.search_impression_log
+        (query_id, product_id, rank_position, impressed_at, session_id)
+    SELECT s.query_id, s.product_id, s.rank_position, s.occurred_at, s.session_id
+    FROM {STAGING_TABLE} s
+    WHERE s.event_type = 'impression' AND {_VALID_SEARCH}
+"""
+
+INSERT_FEEDBACK_SQL = f"""
+    INSERT INTO analytics_features.search_feedback_log
+        (query_id, feedback_type, feedback_comment, submitted_at, session_id)
+    SELECT s.query_id, s.feedback_type, s.feedback_comment, s.occurred_at, s.session_id
+    FROM {STAGING_TABLE} s
+    WHERE s.event_type = 'feedback' AND {_VALID_SEARCH}
+"""
+
+APPLY_FEEDBACK_SQL = f"""
+    UPDATE analytics_features.search_query_log q
+    SET feedback_type = f.feedback_type,
+        feedback_comment = f.feedback_comment,
+        feedback_timestamp = f.occurred_at
+    FROM (
+        SELECT DISTINCT ON (query_id) query_id, feedback_type, feedback_comment, occurred_at
+        FROM {STAGING_TABLE}
+        WHERE event_type = 'feedback'
+        ORDER BY query_id, occurred_at DESC
+    ) f
+    WHERE q.query_id = f.query_id
+"""
+
+
+@dataclass
+class SearchEvent:
+    """One tracking event, already shape-checked"""
+    event_type: str
+    query_id: int
+    product_id: Optional[int] = None
+    rank_position: Optional[int] = None
+    feedback_type: Optional[str] = None
+    feedback_comment: Optional[str] = None
+    session_id: Optional[str] = None
+    occurred_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def copy_line(self) -> str:
+        return copy_text_line((
+            self.event_type, self.query_id, self.product_id, self.rank_position,
+            self.feedback_type, self.feedback_comment, self.session_id,
+            self.occurred_at.isoformat(),
+        ))
+
+
+def build_event(event_type: str, search_id: Optional[int], product_id: Optional[int] = None,
+                rank_position: Optional[int] = None, feedback_type: Optional[str] = None,
+                feedback_comment: Optional[str] = None, session_id: Optional[str] = None) -> SearchEvent:
+    """
+    Validate event shape and build a SearchEvent
+
+    Raises:
+        ValueError: Unknown type or fields missing for the type
+    """
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Invalid event type '{event_type}'. Must be one of: {EVENT_TYPES}")
+    if search_id is None:
+        raise ValueError("search_id is required")
+    if event_type in ("click", "impression") and product_id is None:
+        raise ValueError(f"product_id is required for {event_type} events")
+    if event_type == "feedback" and feedback_type not in FEEDBACK_TYPES:
+        raise ValueError(f"Invalid feedback_type. Must be one of: {FEEDBACK_TYPES}")
+
+    return SearchEvent(
+        event_type=event_type,
+        query_id=search_id,
+        product_id=product_id,
+        rank_position=rank_position,
+        feedback_type=feedback_type,
+        feedback_comment=feedback_comment,
+        session_id=session_id,
+    )
+
+
+@dataclass
+class EventWriterStats:
+    """Counters since startup"""
+    enqueued: int = 0
+    dropped: int = 0
+    written: int = 0
+    rejected: int = 0
+    failed: int = 0
+    flushes: int = 0
+
+
+class SearchEventWriter:
+    """
+    Background writer draining a bounded event queue into the search logs
+
+    Args:
+        connect: Zero-argument factory returning a new psycopg2 connection
+        batch_size: Max events per flush transaction
+        flush_interval: Seconds between flushes when the queue is not full
+        max_queue: Events buffered before enqueue starts dropping
+        max_retries: Later flushes that retry a failed batch (on a new
+            connection) before its events are dropped
+    """
+
+    def __init__(self, connect: Callable[[], Any], batch_size: int = 1000,
+                 flush_interval: float = 1.0, max_queue: int = 50000, max_retries: int = 1):
+        self.connect = connect
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.stats = EventWriterStats()
+
+        self._queue: "queue.Queue[SearchEvent]" = queue.Queue(maxsize=max_queue)
+        self._conn = None
+        self._retry_batch: List[SearchEvent] = []
+        self._retry_attempts = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def enqueue(self, events: Sequence[SearchEvent]) -> int:
+        """Queue events without blocking; returns how many were accepted"""
+        accepted = 0
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+                accepted += 1
+            except queue.Full:
+                break
+
+        dropped = len(events) - accepted
+        self.stats.enqueued += accepted
+        if dropped:
+            self.stats.dropped += dropped
+            logger.warning(f"Search event queue full, dropped {dropped} event(s)")
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return accepted
+
+    def pending(self) -> int:
+        return self._queue.qsize() + len(self._retry_batch)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="search-event-writer", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Search event writer started (batch_size={self.batch_size}, "
+            f"flush_interval={self.flush_interval}s)"
+        )
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the thread and flush whatever is still queued"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        while self.pending() and self.flush():
+            pass
+        if self._retry_batch:
+            self.stats.failed += len(self._retry_batch)
+            logger.error(f"Dropping {len(self._retry_batch)} search event(s) still failing at shutdown")
+            self._retry_batch = []
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        logger.info(
+            f"Search event writer stopped (written={self.stats.written}, "
+            f"rejected={self.stats.rejected}, dropped={self.stats.dropped}, failed={self.stats.failed})"
+        )
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            while self.pending() and not self._stop.is_set():
+                if not self.flush():
+                    break
+
+    def _drain(self) -> List[SearchEvent]:
+        batch: List[SearchEvent] = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self) -> int:
+        """
+        Write one batch now (a previously failed batch first)
+
+        Returns the number of events written or dropped; 0 when there was
+        nothing to write or the batch failed and is kept for a retry.
+        """
+        with self._flush_lock:
+            batch = self._retry_batch or self._drain()
+            if not batch:
+                return 0
+
+            try:
+                written = self._write(batch)
+            except Exception as e:
+                self._reset_connection()
+                if self._retry_attempts < self.max_retries:
+                    self._retry_attempts += 1
+                    self._retry_batch = batch
+                    logger.warning(f"Failed to write {len(batch)} search event(s), will retry: {e}")
+                    return 0
+                self.stats.failed += len(batch)
+                logger.error(f"Failed to write {len(batch)} search event(s), dropping them: {e}")
+                self._retry_batch = []
+                self._retry_attempts = 0
+                return len(batch)
+
+            self._retry_batch = []
+            self._retry_attempts = 0
+            self.stats.flushes += 1
+            self.stats.written += written
+            self.stats.rejected += len(batch) - written
+            return len(batch)
+
+    def _write(self, batch: Sequence[SearchEvent]) -> int:
+        if self._conn is None:
+            self._conn = self.connect()
+            self._conn.autocommit = False
+
+        cursor = self._conn.cursor()
+        try:
+            cursor.execute(CREATE_STAGING_SQL)
+            copy_rows(cursor, STAGING_TABLE, STAGING_COLUMNS, (event.copy_line() for event in batch))
+
+            written = 0
+            for statement in (INSERT_CLICKS_SQL, INSERT_IMPRESSIONS_SQL, INSERT_FEEDBACK_SQL):
+                cursor.execute(statement)
+                written += max(cursor.rowcount, 0)
+
+            if any(event.event_type == "feedback" for event in batch):
+                cursor.execute(APPLY_FEEDBACK_SQL)
+
+            self._conn.commit()
+            return written
+        finally:
+            cursor.close()
+
+    def _reset_connection(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._conn.rollback()
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
@@ -1,39 +1,46 @@
 from __future__ import annotations
 
-import json
 import os
-from datetime import datetime
 from typing import Any, Dict, Iterable, List
 
 from kafka import KafkaConsumer
 from prefect import flow, get_run_logger, task
 
+from ingestion.utils.kafka_records import (
+    bootstrap_servers,
+    deserialize_key,
+    deserialize_value,
+    message_to_record,
+    next_offsets,
+)
+from ingestion.utils.landing_writer import LandingWriter
 from ingestion.utils.minio_client import MinioClientFactory
 
 
-def _deserialize(value: bytes | None) -> Any:
-    if value is None:
-        return None
-    try:
-        return json.loads(value.decode("utf-8"))
-    except (json.JSONDecodeError, UnicodeDecodeError):
-        return value.decode("utf-8", errors="ignore")
+def _group_id() -> str:
+    """
+    Consumer group of the one-shot flow, separate from the streaming consumer's.
+
+    The offset commit runs on a consumer that never joins the group, which
+    the broker only accepts while the group has no live members; sharing the
+    streaming consumer's group would also rebalance it on every batch.
+    """
+    streaming_group = os.getenv("KAFKA_CONSUMER_GROUP", "prefect-product-loader")
+    return os.getenv("KAFKA_BATCH_CONSUMER_GROUP", f"{streaming_group}-batch")
 
 
 @task(retries=3, retry_delay_seconds=30)
 def fetch_kafka_batch(topic: str, max_records: int = 1000) -> List[Dict[str, Any]]:
     logger = get_run_logger()
-    bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
-    group_id = os.getenv("KAFKA_CONSUMER_GROUP", "prefect-product-loader")
 
     consumer = KafkaConsumer(
         topic,
-        bootstrap_servers=[s.strip() for s in bootstrap_servers.split(",")],
-        group_id=group_id,
+        bootstrap_servers=bootstrap_servers(),
+        group_id=_group_id(),
         auto_offset_reset=os.getenv("KAFKA_AUTO_OFFSET_RESET", "earliest"),
         enable_auto_commit=False,
-        value_deserializer=lambda v: _deserialize(v),
-        key_deserializer=lambda v: v.decode("utf-8") if v else None,
+        value_deserializer=deserialize_value,
+        key_deserializer=deserialize_key,
         consumer_timeout_ms=2000,
     )
 
@@ -42,22 +49,7 @@ def fetch_kafka_batch(topic: str, max_records: int = 1000) -> List[Dict[str, Any
         polled = consumer.poll(timeout_ms=1000, max_records=max_records)
         for partition_records in polled.values():
             for message in partition_records:
-                record = {
-                    "topic": message.topic,
-                    "partition": message.partition,
-                    "offset": message.offset,
-                    "timestamp": message.timestamp,
-                    "key": message.key,
-                    "value": message.value,
-                    "headers": [
-                        {
-                            "key": header[0],
-                            "value": header[1].decode("utf-8", errors="ignore") if header[1] else None,
-                        }
-                        for header in (message.headers or [])
-                    ],
-                }
-                records.append(record)
+                records.append(message_to_record(message))
         logger.info("Fetched %s records from topic %s", len(records), topic)
         return records
     finally:
@@ -65,28 +57,47 @@ def fetch_kafka_batch(topic: str, max_records: int = 1000) -> List[Dict[str, Any
 
 
 @task
-def write_to_minio(records: Iterable[Dict[str, Any]], bucket: str, prefix: str) -> Dict[str, Any]:
+def write_to_minio(
+    records: Iterable[Dict[str, Any]],
+    bucket: str,
+    prefix: str,
+    landing_format: str = "parquet",
+) -> Dict[str, Any]:
     logger = get_run_logger()
     records_list = list(records)
 
     if not records_list:
         logger.info("No records fetched; skipping MinIO write.")
-        return {"bucket": bucket, "key": None, "record_count": 0}
-
-    client = MinioClientFactory.create()
-    timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    key = f"{prefix}/batch={timestamp}.jsonl"
-    body = "\n".join(json.dumps(record) for record in records_list)
-
-    client.put_object(
-        Bucket=bucket,
-        Key=key,
-        Body=body.encode("utf-8"),
-        ContentType="application/json",
+        return {"bucket": bucket, "keys": [], "record_count": 0}
+
+    writer = LandingWriter(MinioClientFactory.create(), bucket, prefix, fmt=landing_format)
+    written = writer.write(records_list)
+
+    for key, count in written:
+        logger.info("Wrote %s records to s3://%s/%s", count, bucket, key)
+    return {"bucket": bucket, "keys": [key for key, _ in written], "record_count": len(records_list)}
+
+
+@task(retries=3, retry_delay_seconds=10)
+def commit_kafka_offsets(records: Iterable[Dict[str, Any]]) -> int:
+    """Commit offsets of records already written to MinIO so the next run continues after them."""
+    logger = get_run_logger()
+    offsets = next_offsets(records)
+    if not offsets:
+        return 0
+
+    consumer = KafkaConsumer(
+        bootstrap_servers=bootstrap_servers(),
+        group_id=_group_id(),
+        enable_auto_commit=False,
     )
+    try:
+        consumer.commit(offsets)
+    finally:
+        consumer.close()
 
-    logger.info("Wrote %s records to s3://%s/%s", len(records_list), bucket, key)
-    return {"bucket": bucket, "key": key, "record_count": len(records_list)}
+    logger.info("Committed offsets for %s partition(s)", len(offsets))
+    return len(offsets)
 
 
 @flow
@@ -95,9 +106,18 @@ def kafka_to_minio_flow(
     bucket: str = os.getenv("MINIO_RAW_BUCKET", "cord-raw"),
     prefix: str = "product/raw",
     max_records: int = 1000,
+    landing_format: str = os.getenv("LANDING_FORMAT", "parquet"),
 ):
+    """
+    One-shot batch: poll, write, commit.
+
+    For continuous ingestion use the streaming consumer instead:
+        python -m ingestion.services.kafka_minio_consumer
+    """
     records = fetch_kafka_batch(topic=topic, max_records=max_records)
-    return write_to_minio(records=records, bucket=bucket, prefix=prefix)
+    result = write_to_minio(records=records, bucket=bucket, prefix=prefix, landing_format=landing_format)
+    commit_kafka_offsets(records)
+    return result
 
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+# Long-running ingestion services (run outside Prefect)
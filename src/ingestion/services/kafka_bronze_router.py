@@ -0,0 +1,415 @@
+"""
+Kafka -> bronze router for the product ecosystem topics.
+
+Consumes every topic captured by sqlserver-product-ecosystem.json (31 tables)
+in one consumer group and routes each topic to its bronze table:
+
+    cord.ConcordDb.dbo.ProductAvailability  ->  bronze.product_availability_cdc
+    cord.dbo.Product                        ->  bronze.product_cdc
+
+Records are buffered per table and flushed with one set-based INSERT per
+table batch (ON CONFLICT on topic/partition/offset, so redelivery is
+harmless). Ready tables are flushed concurrently, each on its own
+connection; offsets are committed only after their table's rows are
+committed. Messages flattened by ExtractNewRecordState are wrapped back into
+the {"payload": {"after": ...}} envelope that the staging views parse.
+
+Usage (from src/):
+    python -m ingestion.services.kafka_bronze_router
+    python -m ingestion.services.kafka_bronze_router --workers 4 --max-records 20000
+
+Environment:
+    KAFKA_BOOTSTRAP_SERVERS, KAFKA_BRONZE_GROUP, KAFKA_BRONZE_TOPIC_PATTERN,
+    STAGING_DB_HOST/PORT/NAME/USER/PASSWORD (fall back to POSTGRES_*)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import re
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from kafka import ConsumerRebalanceListener, KafkaConsumer
+from psycopg2.extras import Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from ingestion.services.kafka_minio_consumer import BatchBuffer
+from ingestion.utils.kafka_records import (
+    bootstrap_servers,
+    deserialize_key,
+    deserialize_value,
+    message_to_record,
+    next_offsets,
+)
+
+logger = logging.getLogger("kafka_bronze_router")
+
+DEFAULT_TOPIC_PATTERN = r"^cord\.(ConcordDb\.)?dbo\.(Product\w*|MeasureUnit)$"
+
+
+@dataclass
+class RouterConfig:
+    topic_pattern: str = os.getenv("KAFKA_BRONZE_TOPIC_PATTERN", DEFAULT_TOPIC_PATTERN)
+    group_id: str = os.getenv("KAFKA_BRONZE_GROUP", "bronze-router")
+    max_records: int = 5000
+    max_bytes: int = 32 * 1024 * 1024
+    max_seconds: float = 5.0
+    writer_threads: int = 4
+    poll_timeout_ms: int = 500
+    metrics_interval: float = 30.0
+
+
+def bronze_table_for_topic(topic: str) -> str:
+    """
+    Map a Debezium topic to its bronze table (snake_case source table + _cdc).
+
+    Example:
+        "cord.ConcordDb.dbo.ProductAvailabilityCartLimits" -> "product_availability_cart_limits_cdc"
+    """
+    source_table = topic.rsplit(".", 1)[-1]
+    snake = re.sub(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])", "_", source_table).lower()
+    if not re.fullmatch(r"[a-z][a-z0-9_]*", snake):
+        raise ValueError(f"Cannot derive a bronze table name from topic {topic!r}")
+    return f"{snake}_cdc"
+
+
+def normalize_envelope(value: Any, kafka_timestamp: Optional[int]) -> Any:
+    """
+    Return the value in Debezium envelope form ({"payload": {...}}).
+
+    Full envelopes (with or without the schema block) pass through. Flat rows
+    produced by ExtractNewRecordState (delete.handling.mode=rewrite adds
+    __deleted) are wrapped so staging views can read payload->after.
+    """
+    if not isinstance(value, dict):
+        return value
+    if "payload" in value:
+        return value
+    if "after" in value or "before" in value:
+        return {"payload": value}
+
+    row = {k: v for k, v in value.items() if not k.startswith("__")}
+    deleted = str(value.get("__deleted", "false")).lower() == "true"
+    return {
+        "payload": {
+            "op": "d" if deleted else value.get("__op", "u"),
+            "before": None,
+            "after": row,
+            "source": {
+                "ts_ms": value.get("__source_ts_ms") or value.get("__ts_ms") or kafka_timestamp,
+                "table": value.get("__table"),
+            },
+        }
+    }
+
+
+def _parse_key(key: Any) -> Any:
+    if isinstance(key, str):
+        try:
+            return json.loads(key)
+        except json.JSONDecodeError:
+            return key
+    return key
+
+
+@dataclass
+class TableStats:
+    records: int = 0
+    inserted: int = 0
+    flushes: int = 0
+    lag: int = 0
+
+
+@dataclass
+class TableState:
+    table: str
+    buffer: BatchBuffer = field(default_factory=BatchBuffer)
+    stats: TableStats = field(default_factory=TableStats)
+
+
+def _pg_pool(max_connections: int) -> ThreadedConnectionPool:
+    return ThreadedConnectionPool(
+        1,
+        max_connections,
+        host=os.getenv("STAGING_DB_HOST") or os.getenv("POSTGRES_HOST", "localhost"),
+        port=int(os.getenv("STAGING_DB_PORT") or os.getenv("POSTGRES_PORT", "5432")),
+        database=os.getenv("STAGING_DB_NAME") or os.getenv("POSTGRES_DB", "analytics"),
+        user=os.getenv("STAGING_DB_USER") or os.getenv("POSTGRES_USER", "analytics"),
+        password=os.getenv("STAGING_DB_PASSWORD") or os.getenv("POSTGRES_PASSWORD", "analytics"),
+    )
+
+
+class BronzeWriter:
+    """Set-based writer for bronze.<table>_cdc tables (one pooled connection per call)."""
+
+    def __init__(self, pool: ThreadedConnectionPool):
+        self.pool = pool
+        self.created: Set[str] = set()
+
+    def ensure_table(self, conn, table: str) -> None:
+        if table in self.created:
+            return
+        with conn.cursor() as cur:
+            cur.execute("CREATE SCHEMA IF NOT EXISTS bronze")
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS bronze.{table} (
+                    id BIGSERIAL PRIMARY KEY,
+                    kafka_topic VARCHAR(255),
+                    kafka_partition INT,
+                    kafka_offset BIGINT,
+                    kafka_timestamp BIGINT,
+                    kafka_key JSONB,
+                    cdc_payload JSONB,
+                    ingested_at TIMESTAMP DEFAULT NOW(),
+                    batch_file VARCHAR(500),
+                    UNIQUE(kafka_topic, kafka_partition, kafka_offset)
+                )
+            """)
+            cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ingested ON bronze.{table}(ingested_at)")
+        conn.commit()
+        self.created.add(table)
+
+    def write(self, table: str, records: List[Dict[str, Any]]) -> int:
+        """Insert one table batch in a single transaction; returns rows inserted (duplicates skipped)."""
+        values = [
+            (
+                record["topic"],
+                record["partition"],
+                record["offset"],
+                record["timestamp"],
+                Json(_parse_key(record["key"])) if record.get("key") else None,
+                Json(normalize_envelope(record["value"], record["timestamp"])),
+                None,
+            )
+            for record in records
+        ]
+
+        conn = self.pool.getconn()
+        try:
+            self.ensure_table(conn, table)
+            with conn.cursor() as cur:
+                inserted = execute_values(
+                    cur,
+                    f"""
+                    INSERT INTO bronze.{table}
+                        (kafka_topic, kafka_partition, kafka_offset, kafka_timestamp,
+                         kafka_key, cdc_payload, batch_file)
+                    VALUES %s
+                    ON CONFLICT (kafka_topic, kafka_partition, kafka_offset) DO NOTHING
+                    RETURNING 1
+                    """,
+                    values,
+                    page_size=1000,
+                    fetch=True,
+                )
+            conn.commit()
+            return len(inserted)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+
+class _FlushOnRevoke(ConsumerRebalanceListener):
+    """Write and commit buffered tables before their partitions move to another worker."""
+
+    def __init__(self, router: "BronzeRouter"):
+        self.router = router
+
+    def on_partitions_revoked(self, revoked):
+        if revoked:
+            self.router.flush(force=True)
+
+    def on_partitions_assigned(self, assigned):
+        logger.info("Worker %s assigned %s partition(s)", self.router.worker_id, len(assigned))
+
+
+class BronzeRouter:
+    """One consumer in the router group: poll -> route -> per-table flush -> commit."""
+
+    def __init__(self, config: RouterConfig, worker_id: int = 0):
+        self.config = config
+        self.worker_id = worker_id
+        self.tables: Dict[str, TableState] = {}
+        self.running = True
+        self.pool = _pg_pool(config.writer_threads)
+        self.writer = BronzeWriter(self.pool)
+        self.executor = ThreadPoolExecutor(max_workers=config.writer_threads)
+        self.consumer = KafkaConsumer(
+            bootstrap_servers=bootstrap_servers(),
+            group_id=config.group_id,
+            auto_offset_reset=os.getenv("KAFKA_AUTO_OFFSET_RESET", "earliest"),
+            enable_auto_commit=False,
+            value_deserializer=deserialize_value,
+            key_deserializer=deserialize_key,
+            max_poll_records=5000,
+        )
+        self.consumer.subscribe(pattern=config.topic_pattern, listener=_FlushOnRevoke(self))
+
+    def _state(self, table: str) -> TableState:
+        if table not in self.tables:
+            self.tables[table] = TableState(table)
+        return self.tables[table]
+
+    def flush(self, force: bool = False) -> None:
+        """Write every ready table concurrently, then commit the offsets of the written tables."""
+        ready = [
+            state for state in self.tables.values()
+            if state.buffer.records and (force or state.buffer.is_full(self.config))
+        ]
+        if not ready:
+            return
+
+        futures = {
+            state.table: self.executor.submit(self.writer.write, state.table, state.buffer.records)
+            for state in ready
+        }
+
+        committed: List[Dict[str, Any]] = []
+        failures = []
+        for state in ready:
+            try:
+                inserted = futures[state.table].result()
+            except Exception as error:
+                # Keep the buffer: its offsets are not committed and the write is retried
+                failures.append((state.table, error))
+                continue
+            state.stats.records += len(state.buffer.records)
+            state.stats.inserted += inserted
+            state.stats.flushes += 1
+            committed.extend(state.buffer.records)
+            state.buffer.clear()
+
+        if committed:
+            # Each topic maps to exactly one table, so partitions never straddle a failed table
+            self.consumer.commit(next_offsets(committed))
+
+        for table, error in failures:
+            logger.error("Worker %s failed to write bronze.%s: %s", self.worker_id, table, error)
+        if failures and len(failures) == len(ready):
+            raise failures[0][1]
+
+    def update_lag(self) -> None:
+        assignment = list(self.consumer.assignment())
+        if not assignment:
+            return
+        end_offsets = self.consumer.end_offsets(assignment)
+        lag_by_table: Dict[str, int] = {}
+        for tp in assignment:
+            table = bronze_table_for_topic(tp.topic)
+            lag_by_table[table] = lag_by_table.get(table, 0) + max(end_offsets[tp] - self.consumer.position(tp), 0)
+        for table, lag in lag_by_table.items():
+            self._state(table).stats.lag = lag
+
+    def log_metrics(self, started_at: float) -> None:
+        self.update_lag()
+        elapsed = max(time.monotonic() - started_at, 1e-9)
+        logger.info("Worker %s per-table throughput and lag:", self.worker_id)
+        for table in sorted(self.tables):
+            stats = self.tables[table].stats
+            logger.info(
+                "  bronze.%-40s records=%-9s inserted=%-9s rate=%7.0f rec/s flushes=%-6s buffered=%-6s lag=%s",
+                table, stats.records, stats.inserted, stats.records / elapsed,
+                stats.flushes, len(self.tables[table].buffer.records), stats.lag,
+            )
+
+    def run(self) -> None:
+        started_at = time.monotonic()
+        last_metrics = started_at
+        try:
+            while self.running:
+                polled = self.consumer.poll(timeout_ms=self.config.poll_timeout_ms)
+                for tp, messages in polled.items():
+                    buffer = self._state(bronze_table_for_topic(tp.topic)).buffer
+                    for message in messages:
+                        buffer.add(message_to_record(message), max(message.serialized_value_size, 0))
+
+                self.flush()
+
+                if time.monotonic() - last_metrics >= self.config.metrics_interval:
+                    self.log_metrics(started_at)
+                    last_metrics = time.monotonic()
+        finally:
+            try:
+                self.flush(force=True)
+            finally:
+                self.log_metrics(started_at)
+                self.consumer.close()
+                self.executor.shutdown()
+                self.pool.closeall()
+
+    def stop(self, *_args) -> None:
+        self.running = False
+
+
+def _run_router(config: RouterConfig, worker_id: int) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    router = BronzeRouter(config, worker_id)
+    signal.signal(signal.SIGTERM, router.stop)
+    signal.signal(signal.SIGINT, router.stop)
+    router.run()
+
+
+def run(config: RouterConfig, workers: int = 1) -> None:
+    """Run `workers` routers in the same group; Kafka spreads topic partitions across them."""
+    if workers <= 1:
+        _run_router(config, 0)
+        return
+
+    processes = [
+        multiprocessing.Process(target=_run_router, args=(config, worker_id), name=f"bronze-router-{worker_id}")
+        for worker_id in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def _stop_all(*_args):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, _stop_all)
+    signal.signal(signal.SIGINT, _stop_all)
+
+    for process in processes:
+        process.join()
+
+
+def main() -> None:
+    defaults = RouterConfig()
+    parser = argparse.ArgumentParser(description="Route product ecosystem CDC topics into bronze tables")
+    parser.add_argument("--topic-pattern", default=defaults.topic_pattern)
+    parser.add_argument("--group-id", default=defaults.group_id)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("KAFKA_CONSUMER_WORKERS", "1")))
+    parser.add_argument("--writer-threads", type=int, default=defaults.writer_threads)
+    parser.add_argument("--max-records", type=int, default=defaults.max_records)
+    parser.add_argument("--max-seconds", type=float, default=defaults.max_seconds)
+    args = parser.parse_args()
+
+    config = RouterConfig(
+        topic_pattern=args.topic_pattern,
+        group_id=args.group_id,
+        writer_threads=args.writer_threads,
+        max_records=args.max_records,
+        max_seconds=args.max_seconds,
+    )
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logger.info(
+        "Routing topics matching %s as group %s with %s worker(s)",
+        config.topic_pattern, config.group_id, args.workers,
+    )
+    run(config, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
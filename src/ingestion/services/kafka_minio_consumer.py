@@ -0,0 +1,266 @@
+"""
+Streaming Kafka -> MinIO consumer.
+
+Continuous replacement for the one-shot kafka_to_minio_flow: each worker keeps
+one KafkaConsumer open, buffers records and writes them to MinIO (zstd Parquet
+by default, see landing_writer) when the buffer reaches a record count, a byte
+size or an age limit. Offsets
+are committed only after the object is written, so a crash re-delivers at
+most the unwritten buffer (bronze loads dedupe on topic/partition/offset).
+
+Workers are separate processes in the same consumer group, so Kafka spreads
+the topic partitions across them.
+
+Usage (from src/):
+    python -m ingestion.services.kafka_minio_consumer
+    python -m ingestion.services.kafka_minio_consumer --workers 3 --max-records 20000 --max-seconds 10
+
+Environment:
+    KAFKA_BOOTSTRAP_SERVERS, KAFKA_CONSUMER_GROUP, KAFKA_TOPIC, LANDING_FORMAT,
+    MINIO_RAW_BUCKET, MINIO_ENDPOINT, MINIO_ACCESS_KEY, MINIO_SECRET_KEY
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from kafka import ConsumerRebalanceListener, KafkaConsumer
+
+from ingestion.utils.kafka_records import (
+    bootstrap_servers,
+    deserialize_key,
+    deserialize_value,
+    message_to_record,
+    next_offsets,
+)
+from ingestion.utils.landing_writer import LandingWriter
+from ingestion.utils.minio_client import MinioClientFactory
+
+logger = logging.getLogger("kafka_minio_consumer")
+
+
+@dataclass
+class ConsumerConfig:
+    topic: str = os.getenv("KAFKA_TOPIC", "cord.dbo.Product")
+    group_id: str = os.getenv("KAFKA_CONSUMER_GROUP", "prefect-product-loader")
+    bucket: str = os.getenv("MINIO_RAW_BUCKET", "cord-raw")
+    prefix: str = "product/raw"
+    landing_format: str = os.getenv("LANDING_FORMAT", "parquet")
+    max_records: int = 10000
+    max_bytes: int = 16 * 1024 * 1024
+    max_seconds: float = 15.0
+    poll_timeout_ms: int = 500
+    metrics_interval: float = 30.0
+
+
+@dataclass
+class BatchBuffer:
+    """Records waiting for the next MinIO write."""
+    records: List[Dict[str, Any]] = field(default_factory=list)
+    size_bytes: int = 0
+    opened_at: Optional[float] = None
+
+    def add(self, record: Dict[str, Any], size_bytes: int) -> None:
+        if self.opened_at is None:
+            self.opened_at = time.monotonic()
+        self.records.append(record)
+        self.size_bytes += size_bytes
+
+    def is_full(self, config: ConsumerConfig) -> bool:
+        if not self.records:
+            return False
+        return (
+            len(self.records) >= config.max_records
+            or self.size_bytes >= config.max_bytes
+            or time.monotonic() - self.opened_at >= config.max_seconds
+        )
+
+    def clear(self) -> None:
+        self.records = []
+        self.size_bytes = 0
+        self.opened_at = None
+
+
+class _FlushOnRevoke(ConsumerRebalanceListener):
+    """Write and commit buffered records before their partitions move to another worker."""
+
+    def __init__(self, worker: "StreamingWorker"):
+        self.worker = worker
+
+    def on_partitions_revoked(self, revoked):
+        if revoked:
+            self.worker.flush()
+
+    def on_partitions_assigned(self, assigned):
+        logger.info("Worker %s assigned %s", self.worker.worker_id, sorted(str(tp) for tp in assigned))
+
+
+class StreamingWorker:
+    """One consumer in the group: poll -> buffer -> write -> commit."""
+
+    def __init__(self, config: ConsumerConfig, worker_id: int = 0):
+        self.config = config
+        self.worker_id = worker_id
+        self.buffer = BatchBuffer()
+        self.records_written = 0
+        self.objects_written = 0
+        self.running = True
+        self.writer = LandingWriter(MinioClientFactory.create(), config.bucket, config.prefix, config.landing_format)
+        self.consumer = KafkaConsumer(
+            bootstrap_servers=bootstrap_servers(),
+            group_id=config.group_id,
+            auto_offset_reset=os.getenv("KAFKA_AUTO_OFFSET_RESET", "earliest"),
+            enable_auto_commit=False,
+            value_deserializer=deserialize_value,
+            key_deserializer=deserialize_key,
+            max_poll_records=min(config.max_records, 5000),
+        )
+        self.consumer.subscribe([config.topic], listener=_FlushOnRevoke(self))
+
+    def flush(self) -> None:
+        """Write the buffer (one object per topic/date), then commit its offsets."""
+        if not self.buffer.records:
+            return
+
+        records = self.buffer.records
+        written = self.writer.write(records)
+        # Only durable records are committed
+        self.consumer.commit(next_offsets(records))
+
+        self.objects_written += len(written)
+        self.records_written += len(records)
+        logger.info(
+            "Worker %s wrote %s records (%.1f MB raw) to s3://%s: %s",
+            self.worker_id, len(records), self.buffer.size_bytes / 1024 / 1024, self.config.bucket,
+            ", ".join(key for key, _ in written),
+        )
+        self.buffer.clear()
+
+    def consumer_lag(self) -> Dict[str, int]:
+        """Messages between the committed-to-be position and the log end, per partition."""
+        assignment = list(self.consumer.assignment())
+        if not assignment:
+            return {}
+        end_offsets = self.consumer.end_offsets(assignment)
+        return {
+            f"{tp.topic}[{tp.partition}]": max(end_offsets[tp] - self.consumer.position(tp), 0)
+            for tp in assignment
+        }
+
+    def log_metrics(self, started_at: float) -> None:
+        lag = self.consumer_lag()
+        elapsed = max(time.monotonic() - started_at, 1e-9)
+        logger.info(
+            "Worker %s: %s records in %s objects (%.0f rec/s), buffered=%s, lag total=%s max=%s",
+            self.worker_id,
+            self.records_written,
+            self.objects_written,
+            self.records_written / elapsed,
+            len(self.buffer.records),
+            sum(lag.values()),
+            max(lag.values(), default=0),
+        )
+
+    def run(self) -> None:
+        started_at = time.monotonic()
+        last_metrics = started_at
+        try:
+            while self.running:
+                polled = self.consumer.poll(timeout_ms=self.config.poll_timeout_ms)
+                for partition_records in polled.values():
+                    for message in partition_records:
+                        self.buffer.add(message_to_record(message), max(message.serialized_value_size, 0))
+
+                if self.buffer.is_full(self.config):
+                    self.flush()
+
+                if time.monotonic() - last_metrics >= self.config.metrics_interval:
+                    self.log_metrics(started_at)
+                    last_metrics = time.monotonic()
+        finally:
+            try:
+                self.flush()
+            finally:
+                self.log_metrics(started_at)
+                self.consumer.close()
+
+    def stop(self, *_args) -> None:
+        self.running = False
+
+
+def _run_worker(config: ConsumerConfig, worker_id: int) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    worker = StreamingWorker(config, worker_id)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+def run(config: ConsumerConfig, workers: int = 1) -> None:
+    """Run `workers` consumers in the same group (at most one per partition is useful)."""
+    if workers <= 1:
+        _run_worker(config, 0)
+        return
+
+    processes = [
+        multiprocessing.Process(target=_run_worker, args=(config, worker_id), name=f"kafka-minio-{worker_id}")
+        for worker_id in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def _stop_all(*_args):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, _stop_all)
+    signal.signal(signal.SIGINT, _stop_all)
+
+    for process in processes:
+        process.join()
+
+
+def main() -> None:
+    defaults = ConsumerConfig()
+    parser = argparse.ArgumentParser(description="Stream Kafka CDC topics into MinIO")
+    parser.add_argument("--topic", default=defaults.topic)
+    parser.add_argument("--group-id", default=defaults.group_id)
+    parser.add_argument("--bucket", default=defaults.bucket)
+    parser.add_argument("--prefix", default=defaults.prefix)
+    parser.add_argument("--format", dest="landing_format", default=defaults.landing_format,
+                        choices=["parquet", "jsonl.gz", "jsonl"])
+    parser.add_argument("--workers", type=int, default=int(os.getenv("KAFKA_CONSUMER_WORKERS", "1")))
+    parser.add_argument("--max-records", type=int, default=defaults.max_records)
+    parser.add_argument("--max-bytes", type=int, default=defaults.max_bytes)
+    parser.add_argument("--max-seconds", type=float, default=defaults.max_seconds)
+    args = parser.parse_args()
+
+    config = ConsumerConfig(
+        topic=args.topic,
+        group_id=args.group_id,
+        bucket=args.bucket,
+        prefix=args.prefix,
+        landing_format=args.landing_format,
+        max_records=args.max_records,
+        max_bytes=args.max_bytes,
+        max_seconds=args.max_seconds,
+    )
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logger.info(
+        "Consuming %s as group %s with %s worker(s) -> s3://%s/%s",
+        config.topic, config.group_id, args.workers, config.bucket, config.prefix,
+    )
+    run(config, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, Iterable, List
+
+from kafka import TopicPartition
+from kafka.structs import OffsetAndMetadata
+
+
+def deserialize_value(value: bytes | None) -> Any:
+    """Decode a Debezium JSON message value, keeping undecodable payloads as text."""
+    if value is None:
+        return None
+    try:
+        return json.loads(value.decode("utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return value.decode("utf-8", errors="ignore")
+
+
+def deserialize_key(key: bytes | None) -> str | None:
+    return key.decode("utf-8") if key else None
+
+
+def bootstrap_servers() -> List[str]:
+    servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
+    return [s.strip() for s in servers.split(",")]
+
+
+def message_to_record(message) -> Dict[str, Any]:
+    """Convert a consumed message into the JSONL record layout stored in MinIO."""
+    return {
+        "topic": message.topic,
+        "partition": message.partition,
+        "offset": message.offset,
+        "timestamp": message.timestamp,
+        "key": message.key,
+        "value": message.value,
+        "headers": [
+            {
+                "key": header[0],
+                "value": header[1].decode("utf-8", errors="ignore") if header[1] else None,
+            }
+            for header in (message.headers or [])
+        ],
+    }
+
+
+def next_offsets(records: Iterable[Dict[str, Any]]) -> Dict[TopicPartition, OffsetAndMetadata]:
+    """Offsets to commit after `records` are durable (last offset + 1 per partition)."""
+    offsets: Dict[TopicPartition, int] = {}
+    for record in records:
+        tp = TopicPartition(record["topic"], record["partition"])
+        offsets[tp] = max(offsets.get(tp, -1), record["offset"] + 1)
+    return {tp: OffsetAndMetadata(offset, None) for tp, offset in offsets.items()}
@@ -0,0 +1,238 @@
+"""
+Landing writer for raw CDC batches in MinIO.
+
+Writes consumed Kafka records as zstd-compressed Parquet (default) or gzip
+JSONL instead of one uncompressed JSON string per batch:
+
+- Fixed Debezium envelope schema: no schema inference downstream, and the
+  per-message Debezium `schema` block (repeated in every message) is dropped.
+- Objects are partitioned by topic and event date:
+      {prefix}/topic={topic}/date={YYYY-MM-DD}/batch={timestamp}-{suffix}.parquet
+- Bodies are built in a spooled temp file and uploaded with upload_fileobj,
+  which switches to multipart upload for large batches.
+
+read_landing_object() turns any landing object (.parquet, .jsonl.gz, .jsonl)
+back into the record layout produced by kafka_records.message_to_record.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import tempfile
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from boto3.s3.transfer import TransferConfig
+
+FORMAT_PARQUET = "parquet"
+FORMAT_JSONL_GZ = "jsonl.gz"
+FORMAT_JSONL = "jsonl"
+FORMATS = (FORMAT_PARQUET, FORMAT_JSONL_GZ, FORMAT_JSONL)
+
+# Keep batches in memory up to this size before spilling to disk
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=4,
+)
+
+# Debezium envelope flattened to fixed columns; row images stay JSON text
+# because every captured table has its own columns.
+ENVELOPE_SCHEMA = pa.schema([
+    pa.field("topic", pa.string()),
+    pa.field("partition", pa.int32()),
+    pa.field("offset", pa.int64()),
+    pa.field("timestamp", pa.int64()),
+    pa.field("key", pa.string()),
+    pa.field("op", pa.string()),
+    pa.field("ts_ms", pa.int64()),
+    pa.field("source_ts_ms", pa.int64()),
+    pa.field("before", pa.string()),
+    pa.field("after", pa.string()),
+    pa.field("source", pa.string()),
+    pa.field("headers", pa.string()),
+    pa.field("raw_value", pa.string()),
+])
+
+
+def _json_or_none(value: Any) -> str | None:
+    return None if value is None else json.dumps(value)
+
+
+def envelope_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten one consumed record into ENVELOPE_SCHEMA columns."""
+    value = record.get("value")
+    payload = None
+    if isinstance(value, dict):
+        payload = value.get("payload") if "payload" in value else value
+
+    key = record.get("key")
+    row = {
+        "topic": record.get("topic"),
+        "partition": record.get("partition"),
+        "offset": record.get("offset"),
+        "timestamp": record.get("timestamp"),
+        "key": key if isinstance(key, str) or key is None else json.dumps(key),
+        "op": None,
+        "ts_ms": None,
+        "source_ts_ms": None,
+        "before": None,
+        "after": None,
+        "source": None,
+        "headers": json.dumps(record["headers"]) if record.get("headers") else None,
+        "raw_value": None,
+    }
+
+    if isinstance(payload, dict):
+        source = payload.get("source") or {}
+        row.update(
+            op=payload.get("op"),
+            ts_ms=payload.get("ts_ms"),
+            source_ts_ms=source.get("ts_ms"),
+            before=_json_or_none(payload.get("before")),
+            after=_json_or_none(payload.get("after")),
+            source=_json_or_none(payload.get("source")),
+        )
+    elif value is not None:
+        # Non-JSON or non-object payloads are kept verbatim
+        row["raw_value"] = value if isinstance(value, str) else json.dumps(value)
+
+    return row
+
+
+def record_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild the consumed-record layout (value = {"payload": ...}) from a Parquet row."""
+    if row.get("raw_value") is not None:
+        value: Any = row["raw_value"]
+        try:
+            value = json.loads(value)
+        except (TypeError, json.JSONDecodeError):
+            pass
+    elif row.get("op") is None and row.get("after") is None and row.get("before") is None:
+        value = None
+    else:
+        payload = {
+            "op": row.get("op"),
+            "ts_ms": row.get("ts_ms"),
+            "before": json.loads(row["before"]) if row.get("before") else None,
+            "after": json.loads(row["after"]) if row.get("after") else None,
+            "source": json.loads(row["source"]) if row.get("source") else None,
+        }
+        value = {"payload": payload}
+
+    return {
+        "topic": row.get("topic"),
+        "partition": row.get("partition"),
+        "offset": row.get("offset"),
+        "timestamp": row.get("timestamp"),
+        "key": row.get("key"),
+        "value": value,
+        "headers": json.loads(row["headers"]) if row.get("headers") else [],
+    }
+
+
+def _event_date(record: Dict[str, Any]) -> str:
+    timestamp = record.get("timestamp")
+    if timestamp and timestamp > 0:
+        return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def _write_parquet(records: List[Dict[str, Any]], fileobj) -> None:
+    table = pa.Table.from_pylist([envelope_row(r) for r in records], schema=ENVELOPE_SCHEMA)
+    pq.write_table(table, fileobj, compression="zstd", compression_level=3)
+
+
+def _write_jsonl(records: List[Dict[str, Any]], fileobj, compress: bool) -> None:
+    stream = gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=6) if compress else fileobj
+    for record in records:
+        stream.write(json.dumps(record).encode("utf-8"))
+        stream.write(b"\n")
+    if compress:
+        stream.close()
+
+
+class LandingWriter:
+    """Upload record batches to MinIO in the configured landing format."""
+
+    def __init__(self, s3_client, bucket: str, prefix: str, fmt: str = FORMAT_PARQUET):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported landing format {fmt!r}; expected one of {FORMATS}")
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.rstrip("/")
+        self.fmt = fmt
+
+    def object_key(self, topic: str, date: str) -> str:
+        timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        return f"{self.prefix}/topic={topic}/date={date}/batch={timestamp}-{uuid.uuid4().hex[:8]}.{self.fmt}"
+
+    def write(self, records: Iterable[Dict[str, Any]]) -> List[Tuple[str, int]]:
+        """
+        Write records grouped by (topic, event date).
+
+        Returns:
+            List of (object key, record count) for every object written
+        """
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+        for record in records:
+            groups[(record.get("topic") or "unknown", _event_date(record))].append(record)
+
+        written: List[Tuple[str, int]] = []
+        for (topic, date), group in sorted(groups.items()):
+            key = self.object_key(topic, date)
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as body:
+                if self.fmt == FORMAT_PARQUET:
+                    _write_parquet(group, body)
+                else:
+                    _write_jsonl(group, body, compress=self.fmt == FORMAT_JSONL_GZ)
+                body.seek(0)
+                self.s3.upload_fileobj(
+                    body,
+                    self.bucket,
+                    key,
+                    ExtraArgs={"ContentType": _content_type(self.fmt)},
+                    Config=TRANSFER_CONFIG,
+                )
+            written.append((key, len(group)))
+
+        return written
+
+
+def _content_type(fmt: str) -> str:
+    if fmt == FORMAT_PARQUET:
+        return "application/vnd.apache.parquet"
+    if fmt == FORMAT_JSONL_GZ:
+        return "application/gzip"
+    return "application/json"
+
+
+def is_landing_object(key: str) -> bool:
+    return key.endswith((".parquet", ".jsonl.gz", ".jsonl"))
+
+
+def read_landing_object(s3_client, bucket: str, key: str) -> Iterator[Dict[str, Any]]:
+    """Yield consumed-record dicts from a landing object of any supported format."""
+    obj = s3_client.get_object(Bucket=bucket, Key=key)
+    body = obj["Body"]
+
+    if key.endswith(".parquet"):
+        # Parquet needs random access to the footer
+        parquet_file = pq.ParquetFile(io.BytesIO(body.read()))
+        for batch in parquet_file.iter_batches(batch_size=5000):
+            for row in batch.to_pylist():
+                yield record_from_row(row)
+        return
+
+    stream = gzip.GzipFile(fileobj=body, mode="rb") if key.endswith(".gz") else body
+    for line in stream.iter_lines() if hasattr(stream, "iter_lines") else stream:
+        if line and line.strip():
+            yield json.loads(line)
@@ -0,0 +1,304 @@
+"""
+HNSW Index Maintenance for analytics_features.product_embeddings
+
+Keeps vector search indexed while the index or the whole table is rebuilt.
+
+Two operations:
+
+1. Online rebuild (`rebuild`): build a new HNSW index with
+   CREATE INDEX CONCURRENTLY under a temporary name, then drop the old index
+   and rename the new one in a single short transaction.
+
+2. Shadow full refresh (`prepare-shadow` / `build-shadow` / `swap`):
+   a full embedding run loads an index-free copy of the table (no per-row
+   HNSW maintenance), the index is built once on the finished data with a
+   large maintenance_work_mem and parallel workers, and the tables are then
+   swapped by renames in one transaction.
+
+   The pipeline runs all three steps with:
+       python -m src.ml.embedding_pipeline_v2 --full --shadow
+
+Usage:
+    python -m src.ml.embedding_index rebuild
+    python -m src.ml.embedding_index rebuild --maintenance-work-mem=4GB --parallel-workers=8
+    python -m src.ml.embedding_index status
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Any, Dict
+
+from psycopg2 import sql
+
+from src.config import get_settings
+from src.config.database import get_postgres_connection
+
+
+SCHEMA = "analytics_features"
+TABLE = "product_embeddings"
+SHADOW_TABLE = "product_embeddings_shadow"
+OLD_TABLE = "product_embeddings_old"
+
+INDEX = "idx_product_embeddings_hnsw"
+NEW_INDEX = "idx_product_embeddings_hnsw_new"
+SHADOW_INDEX = "idx_product_embeddings_shadow_hnsw"
+OLD_INDEX = "idx_product_embeddings_hnsw_old"
+
+# Build parameters (match sql/search/create_hnsw_index.sql)
+DEFAULT_M = 16
+DEFAULT_EF_CONSTRUCTION = 64
+DEFAULT_MAINTENANCE_WORK_MEM = "2GB"
+DEFAULT_PARALLEL_WORKERS = 4
+
+
+def _qualified(name: str) -> sql.Composed:
+    return sql.SQL("{}.{}").format(sql.Identifier(SCHEMA), sql.Identifier(name))
+
+
+def shadow_table() -> sql.Composed:
+    """Qualified name of the shadow table used by --shadow full refreshes"""
+    return _qualified(SHADOW_TABLE)
+
+
+def _hnsw_index_sql(index: str, table: str, m: int, ef_construction: int, concurrently: bool) -> sql.Composed:
+    return sql.SQL("""
+        CREATE INDEX {concurrently} {index}
+        ON {table}
+        USING hnsw (embedding vector_cosine_ops)
+        WITH (m = {m}, ef_construction = {ef})
+    """).format(
+        concurrently=sql.SQL("CONCURRENTLY" if concurrently else ""),
+        index=sql.Identifier(index),
+        table=_qualified(table),
+        m=sql.Literal(int(m)),
+        ef=sql.Literal(int(ef_construction)),
+    )
+
+
+def _tune_build_session(cursor, maintenance_work_mem: str, parallel_workers: int) -> None:
+    """Give the index build enough memory to keep the HNSW graph in RAM"""
+    cursor.execute("SET maintenance_work_mem = %s", (maintenance_work_mem,))
+    cursor.execute("SET max_parallel_maintenance_workers = %s", (parallel_workers,))
+
+
+def rebuild_index_online(
+    m: int = DEFAULT_M,
+    ef_construction: int = DEFAULT_EF_CONSTRUCTION,
+    maintenance_work_mem: str = DEFAULT_MAINTENANCE_WORK_MEM,
+    parallel_workers: int = DEFAULT_PARALLEL_WORKERS,
+) -> float:
+    """
+    Rebuild the HNSW index without leaving search unindexed
+
+    The old index keeps serving queries while the new one is built
+    concurrently; only the final drop + rename takes a (brief) exclusive lock.
+
+    Returns:
+        Build duration in seconds
+    """
+    print(f"Rebuilding {INDEX} online (m={m}, ef_construction={ef_construction}, "
+          f"maintenance_work_mem={maintenance_work_mem}, parallel_workers={parallel_workers})")
+    start_time = time.time()
+
+    with get_postgres_connection() as conn:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = True
+        cursor = conn.cursor()
+        _tune_build_session(cursor, maintenance_work_mem, parallel_workers)
+
+        # A failed concurrent build leaves an INVALID index behind
+        cursor.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(_qualified(NEW_INDEX)))
+        cursor.execute(_hnsw_index_sql(NEW_INDEX, TABLE, m, ef_construction, concurrently=True))
+        build_seconds = time.time() - start_time
+        print(f"New index built in {build_seconds:.1f}s, swapping...")
+
+        conn.autocommit = False
+        cursor.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(_qualified(INDEX)))
+        cursor.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+            _qualified(NEW_INDEX), sql.Identifier(INDEX)
+        ))
+        conn.commit()
+
+        conn.autocommit = True
+        cursor.execute(sql.SQL("ANALYZE {}").format(_qualified(TABLE)))
+
+    print(f"Index {INDEX} rebuilt in {time.time() - start_time:.1f}s")
+    return build_seconds
+
+
+def prepare_shadow_table(resume: bool = False) -> None:
+    """
+    Create the index-free shadow table for a full refresh
+
+    Only the primary key is kept (needed for the upsert); the HNSW index is
+    built once after loading.
+
+    Args:
+        resume: Keep rows of an interrupted shadow load instead of starting empty
+    """
+    with get_postgres_connection() as conn:
+        cursor = conn.cursor()
+        if not resume:
+            cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(shadow_table()))
+        cursor.execute(sql.SQL("""
+            CREATE TABLE IF NOT EXISTS {shadow} (
+                LIKE {live} INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+                PRIMARY KEY (product_id)
+            )
+        """).format(shadow=shadow_table(), live=_qualified(TABLE)))
+
+    print(f"Shadow table {SCHEMA}.{SHADOW_TABLE} ready ({'resumed' if resume else 'empty'})")
+
+
+def build_shadow_index(
+    m: int = DEFAULT_M,
+    ef_construction: int = DEFAULT_EF_CONSTRUCTION,
+    maintenance_work_mem: str = DEFAULT_MAINTENANCE_WORK_MEM,
+    parallel_workers: int = DEFAULT_PARALLEL_WORKERS,
+) -> float:
+    """
+    Build the HNSW index on the loaded shadow table
+
+    The shadow table is not read by search, so a plain (non-concurrent)
+    build is used: it is faster and can use parallel workers.
+
+    Returns:
+        Build duration in seconds
+    """
+    print(f"Building {SHADOW_INDEX} (maintenance_work_mem={maintenance_work_mem}, "
+          f"parallel_workers={parallel_workers})...")
+    start_time = time.time()
+
+    with get_postgres_connection() as conn:
+        cursor = conn.cursor()
+        _tune_build_session(cursor, maintenance_work_mem, parallel_workers)
+        cursor.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(_qualified(SHADOW_INDEX)))
+        cursor.execute(_hnsw_index_sql(SHADOW_INDEX, SHADOW_TABLE, m, ef_construction, concurrently=False))
+
+    with get_postgres_connection() as conn:
+        conn.autocommit = True
+        conn.cursor().execute(sql.SQL("ANALYZE {}").format(shadow_table()))
+
+    build_seconds = time.time() - start_time
+    print(f"Shadow index built in {build_seconds:.1f}s")
+    return build_seconds
+
+
+# Live rows written after the shadow row for the same product (or, for
+# products the snapshot did not contain, since the shadow load started)
+REPLAY_LIVE_CHANGES_SQL = """
+    INSERT INTO {shadow} (product_id, embedding, updated_at)
+    SELECT l.product_id, l.embedding, l.updated_at
+    FROM {live} l
+    LEFT JOIN {shadow} s ON s.product_id = l.product_id
+    CROSS JOIN (SELECT MIN(updated_at) AS loaded_from FROM {shadow}) started
+    WHERE (s.product_id IS NULL AND l.updated_at >= started.loaded_from)
+       OR l.updated_at > s.updated_at
+    ON CONFLICT (product_id) DO UPDATE SET
+        embedding = EXCLUDED.embedding,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+def swap_shadow_table() -> int:
+    """
+    Replace the live table with the shadow table atomically
+
+    Incremental runs are locked out for the whole shadow run, but the
+    embedding worker keeps writing to the live table during the load. Writes
+    to the live table are blocked (reads are not), rows changed since the
+    shadow copy are replayed into it, and the tables are renamed, all in one
+    transaction: readers see either the old or the new table (each with its
+    HNSW index) and no concurrent write is lost. Products deleted from the
+    live table during the load are removed by the next run.
+
+    Returns:
+        Number of live rows replayed into the shadow table
+    """
+    with get_postgres_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SET LOCAL lock_timeout = '10s'")
+
+        cursor.execute(sql.SQL("LOCK TABLE {} IN EXCLUSIVE MODE").format(_qualified(TABLE)))
+        cursor.execute(sql.SQL(REPLAY_LIVE_CHANGES_SQL).format(shadow=shadow_table(), live=_qualified(TABLE)))
+        replayed = cursor.rowcount
+
+        cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(_qualified(OLD_TABLE)))
+        cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+            _qualified(TABLE), sql.Identifier(OLD_TABLE)
+        ))
+        cursor.execute(sql.SQL("ALTER INDEX IF EXISTS {} RENAME TO {}").format(
+            _qualified(INDEX), sql.Identifier(OLD_INDEX)
+        ))
+        cursor.execute(sql.SQL("ALTER TABLE {} RENAME CONSTRAINT {} TO {}").format(
+            _qualified(OLD_TABLE), sql.Identifier(f"{TABLE}_pkey"), sql.Identifier(f"{OLD_TABLE}_pkey")
+        ))
+
+        cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+            shadow_table(), sql.Identifier(TABLE)
+        ))
+        cursor.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+            _qualified(SHADOW_INDEX), sql.Identifier(INDEX)
+        ))
+        cursor.execute(sql.SQL("ALTER TABLE {} RENAME CONSTRAINT {} TO {}").format(
+            _qualified(TABLE), sql.Identifier(f"{SHADOW_TABLE}_pkey"), sql.Identifier(f"{TABLE}_pkey")
+        ))
+
+        cursor.execute(sql.SQL("DROP TABLE {}").format(_qualified(OLD_TABLE)))
+
+    print(f"Swapped {SCHEMA}.{SHADOW_TABLE} -> {SCHEMA}.{TABLE} ({replayed:,} live change(s) replayed)")
+    return replayed
+
+
+def get_index_status() -> Dict[str, Any]:
+    """Size and validity of the live and shadow HNSW indexes"""
+    with get_postgres_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT c.relname, i.indisvalid, pg_size_pretty(pg_relation_size(c.oid))
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND c.relname = ANY(%s)
+        """, (SCHEMA, [INDEX, NEW_INDEX, SHADOW_INDEX]))
+        return {name: {"valid": valid, "size": size} for name, valid, size in cursor.fetchall()}
+
+
+def main():
+    """Command-line entry point for index maintenance"""
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Maintain the product embeddings HNSW index")
+    parser.add_argument("command", choices=["rebuild", "prepare-shadow", "build-shadow", "swap", "status"])
+    parser.add_argument("--m", type=int, default=DEFAULT_M)
+    parser.add_argument("--ef-construction", type=int, default=DEFAULT_EF_CONSTRUCTION)
+    parser.add_argument("--maintenance-work-mem", default=DEFAULT_MAINTENANCE_WORK_MEM)
+    parser.add_argument("--parallel-workers", type=int, default=DEFAULT_PARALLEL_WORKERS)
+    args = parser.parse_args()
+
+    build_options = dict(
+        m=args.m,
+        ef_construction=args.ef_construction,
+        maintenance_work_mem=args.maintenance_work_mem,
+        parallel_workers=args.parallel_workers,
+    )
+
+    print(f"Database: {settings.postgres.host}:{settings.postgres.port}/{settings.postgres.database}")
+
+    if args.command == "rebuild":
+        rebuild_index_online(**build_options)
+    elif args.command == "prepare-shadow":
+        prepare_shadow_table()
+    elif args.command == "build-shadow":
+        build_shadow_index(**build_options)
+    elif args.command == "swap":
+        swap_shadow_table()
+    else:
+        for name, info in get_index_status().items():
+            print(f"{name}: {'valid' if info['valid'] else 'INVALID'}, {info['size']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,9 @@ Key Optimizations:
 5. Progress tracking with performance metrics
 6. Centralized configuration integration
 7. Mixed precision inference (FP16 on GPU for 2x speedup)
+8. Checkpointed runs (crash resume from the last committed chunk)
+9. Versioned output (embed a new model without touching live vectors)
+10. Shadow full refresh (load index-free, build HNSW once, swap tables)
 
 Performance Improvements:
 - CPU: ~3-5x faster with optimized batching
@@ -20,17 +23,21 @@ Performance Improvements:
 from __future__ import annotations
 
 import time
-from dataclasses import dataclass
+import uuid
+from dataclasses import dataclass, replace
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
 
 import torch
 import psycopg2
+from psycopg2 import sql
 from psycopg2.extras import DictCursor, execute_values
 from sentence_transformers import SentenceTransformer
 
 from src.config import get_settings
 from src.config.database import get_postgres_connection
+from src.ml.embedding_index import build_shadow_index, prepare_shadow_table, shadow_table, swap_shadow_table
+from src.ml.embedding_store import EmbeddingVersion, register_version
 
 
 @dataclass
@@ -39,6 +46,7 @@ class PerformanceMetrics:
     total_products: int = 0
     products_processed: int = 0
     products_skipped: int = 0
+    texts_encoded: int = 0
     batches_processed: int = 0
     start_time: float = 0.0
     end_time: float = 0.0
@@ -62,6 +70,7 @@ class PerformanceMetrics:
         print(f"Total Products: {self.total_products:,}")
         print(f"Processed: {self.products_processed:,}")
         print(f"Skipped (up-to-date): {self.products_skipped:,}")
+        print(f"Unique texts encoded: {self.texts_encoded:,}")
         print(f"Batches: {self.batches_processed}")
         print(f"Duration: {self.duration_seconds:.2f}s")
         print(f"Throughput: {self.throughput_per_second:.1f} products/second")
@@ -136,45 +145,179 @@ def load_model(device: str) -> SentenceTransformer:
     return model
 
 
-def get_last_watermark() -> Optional[datetime]:
+PIPELINE_NAME = "embedding_pipeline_v2"
+
+
+@dataclass
+class PipelineCheckpoint:
+    """Committed progress of an embedding run (analytics_features.embedding_pipeline_state)"""
+    run_id: str
+    model_id: str
+    run_mode: str
+    source_watermark: Optional[datetime] = None
+    last_product_id: Optional[int] = None
+    products_committed: int = 0
+    status: str = "running"
+
+    def advanced(self, last_product: Dict[str, Any], committed: int) -> "PipelineCheckpoint":
+        """Copy with the keyset cursor moved to the last product of a chunk"""
+        return replace(
+            self,
+            source_watermark=last_product['updated_at'],
+            last_product_id=last_product['product_id'],
+            products_committed=self.products_committed + committed,
+        )
+
+
+def acquire_pipeline_lock(conn, model_id: str) -> bool:
     """
-    Get last processed timestamp for incremental updates
+    Take the session-level advisory lock that serialises runs per model
+
+    The connection is switched to autocommit: the session lock outlives the
+    statement, and the connection does not sit idle in transaction for the
+    whole run (which would hold back the embedding worker's bronze horizon).
+
+    Args:
+        conn: Connection kept open for the whole run
+        model_id: Embedding model identifier
 
     Returns:
-        Datetime of last embedding update, or None for full refresh
+        True if the lock was acquired, False if another run holds it
     """
-    settings = get_settings()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT pg_try_advisory_lock(hashtext(%s))",
+        (f"{PIPELINE_NAME}:{model_id}",)
+    )
+    return bool(cursor.fetchone()[0])
 
-    if not settings.ml.enable_watermark:
-        print("Watermark disabled - processing all products")
-        return None
 
-    with get_postgres_connection() as conn:
+def load_checkpoint(model_id: str) -> Optional[PipelineCheckpoint]:
+    """
+    Load the stored checkpoint for this pipeline and model
+
+    Returns:
+        Last checkpoint, or None if the model was never embedded
+    """
+    with get_postgres_connection(cursor_factory=DictCursor) as conn:
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT MAX(updated_at) as last_update
-            FROM analytics_features.product_embeddings
-        """)
+            SELECT run_id, model_id, run_mode, status,
+                   source_watermark, last_product_id, products_committed
+            FROM analytics_features.embedding_pipeline_state
+            WHERE pipeline_name = %s AND model_id = %s
+        """, (PIPELINE_NAME, model_id))
         row = cursor.fetchone()
 
-        if row and row[0]:
-            print(f"Last embedding update: {row[0]}")
-            return row[0]
-
-        print("No previous embeddings found - full refresh required")
+    if not row:
         return None
 
+    return PipelineCheckpoint(
+        run_id=str(row['run_id']),
+        model_id=row['model_id'],
+        run_mode=row['run_mode'],
+        source_watermark=row['source_watermark'],
+        last_product_id=row['last_product_id'],
+        products_committed=row['products_committed'],
+        status=row['status'],
+    )
+
+
+def resolve_checkpoint(incremental: bool, model_id: str) -> PipelineCheckpoint:
+    """
+    Decide where this run starts
+
+    - A run left 'running' (crashed) or 'failed' resumes from its last committed chunk
+    - Incremental run: continue after the stored source watermark
+    - Full refresh (or watermark disabled): start from the beginning
+
+    Returns:
+        Checkpoint for this run (not yet persisted)
+    """
+    settings = get_settings()
+    run_mode = "incremental" if incremental else "full"
+    previous = load_checkpoint(model_id)
+
+    if previous and previous.status in ("running", "failed") and previous.run_mode == run_mode:
+        print(f"Resuming interrupted {run_mode} run {previous.run_id} "
+              f"after product {previous.last_product_id} ({previous.source_watermark})")
+        return previous
+
+    checkpoint = PipelineCheckpoint(run_id=str(uuid.uuid4()), model_id=model_id, run_mode=run_mode)
+
+    if not incremental:
+        print("Full refresh - processing all products")
+    elif not settings.ml.enable_watermark:
+        print("Watermark disabled - processing all products")
+    elif previous and previous.source_watermark is not None:
+        checkpoint.source_watermark = previous.source_watermark
+        checkpoint.last_product_id = previous.last_product_id
+        print(f"Source watermark: {previous.source_watermark} (product {previous.last_product_id})")
+    else:
+        print("No previous checkpoint found - full refresh required")
+
+    return checkpoint
+
+
+def _write_checkpoint(cursor, checkpoint: PipelineCheckpoint) -> None:
+    """Persist checkpoint using the caller's transaction"""
+    cursor.execute("""
+        INSERT INTO analytics_features.embedding_pipeline_state (
+            pipeline_name, model_id, run_id, run_mode, status,
+            source_watermark, last_product_id, products_committed,
+            started_at, updated_at, completed_at
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW(),
+                CASE WHEN %s = 'running' THEN NULL ELSE NOW() END)
+        ON CONFLICT (pipeline_name, model_id) DO UPDATE SET
+            run_id = EXCLUDED.run_id,
+            run_mode = EXCLUDED.run_mode,
+            status = EXCLUDED.status,
+            source_watermark = EXCLUDED.source_watermark,
+            last_product_id = EXCLUDED.last_product_id,
+            products_committed = EXCLUDED.products_committed,
+            started_at = CASE
+                WHEN embedding_pipeline_state.run_id = EXCLUDED.run_id
+                THEN embedding_pipeline_state.started_at
+                ELSE EXCLUDED.started_at
+            END,
+            updated_at = NOW(),
+            completed_at = EXCLUDED.completed_at
+    """, (
+        PIPELINE_NAME,
+        checkpoint.model_id,
+        checkpoint.run_id,
+        checkpoint.run_mode,
+        checkpoint.status,
+        checkpoint.source_watermark,
+        checkpoint.last_product_id,
+        checkpoint.products_committed,
+        checkpoint.status,
+    ))
+
+
+def save_checkpoint(checkpoint: PipelineCheckpoint) -> None:
+    """Persist checkpoint in its own transaction (run start/finish)"""
+    with get_postgres_connection() as conn:
+        _write_checkpoint(conn.cursor(), checkpoint)
+
 
 def fetch_products_incremental(
     watermark: Optional[datetime] = None,
-    limit: Optional[int] = None
+    limit: Optional[int] = None,
+    after_product_id: Optional[int] = None
 ) -> List[Dict[str, Any]]:
     """
     Fetch products that need embedding updates
 
+    Products are returned in (updated_at, product_id) order so that the last
+    product of each committed chunk is a valid resume point.
+
     Args:
         watermark: Only fetch products updated after this timestamp
         limit: Maximum number of products to fetch
+        after_product_id: Tie-breaker for products updated exactly at watermark
 
     Returns:
         List of product dictionaries
@@ -182,37 +325,40 @@ def fetch_products_incremental(
     with get_postgres_connection(cursor_factory=DictCursor) as conn:
         cursor = conn.cursor()
 
-        # Build query with optional watermark filter
+        # Build query with optional keyset filter
         query = """
-                SELECT
-                    product_id,
-                    vendor_code,
-                    name,
-                    ukrainian_name,
-                    description,
-                    ukrainian_description,
-                    search_name,
-                    search_ukrainian_name,
-                    supplier_name,
-                    weight,
-                    weight_category,
-                    multilingual_status,
-                    ucgfea,
-                    standard,
-                    is_for_sale,
-                    is_for_web,
-                    has_image,
-                    updated as updated_at
-                FROM staging_marts.dim_product
-                WHERE deleted = false
+                SELECT * FROM (
+                    SELECT
+                        product_id,
+                        vendor_code,
+                        name,
+                        ukrainian_name,
+                        description,
+                        ukrainian_description,
+                        search_name,
+                        search_ukrainian_name,
+                        supplier_name,
+                        weight,
+                        weight_category,
+                        multilingual_status,
+                        ucgfea,
+                        standard,
+                        is_for_sale,
+                        is_for_web,
+                        has_image,
+                        COALESCE(updated, created) as updated_at
+                    FROM staging_marts.dim_product
+                    WHERE deleted = false
+                ) products
+                WHERE updated_at IS NOT NULL
             """
 
-        params = []
+        params: List[Any] = []
         if watermark:
-            query += " AND updated_at > %s"
-            params.append(watermark)
+            query += " AND (updated_at, product_id) > (%s, %s)"
+            params.extend([watermark, after_product_id if after_product_id is not None else -1])
 
-        query += " ORDER BY updated_at DESC"
+        query += " ORDER BY updated_at, product_id"
 
         if limit:
             query += " LIMIT %s"
@@ -302,6 +448,34 @@ def build_text(product: Dict[str, Any]) -> str:
     return ". ".join(parts)
 
 
+def dedupe_texts_by_length(texts: List[str]) -> Tuple[List[str], List[int]]:
+    """
+    Collapse identical texts and order the unique ones by length
+
+    Products that share name and supplier often produce identical
+    build_text output, so each distinct text only needs one forward pass.
+    Ordering by length keeps similarly sized texts in the same encoder
+    batch, which minimises padding.
+
+    Args:
+        texts: Texts in catalog order
+
+    Returns:
+        Tuple of (unique_texts, positions) where unique_texts is sorted by
+        length and positions[i] is the index in unique_texts for texts[i]
+    """
+    first_seen: Dict[str, int] = {}
+    for text in texts:
+        if text not in first_seen:
+            first_seen[text] = len(first_seen)
+
+    unique_texts: List[str] = sorted(first_seen, key=len)
+    slot_by_text: Dict[str, int] = {text: slot for slot, text in enumerate(unique_texts)}
+    positions: List[int] = [slot_by_text[text] for text in texts]
+
+    return unique_texts, positions
+
+
 def process_batch(
     products: List[Dict[str, Any]],
     model: SentenceTransformer,
@@ -311,6 +485,9 @@ def process_batch(
     """
     Process batch of products and generate embeddings
 
+    Texts are deduplicated and encoded shortest-first; the vectors are then
+    scattered back so the output keeps the original product order.
+
     Args:
         products: List of product dictionaries
         model: Loaded sentence transformer model
@@ -334,58 +511,101 @@ def process_batch(
     if not valid_texts:
         return [], []
 
-    # Generate embeddings
-    embeddings = model.encode(
-        valid_texts,
+    unique_texts, positions = dedupe_texts_by_length(valid_texts)
+
+    # Generate embeddings (one forward pass per distinct text)
+    unique_embeddings = model.encode(
+        unique_texts,
         batch_size=batch_size,
         show_progress_bar=False,
         convert_to_numpy=True
     )
+    unique_vectors = [emb.tolist() for emb in unique_embeddings]
 
     product_ids = [p['product_id'] for p in valid_products]
-    embeddings_list = [emb.tolist() for emb in embeddings]
+    embeddings_list = [unique_vectors[slot] for slot in positions]
 
     metrics.products_processed += len(valid_products)
+    metrics.texts_encoded += len(unique_texts)
     metrics.batches_processed += 1
 
     return product_ids, embeddings_list
 
 
+def write_embeddings(
+    cursor,
+    product_ids: List[int],
+    embeddings: List[List[float]],
+    version: Optional[EmbeddingVersion] = None,
+    table: Optional[sql.Composable] = None
+) -> None:
+    """
+    Upsert embeddings using the caller's transaction
+
+    Args:
+        cursor: Open cursor (commit is handled by the caller)
+        product_ids: List of product IDs
+        embeddings: List of embedding vectors
+        version: Write into this version's table instead of product_embeddings
+        table: Explicit target table (e.g. the shadow table of a full refresh)
+    """
+    if not product_ids:
+        return
+
+    if table is None:
+        if version is not None:
+            table = version.qualified_table
+        else:
+            table = sql.SQL("analytics_features.product_embeddings")
+
+    query = sql.SQL("""
+        INSERT INTO {table} (product_id, embedding)
+        VALUES %s
+        ON CONFLICT (product_id) DO UPDATE SET
+            embedding = EXCLUDED.embedding,
+            updated_at = NOW()
+    """).format(table=table)
+
+    execute_values(cursor, query.as_string(cursor), list(zip(product_ids, embeddings)))
+
+
 def upsert_embeddings_batch(
     product_ids: List[int],
-    embeddings: List[List[float]]
+    embeddings: List[List[float]],
+    checkpoint: Optional[PipelineCheckpoint] = None,
+    version: Optional[EmbeddingVersion] = None,
+    table: Optional[sql.Composable] = None
 ):
     """
     Efficiently upsert embeddings in batch
 
+    When a checkpoint is given it is written in the same transaction, so the
+    stored resume point never runs ahead of the stored embeddings.
+
     Args:
         product_ids: List of product IDs
         embeddings: List of embedding vectors
+        checkpoint: Optional run checkpoint already advanced past this chunk
+        version: Write into this version's table instead of product_embeddings
+        table: Explicit target table (e.g. the shadow table of a full refresh)
     """
-    if not product_ids:
+    if not product_ids and checkpoint is None:
         return
 
     with get_postgres_connection() as conn:
         cursor = conn.cursor()
 
-        rows = list(zip(product_ids, embeddings))
+        write_embeddings(cursor, product_ids, embeddings, version, table)
 
-        execute_values(
-            cursor,
-            """
-            INSERT INTO analytics_features.product_embeddings (product_id, embedding)
-            VALUES %s
-            ON CONFLICT (product_id) DO UPDATE SET
-                embedding = EXCLUDED.embedding,
-                updated_at = NOW()
-            """,
-            rows
-        )
+        if checkpoint is not None:
+            _write_checkpoint(cursor, checkpoint)
 
 
 def run_pipeline(
     incremental: bool = True,
-    limit: Optional[int] = None
+    limit: Optional[int] = None,
+    model_version: Optional[str] = None,
+    shadow: bool = False
 ) -> PerformanceMetrics:
     """
     Run optimized embedding pipeline
@@ -393,80 +613,166 @@ def run_pipeline(
     Args:
         incremental: Use watermark for incremental updates
         limit: Limit number of products (None = process all)
+        model_version: Write into this embedding version (see embedding_store)
+            instead of the live product_embeddings table
+        shadow: Full refresh into an index-free shadow table, build the HNSW
+            index once and swap it in (search stays indexed throughout).
+            Holds the live model's lock too, so incremental runs wait; rows
+            the embedding worker writes meanwhile are replayed at the swap
 
     Returns:
         Performance metrics
     """
+    if shadow and (incremental or model_version):
+        raise ValueError("Shadow refresh requires --full and the live product_embeddings table")
+    if shadow and limit is not None:
+        raise ValueError("Shadow refresh replaces the live table; --limit would swap in a partial table")
+
     metrics = PerformanceMetrics()
     metrics.start_time = time.time()
 
     settings = get_settings()
+    model_id = settings.ml.embedding_model
 
     print("\n" + "=" * 80)
     print("OPTIMIZED EMBEDDING PIPELINE V2")
     print("=" * 80)
 
-    # Detect and setup device
-    device = detect_device()
-    metrics.device = device
-
-    # Load model
-    model = load_model(device)
-
-    # Get watermark for incremental processing
-    watermark = get_last_watermark() if incremental else None
-
-    # Fetch products
-    products = fetch_products_incremental(watermark=watermark, limit=limit)
-    metrics.total_products = len(products)
-
-    if not products:
-        print("\nNo products to process!")
-        metrics.end_time = time.time()
-        return metrics
-
-    # Process in chunks
-    chunk_size = settings.ml.embedding_chunk_size
-    batch_size = settings.ml.batch_size
-
-    print(f"\nProcessing Configuration:")
-    print(f"- Chunk size: {chunk_size:,}")
-    print(f"- Batch size: {batch_size}")
-    print(f"- Device: {device}")
-    print(f"- Total products: {len(products):,}")
-
-    print("\nProcessing...")
-
-    for i in range(0, len(products), chunk_size):
-        chunk = products[i:i + chunk_size]
-        chunk_num = (i // chunk_size) + 1
-        total_chunks = (len(products) + chunk_size - 1) // chunk_size
-
-        print(f"Chunk {chunk_num}/{total_chunks}: Processing {len(chunk):,} products...")
-
-        # Process chunk
-        product_ids, embeddings = process_batch(chunk, model, batch_size, metrics)
+    # Versioned runs keep their own checkpoint alongside their own table
+    version = register_version(model_version) if model_version else None
+    if version is not None:
+        model_id = version.model_version
+
+    # Shadow loads keep a separate checkpoint until the swap succeeds
+    live_model_id = model_id
+    if shadow:
+        model_id = f"{model_id}:shadow"
+
+    # Held for the whole run: the advisory lock lives as long as this session
+    with get_postgres_connection() as lock_conn:
+        if not acquire_pipeline_lock(lock_conn, model_id):
+            raise RuntimeError(f"Another embedding run for {model_id} is already in progress")
+        # Incremental runs write the live table; they would be discarded by the swap
+        if shadow and not acquire_pipeline_lock(lock_conn, live_model_id):
+            raise RuntimeError(f"An embedding run for {live_model_id} is in progress; retry the shadow refresh later")
+
+        # Detect and setup device
+        device = detect_device()
+        metrics.device = device
+
+        # Load model
+        model = load_model(device)
+
+        # Resolve resume point (crashed run, source watermark or full refresh)
+        checkpoint = resolve_checkpoint(incremental, model_id)
+
+        target_table = None
+        if shadow:
+            prepare_shadow_table(resume=checkpoint.products_committed > 0)
+            target_table = shadow_table()
+
+        # Fetch products
+        products = fetch_products_incremental(
+            watermark=checkpoint.source_watermark,
+            limit=limit,
+            after_product_id=checkpoint.last_product_id,
+        )
+        metrics.total_products = len(products)
+
+        # An interrupted shadow load may have nothing left to fetch but still needs its swap
+        if not products and not (shadow and checkpoint.products_committed):
+            print("\nNo products to process!")
+            checkpoint.status = "completed"
+            save_checkpoint(checkpoint)
+            metrics.end_time = time.time()
+            return metrics
+
+        # Process in chunks
+        chunk_size = settings.ml.embedding_chunk_size
+        batch_size = settings.ml.batch_size
+
+        print(f"\nProcessing Configuration:")
+        print(f"- Run: {checkpoint.run_id} ({checkpoint.run_mode})")
+        if version is not None:
+            print(f"- Version: {version.model_version} -> {version.table_name}")
+        if shadow:
+            print("- Target: shadow table (HNSW built after load, then swapped)")
+        print(f"- Chunk size: {chunk_size:,}")
+        print(f"- Batch size: {batch_size}")
+        print(f"- Device: {device}")
+        print(f"- Total products: {len(products):,}")
+
+        print("\nProcessing...")
+
+        checkpoint.status = "running"
+        save_checkpoint(checkpoint)
 
-        # Upsert to database
-        if product_ids:
-            upsert_embeddings_batch(product_ids, embeddings)
-            print(f"  Saved {len(product_ids):,} embeddings")
+        try:
+            for i in range(0, len(products), chunk_size):
+                chunk = products[i:i + chunk_size]
+                chunk_num = (i // chunk_size) + 1
+                total_chunks = (len(products) + chunk_size - 1) // chunk_size
+
+                print(f"Chunk {chunk_num}/{total_chunks}: Processing {len(chunk):,} products...")
+
+                # Process chunk
+                product_ids, embeddings = process_batch(chunk, model, batch_size, metrics)
+
+                # Upsert to database together with the advanced checkpoint;
+                # adopted only once committed, so a failed chunk is not skipped
+                advanced = checkpoint.advanced(chunk[-1], len(product_ids))
+                upsert_embeddings_batch(product_ids, embeddings, advanced, version, target_table)
+                checkpoint = advanced
+                if product_ids:
+                    print(f"  Saved {len(product_ids):,} embeddings")
+        except KeyboardInterrupt:
+            # Leave status 'running' so the next run resumes from the last chunk
+            raise
+        except Exception:
+            checkpoint.status = "failed"
+            save_checkpoint(checkpoint)
+            raise
+
+        if shadow:
+            build_shadow_index()
+
+        checkpoint.status = "completed"
+        save_checkpoint(checkpoint)
+
+        if shadow:
+            # Completed shadow checkpoint first: a crash before the swap restarts
+            # the load instead of swapping in a partial table
+            swap_shadow_table()
+            checkpoint.model_id = live_model_id
+            save_checkpoint(checkpoint)
 
     metrics.end_time = time.time()
 
     return metrics
 
 
-def main(incremental: bool = True, limit: Optional[int] = None):
+def main(
+    incremental: bool = True,
+    limit: Optional[int] = None,
+    model_version: Optional[str] = None,
+    shadow: bool = False
+):
     """
     Main entry point for embedding pipeline
 
     Args:
         incremental: Enable watermark-based incremental updates
         limit: Limit number of products (None = process all)
+        model_version: Optional embedding version to write into
+        shadow: Load a full refresh into a shadow table and swap it in
     """
     try:
-        metrics = run_pipeline(incremental=incremental, limit=limit)
+        metrics = run_pipeline(
+            incremental=incremental,
+            limit=limit,
+            model_version=model_version,
+            shadow=shadow,
+        )
         metrics.print_summary()
     except Exception as error:
         print(f"\n❌ Pipeline failed: {error}")
@@ -478,10 +784,14 @@ if __name__ == "__main__":
 
     # Parse command-line arguments
     incremental = "--full" not in sys.argv
+    shadow = "--shadow" in sys.argv
     limit = None
+    model_version = None
 
     for arg in sys.argv:
         if arg.startswith("--limit="):
             limit = int(arg.split("=")[1])
+        elif arg.startswith("--model-version="):
+            model_version = arg.split("=", 1)[1]
 
-    main(incremental=incremental, limit=limit)
+    main(incremental=incremental, limit=limit, model_version=model_version, shadow=shadow)
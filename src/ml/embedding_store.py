@@ -0,0 +1,423 @@
+"""
+Versioned Embedding Store
+
+Keeps product embeddings for several encoder versions side by side so a new
+model (or a quantized variant) can be embedded and indexed without touching
+the vectors that live search is reading.
+
+Layout (see sql/ml/create_embedding_versions.sql):
+- analytics_features.embedding_model_versions: registry of versions
+- analytics_features.product_embeddings_<version>: one table per version
+- analytics_features.embedding_active_version: single-row active pointer
+
+Lifecycle:
+    register_version()      -> table created, status 'building'
+    (pipeline writes vectors into the version table)
+    build_version_index()   -> HNSW built CONCURRENTLY, status 'ready'
+    activate_version()      -> pointer swapped atomically, status 'active'
+    garbage_collect()       -> old inactive tables dropped, status 'retired'
+
+Usage:
+    python -m src.ml.embedding_store list
+    python -m src.ml.embedding_store build-index minilm-q8-2026-10
+    python -m src.ml.embedding_store activate minilm-q8-2026-10
+    python -m src.ml.embedding_store gc --keep=1
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from psycopg2 import sql
+from psycopg2.extras import DictCursor
+
+from src.config import get_settings
+from src.config.database import get_postgres_connection
+
+
+SCHEMA = "analytics_features"
+LEGACY_TABLE = "product_embeddings"
+
+# How long readers may serve a cached active pointer before re-reading it
+ACTIVE_VERSION_TTL_SECONDS = 30.0
+
+# Cached active pointer for readers (search API)
+_active_cache = {"version": None, "expires_at": 0.0}
+
+
+@dataclass
+class EmbeddingVersion:
+    """Registry entry for one embedding model version"""
+    model_version: str
+    model_name: str
+    embedding_dim: int
+    table_name: str
+    status: str
+
+    @property
+    def qualified_table(self) -> sql.Composed:
+        return sql.SQL("{}.{}").format(sql.Identifier(SCHEMA), sql.Identifier(self.table_name))
+
+    @property
+    def index_name(self) -> str:
+        return f"idx_{self.table_name}_hnsw"[:63]
+
+
+def version_table_name(model_version: str) -> str:
+    """
+    Derive the per-version table name
+
+    Example:
+        "MiniLM-Q8 2026.10" -> "product_embeddings_minilm_q8_2026_10"
+    """
+    slug = re.sub(r'[^a-z0-9]+', '_', model_version.lower()).strip('_')
+    if not slug:
+        raise ValueError(f"Invalid model version: {model_version!r}")
+    return f"{LEGACY_TABLE}_{slug}"[:63]
+
+
+def _row_to_version(row) -> EmbeddingVersion:
+    return EmbeddingVersion(
+        model_version=row['model_version'],
+        model_name=row['model_name'],
+        embedding_dim=row['embedding_dim'],
+        table_name=row['table_name'],
+        status=row['status'],
+    )
+
+
+def get_version(model_version: str) -> Optional[EmbeddingVersion]:
+    """Look up a registered version"""
+    with get_postgres_connection(cursor_factory=DictCursor) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT model_version, model_name, embedding_dim, table_name, status
+            FROM analytics_features.embedding_model_versions
+            WHERE model_version = %s
+        """, (model_version,))
+        row = cursor.fetchone()
+
+    return _row_to_version(row) if row else None
+
+
+def list_versions() -> List[EmbeddingVersion]:
+    """List registered versions, newest first"""
+    with get_postgres_connection(cursor_factory=DictCursor) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT model_version, model_name, embedding_dim, table_name, status
+            FROM analytics_features.embedding_model_versions
+            ORDER BY created_at DESC
+        """)
+        return [_row_to_version(row) for row in cursor.fetchall()]
+
+
+def register_version(
+    model_version: str,
+    model_name: Optional[str] = None,
+    embedding_dim: Optional[int] = None,
+) -> EmbeddingVersion:
+    """
+    Register a version and create its (index-free) embeddings table
+
+    Re-registering an existing version is a no-op, so interrupted runs can
+    call this again before resuming.
+
+    Args:
+        model_version: Version key, e.g. "minilm-q8-2026-10"
+        model_name: Encoder name (defaults to settings.ml.embedding_model)
+        embedding_dim: Vector size (defaults to settings.ml.embedding_dimension)
+
+    Returns:
+        Registered version
+    """
+    settings = get_settings()
+    version = EmbeddingVersion(
+        model_version=model_version,
+        model_name=model_name or settings.ml.embedding_model,
+        embedding_dim=int(embedding_dim or settings.ml.embedding_dimension),
+        table_name=version_table_name(model_version),
+        status="building",
+    )
+
+    with get_postgres_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO analytics_features.embedding_model_versions
+                (model_version, model_name, embedding_dim, table_name, status)
+            VALUES (%s, %s, %s, %s, 'building')
+            ON CONFLICT (model_version) DO NOTHING
+        """, (version.model_version, version.model_name, version.embedding_dim, version.table_name))
+
+        cursor.execute(sql.SQL("""
+            CREATE TABLE IF NOT EXISTS {table} (
+                product_id BIGINT PRIMARY KEY,
+                embedding vector({dim}) NOT NULL,
+                source_updated_at TIMESTAMPTZ,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """).format(table=version.qualified_table, dim=sql.Literal(version.embedding_dim)))
+
+    registered = get_version(model_version)
+    if registered.model_name != version.model_name or registered.embedding_dim != version.embedding_dim:
+        raise ValueError(
+            f"Version {model_version} is registered for {registered.model_name} "
+            f"({registered.embedding_dim} dims), not {version.model_name} ({version.embedding_dim} dims)"
+        )
+
+    print(f"Embedding version {model_version} -> {SCHEMA}.{registered.table_name} ({registered.status})")
+    return registered
+
+
+def build_version_index(
+    model_version: str,
+    m: int = 16,
+    ef_construction: int = 64,
+    maintenance_work_mem: str = "2GB",
+    parallel_workers: int = 4,
+) -> EmbeddingVersion:
+    """
+    Build the HNSW index of a version without blocking readers or writers
+
+    Uses CREATE INDEX CONCURRENTLY on the version's own table, so live search
+    on the active version is unaffected while the graph is built. Any index
+    left by an earlier run is dropped first: a failed concurrent build leaves
+    an INVALID index that IF NOT EXISTS would silently keep.
+
+    Returns:
+        Version with status 'ready'
+
+    Raises:
+        ValueError: If the version is unknown or currently active
+    """
+    version = get_version(model_version)
+    if version is None:
+        raise ValueError(f"Unknown embedding version: {model_version}")
+    if version.status == "active":
+        raise ValueError(f"Version {model_version} is being served; register a new version to re-index")
+
+    print(f"Building HNSW index {version.index_name} on {SCHEMA}.{version.table_name}...")
+    start_time = time.time()
+
+    with get_postgres_connection() as conn:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute("SET maintenance_work_mem = %s", (maintenance_work_mem,))
+        cursor.execute("SET max_parallel_maintenance_workers = %s", (parallel_workers,))
+        cursor.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {schema}.{index}").format(
+            schema=sql.Identifier(SCHEMA),
+            index=sql.Identifier(version.index_name),
+        ))
+        cursor.execute(sql.SQL("""
+            CREATE INDEX CONCURRENTLY {index}
+            ON {table}
+            USING hnsw (embedding vector_cosine_ops)
+            WITH (m = {m}, ef_construction = {ef})
+        """).format(
+            index=sql.Identifier(version.index_name),
+            table=version.qualified_table,
+            m=sql.Literal(int(m)),
+            ef=sql.Literal(int(ef_construction)),
+        ))
+        cursor.execute(sql.SQL("ANALYZE {table}").format(table=version.qualified_table))
+
+        cursor.execute("""
+            UPDATE analytics_features.embedding_model_versions
+            SET status = 'ready', ready_at = NOW()
+            WHERE model_version = %s AND status = 'building'
+        """, (model_version,))
+
+    print(f"Index built in {time.time() - start_time:.1f}s")
+    return get_version(model_version)
+
+
+def activate_version(
+    model_version: str,
+    serving_model_name: Optional[str] = None,
+    serving_embedding_dim: Optional[int] = None,
+) -> EmbeddingVersion:
+    """
+    Point vector search at a version
+
+    The swap is one transaction: the previous active version goes back to
+    'ready' (kept for rollback until garbage collected).
+
+    Queries are encoded by the serving model, so a version built with another
+    encoder or dimension is refused: its distances would be meaningless (or
+    fail on the dimension). Deploy the new encoder first, then activate.
+
+    Args:
+        model_version: Version to serve
+        serving_model_name: Query encoder of the search API (defaults to settings.ml.embedding_model)
+        serving_embedding_dim: Its vector size (defaults to settings.ml.embedding_dimension)
+
+    Raises:
+        ValueError: If the version is unknown, its index is not built, or it
+            was built with a different encoder than the serving one
+    """
+    version = get_version(model_version)
+    if version is None:
+        raise ValueError(f"Unknown embedding version: {model_version}")
+    if version.status not in ("ready", "active"):
+        raise ValueError(f"Version {model_version} is '{version.status}'; build its index first")
+
+    settings = get_settings()
+    serving_model_name = serving_model_name or settings.ml.embedding_model
+    serving_embedding_dim = int(serving_embedding_dim or settings.ml.embedding_dimension)
+    if (version.model_name, version.embedding_dim) != (serving_model_name, serving_embedding_dim):
+        raise ValueError(
+            f"Version {model_version} was built with {version.model_name} ({version.embedding_dim} dims), "
+            f"but queries are encoded with {serving_model_name} ({serving_embedding_dim} dims)"
+        )
+
+    with get_postgres_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE analytics_features.embedding_model_versions
+            SET status = 'ready'
+            WHERE status = 'active' AND model_version <> %s
+        """, (model_version,))
+        cursor.execute("""
+            UPDATE analytics_features.embedding_model_versions
+            SET status = 'active', activated_at = NOW()
+            WHERE model_version = %s
+        """, (model_version,))
+        cursor.execute("""
+            INSERT INTO analytics_features.embedding_active_version (singleton, model_version, activated_at)
+            VALUES (TRUE, %s, NOW())
+            ON CONFLICT (singleton) DO UPDATE SET
+                model_version = EXCLUDED.model_version,
+                activated_at = EXCLUDED.activated_at
+        """, (model_version,))
+
+    _active_cache["expires_at"] = 0.0
+    print(f"Active embedding version: {model_version}")
+    return get_version(model_version)
+
+
+def garbage_collect_versions(keep: int = 1) -> List[str]:
+    """
+    Drop tables of inactive versions
+
+    The active version and the newest `keep` ready versions (rollback
+    targets) are kept; every other version is dropped and marked retired.
+
+    Returns:
+        Retired model versions
+    """
+    versions = [v for v in list_versions() if v.status != "retired"]
+    inactive = [v for v in versions if v.status != "active"]
+    ready = [v for v in inactive if v.status == "ready"]
+    keep_versions = {v.model_version for v in ready[:max(keep, 0)]}
+
+    # Versions still 'building' may be in use by a running pipeline
+    to_retire = [v for v in inactive if v.status == "ready" and v.model_version not in keep_versions]
+
+    retired: List[str] = []
+    for version in to_retire:
+        with get_postgres_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql.SQL("DROP TABLE IF EXISTS {table}").format(table=version.qualified_table))
+            cursor.execute("""
+                UPDATE analytics_features.embedding_model_versions
+                SET status = 'retired', retired_at = NOW()
+                WHERE model_version = %s AND status = 'ready'
+            """, (version.model_version,))
+        retired.append(version.model_version)
+        print(f"Retired embedding version {version.model_version} (dropped {version.table_name})")
+
+    return retired
+
+
+def get_active_version(ttl_seconds: float = ACTIVE_VERSION_TTL_SECONDS) -> Optional[EmbeddingVersion]:
+    """
+    Get the version served by vector search
+
+    Cached for `ttl_seconds` so the lookup costs nothing per query; a swap is
+    picked up by every reader within one TTL.
+
+    Returns:
+        Active version, or None when the legacy product_embeddings table is used
+    """
+    now = time.monotonic()
+    if now < _active_cache["expires_at"]:
+        return _active_cache["version"]
+
+    version: Optional[EmbeddingVersion] = None
+    try:
+        with get_postgres_connection(cursor_factory=DictCursor) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT v.model_version, v.model_name, v.embedding_dim, v.table_name, v.status
+                FROM analytics_features.embedding_active_version a
+                JOIN analytics_features.embedding_model_versions v USING (model_version)
+            """)
+            row = cursor.fetchone()
+            version = _row_to_version(row) if row else None
+    except Exception as error:
+        print(f"Warning: could not read active embedding version: {error}")
+        version = _active_cache["version"]
+
+    _active_cache["version"] = version
+    _active_cache["expires_at"] = now + ttl_seconds
+    return version
+
+
+def get_active_embeddings_table() -> sql.Composed:
+    """Qualified embeddings table for vector search (active version or legacy)"""
+    version = get_active_version()
+    if version is not None:
+        return version.qualified_table
+    return sql.SQL("{}.{}").format(sql.Identifier(SCHEMA), sql.Identifier(LEGACY_TABLE))
+
+
+def main():
+    """Command-line entry point for version maintenance"""
+    parser = argparse.ArgumentParser(description="Manage versioned product embeddings")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("list", help="List registered versions")
+
+    build_parser = subparsers.add_parser("build-index", help="Build HNSW index for a version")
+    build_parser.add_argument("model_version")
+    build_parser.add_argument("--m", type=int, default=16)
+    build_parser.add_argument("--ef-construction", type=int, default=64)
+    build_parser.add_argument("--maintenance-work-mem", default="2GB")
+    build_parser.add_argument("--parallel-workers", type=int, default=4)
+
+    activate_parser = subparsers.add_parser("activate", help="Serve a version from vector search")
+    activate_parser.add_argument("model_version")
+    activate_parser.add_argument("--serving-model", help="Query encoder of the search API (default: settings)")
+    activate_parser.add_argument("--serving-dim", type=int, help="Query vector size (default: settings)")
+
+    gc_parser = subparsers.add_parser("gc", help="Drop tables of old inactive versions")
+    gc_parser.add_argument("--keep", type=int, default=1, help="Inactive ready versions to keep for rollback")
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for version in list_versions():
+            print(f"{version.model_version:<30} {version.status:<10} {version.embedding_dim:>5}  "
+                  f"{version.model_name}  ({version.table_name})")
+    elif args.command == "build-index":
+        build_version_index(
+            args.model_version,
+            m=args.m,
+            ef_construction=args.ef_construction,
+            maintenance_work_mem=args.maintenance_work_mem,
+            parallel_workers=args.parallel_workers,
+        )
+    elif args.command == "activate":
+        activate_version(args.model_version, args.serving_model, args.serving_dim)
+    elif args.command == "gc":
+        retired = garbage_collect_versions(keep=args.keep)
+        print(f"Retired {len(retired)} version(s)")
+
+
+if __name__ == "__main__":
+    main()
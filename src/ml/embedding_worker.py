@@ -0,0 +1,532 @@
+"""
+Continuous Embedding Worker (CDC-driven)
+
+Long-running companion to embedding_pipeline_v2: instead of scanning
+dim_product on a schedule, it tails product change events and re-embeds only
+the products that changed, so new and edited products become searchable
+within seconds.
+
+Flow:
+1. Poll change events from bronze.product_cdc (default) or the Kafka product topic
+2. Debounce them into micro-batches (latest change per product wins)
+3. Build texts from the Debezium `after` image (same fields as dim_product)
+4. Encode with the existing build_text/process_batch path
+5. Upsert into the active embedding table, delete vectors of deleted products,
+   and store the read position + lag metrics in the same transaction
+
+Events are tailed by (ingested_at, id) of bronze.product_cdc, not by id:
+direct loads update bronze rows in place (same id, new ingested_at), so an
+id cursor would never see them. ingested_at is the loading transaction's
+start time and only becomes visible at commit, so reads stop just before the
+oldest open transaction in the database (at most `lookback_seconds` back).
+Scheduled incremental runs of embedding_pipeline_v2 remain the safety net.
+
+Usage:
+    python -m src.ml.embedding_worker
+    python -m src.ml.embedding_worker --source=kafka --batch-size=128 --debounce=1.5
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from psycopg2 import sql
+
+from src.config import get_settings
+from src.config.database import get_postgres_connection
+from src.ml.embedding_pipeline_v2 import (
+    PerformanceMetrics,
+    detect_device,
+    load_model,
+    process_batch,
+    write_embeddings,
+)
+from src.ml.embedding_store import LEGACY_TABLE, SCHEMA, EmbeddingVersion, get_active_version
+
+
+WORKER_NAME = "embedding_worker"
+
+
+@dataclass
+class ChangeEvent:
+    """One product change taken from the CDC stream"""
+    position: int
+    product_id: int
+    deleted: bool
+    after: Optional[Dict[str, Any]] = None
+    source_ts_ms: Optional[int] = None
+
+
+def parse_change_event(envelope: Any, position: int) -> Optional[ChangeEvent]:
+    """
+    Extract the product change from a Debezium envelope
+
+    Accepts both the full envelope ({"schema": ..., "payload": ...}) and a bare
+    payload. Tombstones and events without a product ID return None.
+    """
+    if isinstance(envelope, (str, bytes)):
+        try:
+            envelope = json.loads(envelope)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return None
+    if not isinstance(envelope, dict):
+        return None
+
+    payload = envelope.get('payload', envelope)
+    if not isinstance(payload, dict):
+        return None
+
+    after = payload.get('after')
+    row = after or payload.get('before') or {}
+    product_id = row.get('ID')
+    if product_id is None:
+        return None
+
+    source = payload.get('source') or {}
+    deleted = payload.get('op') == 'd' or not after or bool(after.get('Deleted'))
+
+    return ChangeEvent(
+        position=position,
+        product_id=int(product_id),
+        deleted=deleted,
+        after=None if deleted else after,
+        source_ts_ms=source.get('ts_ms') or payload.get('ts_ms'),
+    )
+
+
+def product_from_cdc(after: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map a Debezium `after` image of dbo.Product onto the dim_product columns used by build_text
+
+    Derived columns follow the CASE expressions in dbt/models/marts/dim_product.sql.
+    """
+    vendor_code = after.get('VendorCode')
+    name_pl = after.get('NamePL')
+    name_ua = after.get('NameUA')
+
+    weight = after.get('Weight')
+    try:
+        weight = float(weight) if weight is not None else None
+    except (TypeError, ValueError):
+        weight = None
+
+    if not vendor_code or len(vendor_code) < 4:
+        supplier_name = 'Unknown'
+    else:
+        supplier_name = vendor_code[:4]
+
+    if name_pl is not None and name_ua is not None:
+        multilingual_status = 'Complete'
+    elif name_pl is not None or name_ua is not None:
+        multilingual_status = 'Partial'
+    else:
+        multilingual_status = 'Missing'
+
+    if not weight:
+        weight_category = 'Missing'
+    elif weight < 1:
+        weight_category = 'Light (<1kg)'
+    elif weight < 10:
+        weight_category = 'Medium (1-10kg)'
+    else:
+        weight_category = 'Heavy (>10kg)'
+
+    return {
+        'product_id': int(after['ID']),
+        'vendor_code': vendor_code,
+        'name': after.get('Name'),
+        'ukrainian_name': name_ua,
+        'description': after.get('Description'),
+        'ukrainian_description': after.get('DescriptionUA'),
+        'search_name': after.get('SearchName'),
+        'search_ukrainian_name': after.get('SearchNameUA'),
+        'supplier_name': supplier_name,
+        'weight': weight,
+        'weight_category': weight_category,
+        'multilingual_status': multilingual_status,
+        'ucgfea': after.get('UCGFEA'),
+        'standard': after.get('Standard'),
+        'is_for_sale': after.get('IsForSale'),
+        'is_for_web': after.get('IsForWeb'),
+        'has_image': after.get('HasImage'),
+    }
+
+
+class MicroBatcher:
+    """
+    Debounce change events into micro-batches
+
+    Repeated changes to a product collapse into its latest event. A batch is
+    ready once it holds max_batch_size products or its oldest pending event
+    has waited debounce_seconds.
+    """
+
+    def __init__(self, max_batch_size: int = 256, debounce_seconds: float = 2.0):
+        self.max_batch_size = max_batch_size
+        self.debounce_seconds = debounce_seconds
+        self._pending: Dict[int, ChangeEvent] = {}
+        self._first_pending_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, events: List[ChangeEvent], now: Optional[float] = None) -> None:
+        if events and self._first_pending_at is None:
+            self._first_pending_at = time.monotonic() if now is None else now
+        for event in events:
+            # Re-insert so dict order follows the latest change
+            self._pending.pop(event.product_id, None)
+            self._pending[event.product_id] = event
+
+    def ready(self, now: Optional[float] = None) -> bool:
+        if not self._pending:
+            return False
+        if len(self._pending) >= self.max_batch_size:
+            return True
+        now = time.monotonic() if now is None else now
+        return now - self._first_pending_at >= self.debounce_seconds
+
+    def drain(self) -> List[ChangeEvent]:
+        events = list(self._pending.values())
+        self._pending = {}
+        self._first_pending_at = None
+        return events
+
+
+@dataclass
+class WorkerMetrics:
+    """Throughput and freshness of the worker"""
+    events_received: int = 0
+    products_embedded: int = 0
+    products_deleted: int = 0
+    batches_flushed: int = 0
+    last_lag_seconds: float = 0.0
+    max_lag_seconds: float = 0.0
+    backlog: int = 0
+    start_time: float = field(default_factory=time.time)
+
+    def record_lag(self, events: List[ChangeEvent]) -> Optional[datetime]:
+        """Update lag from the oldest event of a flushed batch; return the newest source time"""
+        timestamps = [e.source_ts_ms for e in events if e.source_ts_ms]
+        if not timestamps:
+            return None
+        self.last_lag_seconds = max(time.time() - min(timestamps) / 1000.0, 0.0)
+        self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+        return datetime.fromtimestamp(max(timestamps) / 1000.0, tz=timezone.utc)
+
+    def print_status(self) -> None:
+        uptime = time.time() - self.start_time
+        print(
+            f"[{datetime.now():%H:%M:%S}] events={self.events_received:,} "
+            f"embedded={self.products_embedded:,} deleted={self.products_deleted:,} "
+            f"batches={self.batches_flushed:,} lag={self.last_lag_seconds:.1f}s "
+            f"(max {self.max_lag_seconds:.1f}s) backlog={self.backlog:,} uptime={uptime:.0f}s"
+        )
+
+
+def _write_offsets(cursor, source_name: str, position: int, position_ts: Optional[datetime],
+                   metrics: WorkerMetrics, last_source_ts: Optional[datetime],
+                   embedded: int, deleted: int) -> None:
+    """Persist read position and lag using the caller's transaction"""
+    cursor.execute("""
+        INSERT INTO analytics_features.embedding_worker_offsets (
+            worker_name, source, last_position, last_position_ts, last_source_ts,
+            lag_seconds, backlog, products_embedded, products_deleted, updated_at
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (worker_name) DO UPDATE SET
+            source = EXCLUDED.source,
+            last_position = EXCLUDED.last_position,
+            last_position_ts = EXCLUDED.last_position_ts,
+            last_source_ts = COALESCE(EXCLUDED.last_source_ts, embedding_worker_offsets.last_source_ts),
+            lag_seconds = EXCLUDED.lag_seconds,
+            backlog = EXCLUDED.backlog,
+            products_embedded = embedding_worker_offsets.products_embedded + EXCLUDED.products_embedded,
+            products_deleted = embedding_worker_offsets.products_deleted + EXCLUDED.products_deleted,
+            updated_at = NOW()
+    """, (
+        f"{WORKER_NAME}:{source_name}",
+        source_name,
+        position,
+        position_ts,
+        last_source_ts,
+        round(metrics.last_lag_seconds, 3),
+        metrics.backlog,
+        embedded,
+        deleted,
+    ))
+
+
+# Rows with ingested_at before this horizon can no longer appear or change:
+# every writer that could still commit one started its transaction later.
+# Needs pg_read_all_stats to see other roles' xact_start.
+BRONZE_POLL_SQL = """
+    WITH horizon AS (
+        SELECT GREATEST(
+            LEAST(NOW(), COALESCE(MIN(xact_start), NOW())),
+            NOW() - make_interval(secs => %(lookback)s)
+        )::timestamp AS safe_before
+        FROM pg_stat_activity
+        WHERE datname = current_database()
+          AND xact_start IS NOT NULL
+          AND pid <> pg_backend_pid()
+    )
+    SELECT c.id, c.cdc_payload, c.ingested_at
+    FROM bronze.product_cdc c, horizon h
+    WHERE (c.ingested_at, c.id) > (%(position_ts)s, %(position)s)
+      AND c.ingested_at < h.safe_before
+    ORDER BY c.ingested_at, c.id
+    LIMIT %(limit)s
+"""
+
+
+class BronzeCdcSource:
+    """Tail bronze.product_cdc by (ingested_at, id), so in-place updates are seen"""
+
+    name = "bronze"
+
+    def __init__(self, lookback_seconds: float = 900.0):
+        self.lookback_seconds = lookback_seconds
+        self.position = 0
+        self.position_ts: Optional[datetime] = None
+        with get_postgres_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT last_position, last_position_ts
+                FROM analytics_features.embedding_worker_offsets
+                WHERE worker_name = %s
+            """, (f"{WORKER_NAME}:{self.name}",))
+            row = cursor.fetchone()
+            if row:
+                self.position, self.position_ts = row
+                if self.position_ts is None:
+                    # Offsets written by the id-only cursor: resume at that row's load time
+                    cursor.execute("SELECT ingested_at FROM bronze.product_cdc WHERE id = %s", (self.position,))
+                    found = cursor.fetchone()
+                    self.position_ts = found[0] if found else None
+            if self.position_ts is None:
+                # First start: only follow new changes, the batch pipeline owns the backfill
+                cursor.execute("""
+                    SELECT ingested_at, id FROM bronze.product_cdc
+                    ORDER BY ingested_at DESC, id DESC LIMIT 1
+                """)
+                found = cursor.fetchone()
+                self.position_ts, self.position = found if found else (datetime(1970, 1, 1), 0)
+        print(f"Bronze source starting after ({self.position_ts}, id {self.position:,})")
+
+    def poll(self, max_records: int) -> List[ChangeEvent]:
+        with get_postgres_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(BRONZE_POLL_SQL, {
+                "lookback": self.lookback_seconds,
+                "position_ts": self.position_ts,
+                "position": self.position,
+                "limit": max_records,
+            })
+            rows = cursor.fetchall()
+
+        events: List[ChangeEvent] = []
+        for cdc_id, payload, ingested_at in rows:
+            self.position, self.position_ts = cdc_id, ingested_at
+            event = parse_change_event(payload, cdc_id)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def backlog(self) -> int:
+        with get_postgres_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COUNT(*) FROM bronze.product_cdc
+                WHERE (ingested_at, id) > (%s, %s)
+            """, (self.position_ts, self.position))
+            return cursor.fetchone()[0]
+
+    def acknowledge(self) -> None:
+        """Position is already stored with the embeddings"""
+
+
+class KafkaCdcSource:
+    """Consume the Debezium product topic directly (offsets committed after each flush)"""
+
+    name = "kafka"
+
+    def __init__(self):
+        from kafka import KafkaConsumer
+
+        settings = get_settings()
+        self.position = 0
+        self.consumer = KafkaConsumer(
+            settings.kafka.topic_product,
+            bootstrap_servers=[s.strip() for s in settings.kafka.bootstrap_servers.split(",")],
+            group_id=f"{settings.kafka.consumer_group_prefix}-{WORKER_NAME}",
+            auto_offset_reset="latest",
+            enable_auto_commit=False,
+        )
+        print(f"Kafka source subscribed to {settings.kafka.topic_product}")
+
+    def poll(self, max_records: int) -> List[ChangeEvent]:
+        polled = self.consumer.poll(timeout_ms=500, max_records=max_records)
+        events: List[ChangeEvent] = []
+        for partition_records in polled.values():
+            for message in partition_records:
+                self.position = max(self.position, message.offset)
+                event = parse_change_event(message.value, message.offset)
+                if event is not None:
+                    events.append(event)
+        return events
+
+    def backlog(self) -> int:
+        assignment = self.consumer.assignment()
+        if not assignment:
+            return 0
+        end_offsets = self.consumer.end_offsets(list(assignment))
+        return sum(max(end_offsets[tp] - self.consumer.position(tp), 0) for tp in assignment)
+
+    def acknowledge(self) -> None:
+        self.consumer.commit()
+
+
+def _target_table(version: Optional[EmbeddingVersion]) -> sql.Composed:
+    if version is not None:
+        return version.qualified_table
+    return sql.SQL("{}.{}").format(sql.Identifier(SCHEMA), sql.Identifier(LEGACY_TABLE))
+
+
+def flush_batch(
+    events: List[ChangeEvent],
+    source,
+    model,
+    model_name: str,
+    batch_size: int,
+    metrics: WorkerMetrics,
+) -> None:
+    """
+    Re-embed changed products and remove deleted ones in one transaction
+
+    Writes go to the active embedding version (legacy table when none is active).
+    """
+    version = get_active_version()
+    if version is not None and version.model_name != model_name:
+        raise RuntimeError(
+            f"Active embedding version {version.model_version} uses {version.model_name}, "
+            f"worker model is {model_name}; restart the worker with the matching model"
+        )
+
+    products = [product_from_cdc(e.after) for e in events if not e.deleted]
+    deleted_ids = [e.product_id for e in events if e.deleted]
+
+    product_ids: List[int] = []
+    embeddings: List[List[float]] = []
+    if products:
+        product_ids, embeddings = process_batch(products, model, batch_size, PerformanceMetrics())
+
+    last_source_ts = metrics.record_lag(events)
+    metrics.backlog = source.backlog()
+
+    with get_postgres_connection() as conn:
+        cursor = conn.cursor()
+        write_embeddings(cursor, product_ids, embeddings, version)
+        if deleted_ids:
+            cursor.execute(
+                sql.SQL("DELETE FROM {table} WHERE product_id = ANY(%s)").format(table=_target_table(version)),
+                (deleted_ids,)
+            )
+        _write_offsets(cursor, source.name, source.position, getattr(source, "position_ts", None),
+                       metrics, last_source_ts, len(product_ids), len(deleted_ids))
+
+    source.acknowledge()
+
+    metrics.products_embedded += len(product_ids)
+    metrics.products_deleted += len(deleted_ids)
+    metrics.batches_flushed += 1
+
+
+def run_worker(
+    source_name: str = "bronze",
+    max_batch_size: int = 256,
+    debounce_seconds: float = 2.0,
+    poll_interval: float = 1.0,
+    status_interval: float = 30.0,
+) -> WorkerMetrics:
+    """
+    Run the worker until interrupted
+
+    Args:
+        source_name: 'bronze' (tail bronze.product_cdc) or 'kafka' (product topic)
+        max_batch_size: Flush as soon as this many products are pending
+        debounce_seconds: Flush pending products at most this long after the first change
+        poll_interval: Sleep between empty polls
+        status_interval: Seconds between status lines
+
+    Returns:
+        Worker metrics
+    """
+    settings = get_settings()
+    metrics = WorkerMetrics()
+
+    print("\n" + "=" * 80)
+    print("CONTINUOUS EMBEDDING WORKER")
+    print("=" * 80)
+
+    device = detect_device()
+    model = load_model(device)
+
+    if source_name == "kafka":
+        source = KafkaCdcSource()
+    elif source_name == "bronze":
+        source = BronzeCdcSource()
+    else:
+        raise ValueError(f"Unknown source: {source_name}")
+
+    batcher = MicroBatcher(max_batch_size=max_batch_size, debounce_seconds=debounce_seconds)
+    last_status = time.time()
+
+    print(f"- Batch size: {max_batch_size}, debounce: {debounce_seconds}s")
+    print("\nWaiting for product changes... (Ctrl+C to stop)")
+
+    try:
+        while True:
+            events = source.poll(max_batch_size)
+            metrics.events_received += len(events)
+            batcher.add(events)
+
+            if batcher.ready():
+                flush_batch(batcher.drain(), source, model, settings.ml.embedding_model,
+                            settings.ml.batch_size, metrics)
+            elif not events:
+                time.sleep(poll_interval)
+
+            if time.time() - last_status >= status_interval:
+                metrics.print_status()
+                last_status = time.time()
+    except KeyboardInterrupt:
+        if len(batcher):
+            print(f"\nFlushing {len(batcher)} pending products before exit...")
+            flush_batch(batcher.drain(), source, model, settings.ml.embedding_model,
+                        settings.ml.batch_size, metrics)
+
+    metrics.print_status()
+    return metrics
+
+
+if __name__ == "__main__":
+    import sys
+
+    source_name = "bronze"
+    max_batch_size = 256
+    debounce_seconds = 2.0
+
+    for arg in sys.argv:
+        if arg.startswith("--source="):
+            source_name = arg.split("=", 1)[1]
+        elif arg.startswith("--batch-size="):
+            max_batch_size = int(arg.split("=", 1)[1])
+        elif arg.startswith("--debounce="):
+            debounce_seconds = float(arg.split("=", 1)[1])
+
+    run_worker(source_name=source_name, max_batch_size=max_batch_size, debounce_seconds=debounce_seconds)
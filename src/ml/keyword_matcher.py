@@ -0,0 +1,98 @@
+"""
+Keyword Matcher (Aho-Corasick)
+
+Finds every catalog keyword contained in a query in one pass over the query,
+so the cost depends on the query length and not on how many keywords
+product_keyword_cache holds. Built once when keywords are loaded; the
+automaton is immutable, so a reload builds a new matcher and swaps it in.
+
+Matching is substring-based (same semantics as `keyword in text`) on
+lowercased text.
+
+Usage:
+    matcher = KeywordMatcher(["колодка", "гальмівн"])
+    matcher.find("колодка гальмівна передня")    # ['колодка', 'гальмівн']
+    matcher.contains_any("фільтр масляний")       # False
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+
+class KeywordMatcher:
+    """Multi-pattern substring matcher over a fixed keyword list"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+
+        seen = set()
+        for keyword in keywords:
+            keyword = keyword.strip().lower() if keyword else ""
+            if not keyword or keyword in seen:
+                continue
+            seen.add(keyword)
+            self._add(keyword, len(self.keywords))
+            self.keywords.append(keyword)
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def _add(self, keyword: str, index: int) -> None:
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        self._output[state] = self._output[state] + (index,)
+
+    def _link(self) -> None:
+        """Breadth-first failure links; outputs are merged along them"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _states(self, text: str):
+        goto, fail = self._goto, self._fail
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            yield state
+
+    def find(self, text: str) -> List[str]:
+        """Distinct keywords contained in `text`, in order of first occurrence end"""
+        if not self.keywords:
+            return []
+        found: Dict[int, None] = {}
+        output = self._output
+        for state in self._states(text.lower()):
+            for index in output[state]:
+                found.setdefault(index, None)
+        return [self.keywords[index] for index in found]
+
+    def contains_any(self, text: str) -> bool:
+        """True as soon as any keyword is found"""
+        if not self.keywords:
+            return False
+        output = self._output
+        return any(output[state] for state in self._states(text.lower()))
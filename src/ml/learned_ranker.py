@@ -0,0 +1,476 @@
+"""
+Learned Ranking Stage
+
+Re-scores the top-N candidates of the unified search SQL with a small
+linear model over per-product features held in memory:
+
+    score = static_score / max(static_score) + blend * tanh(w · standardize(x))
+
+The static SQL score still carries the query-dependent text match; the
+model learns how much popularity, availability, freshness and catalogue
+flags should move a product within a result list.
+
+Components:
+1. ProductFeatureStore - feature matrix as compact arrays (array('f') values,
+   sorted array('q') product ids, bisect lookup), reloaded periodically from
+   dim_product + product_popularity_scores and swapped atomically
+2. LinearRankingModel - JSON model file (feature means/scales, weights, blend)
+3. LearnedRanker - applies the model within a latency budget; returns False
+   (rows untouched, static order kept) when the store is empty, on errors or
+   when the budget is exceeded
+4. Training - pairwise logistic regression on skip-above click pairs from the
+   LTR export (src/ml/ltr_export.py): a clicked product should outscore every
+   unclicked product shown above it
+
+Usage:
+    python -m src.ml.ltr_export --since=2025-10-01 --output=ltr_train.parquet
+    python -m src.ml.learned_ranker --input=ltr_train.parquet --output=models/learned_ranker.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import time
+from array import array
+from bisect import bisect_left
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from src.ml.snapshot_refresh import SnapshotRefresh, fetch_tuples
+
+logger = logging.getLogger(__name__)
+
+FEATURE_NAMES = (
+    "popularity_score",
+    "trending_score",
+    "log_click_count",
+    "availability_score",
+    "freshness_score",
+    "is_for_sale",
+    "is_for_web",
+    "has_image",
+    "has_analogue",
+    "log_available_amount",
+)
+
+FEATURE_SQL = """
+    SELECT
+        p.product_id,
+        COALESCE(pop.popularity_score, 0)::float8,
+        COALESCE(pop.trending_score, 0)::float8,
+        LN(1 + COALESCE(pop.click_count, 0))::float8,
+        COALESCE(p.availability_score, 0)::float8,
+        COALESCE(p.freshness_score, 0)::float8,
+        CASE WHEN p.is_for_sale THEN 1.0 ELSE 0.0 END,
+        CASE WHEN p.is_for_web THEN 1.0 ELSE 0.0 END,
+        CASE WHEN p.has_image THEN 1.0 ELSE 0.0 END,
+        CASE WHEN p.has_analogue THEN 1.0 ELSE 0.0 END,
+        LN(1 + GREATEST(COALESCE(p.total_available_amount, 0), 0))::float8
+    FROM staging_marts.dim_product p
+    LEFT JOIN analytics_features.product_popularity_scores pop ON pop.product_id = p.product_id
+    ORDER BY p.product_id
+"""
+
+
+# ============================================================================
+# Feature Store
+# ============================================================================
+
+@dataclass
+class _FeatureSnapshot:
+    product_ids: array
+    values: array
+    loaded_at: float
+
+
+class ProductFeatureStore(SnapshotRefresh):
+    """
+    In-memory per-product feature matrix
+
+    Product ids are kept sorted in an array('q') and values row-major in an
+    array('f') (~40 bytes per product for 10 features), so the whole catalogue
+    fits in a few MB and a lookup is one bisect.
+    """
+
+    refresh_label = "Ranking feature store"
+    refresh_interval = 300.0
+
+    def __init__(self, feature_names: Sequence[str] = FEATURE_NAMES):
+        self.feature_names = tuple(feature_names)
+        self.width = len(self.feature_names)
+        self._snapshot: Optional[_FeatureSnapshot] = None
+
+    @property
+    def size(self) -> int:
+        snapshot = self._snapshot
+        return len(snapshot.product_ids) if snapshot else 0
+
+    @property
+    def loaded_at(self) -> Optional[float]:
+        snapshot = self._snapshot
+        return snapshot.loaded_at if snapshot else None
+
+    def load_rows(self, rows: Iterable[Sequence[Any]]) -> int:
+        """Replace the snapshot from (product_id, *features) rows"""
+        keyed = sorted(rows, key=lambda row: row[0])
+        product_ids = array('q')
+        values = array('f')
+        for row in keyed:
+            product_ids.append(int(row[0]))
+            values.extend(float(value or 0.0) for value in row[1:self.width + 1])
+
+        # Single reference assignment: readers see the old or the new snapshot
+        self._snapshot = _FeatureSnapshot(product_ids, values, time.time())
+        return len(product_ids)
+
+    def load(self, conn, fetch_size: int = 50000) -> int:
+        """Reload from dim_product + product_popularity_scores"""
+        start = time.time()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(FEATURE_SQL)
+            rows = list(fetch_tuples(cursor, fetch_size))
+        finally:
+            cursor.close()
+
+        count = self.load_rows(rows)
+        logger.info(f"Loaded ranking features for {count:,} products in {time.time() - start:.1f}s")
+        return count
+
+    def features(self, product_id: int) -> Optional[List[float]]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        index = bisect_left(snapshot.product_ids, product_id)
+        if index == len(snapshot.product_ids) or snapshot.product_ids[index] != product_id:
+            return None
+        offset = index * self.width
+        return list(snapshot.values[offset:offset + self.width])
+
+    def column_stats(self) -> Tuple[List[float], List[float]]:
+        """Per-feature mean and standard deviation over the catalogue"""
+        snapshot = self._snapshot
+        count = len(snapshot.product_ids) if snapshot else 0
+        if not count:
+            return [0.0] * self.width, [1.0] * self.width
+
+        means = []
+        scales = []
+        for column in range(self.width):
+            values = snapshot.values[column::self.width]
+            mean = sum(values) / count
+            variance = sum((value - mean) ** 2 for value in values) / count
+            means.append(mean)
+            scales.append(math.sqrt(variance) or 1.0)
+        return means, scales
+
+
+# ============================================================================
+# Model
+# ============================================================================
+
+@dataclass
+class LinearRankingModel:
+    """Standardized linear scorer, stored as JSON"""
+    feature_names: List[str]
+    means: List[float]
+    scales: List[float]
+    weights: List[float]
+    blend: float = 0.3
+    version: str = ""
+    trained_at: Optional[str] = None
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+    def score(self, features: Sequence[float]) -> float:
+        return sum(
+            weight * (value - mean) / scale
+            for weight, value, mean, scale in zip(self.weights, features, self.means, self.scales)
+        )
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "LinearRankingModel":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(**json.load(f))
+
+
+# ============================================================================
+# Serving
+# ============================================================================
+
+class LearnedRanker:
+    """
+    Re-score search candidates within a latency budget
+
+    Args:
+        model: Trained LinearRankingModel
+        store: ProductFeatureStore with the same feature order
+        top_n: Max candidates to re-score (deeper pages keep the static order)
+        budget_ms: Scores computed after this budget are discarded
+    """
+
+    def __init__(self, model: LinearRankingModel, store: ProductFeatureStore,
+                 top_n: int = 100, budget_ms: float = 5.0):
+        if tuple(model.feature_names) != store.feature_names:
+            raise ValueError(
+                f"Model features {model.feature_names} do not match store features {store.feature_names}"
+            )
+        self.model = model
+        self.store = store
+        self.top_n = top_n
+        self.budget_ms = budget_ms
+        self.fallbacks = 0
+
+    def rerank(self, rows: List[Dict[str, Any]], score_key: str = 'final_score') -> bool:
+        """
+        Replace rows[i][score_key] with the learned score (static kept in 'static_score')
+
+        Rows are not re-sorted; callers sort by score_key as before. Returns
+        False and leaves rows untouched when the static order should be used.
+        """
+        start = time.perf_counter()
+        if not rows or self.store.size == 0 or len(rows) > self.top_n:
+            return False
+
+        try:
+            static_scores = [float(row.get(score_key) or 0.0) for row in rows]
+            top = max(static_scores)
+            scale = top if top > 0 else 1.0
+
+            blended = []
+            for row, static_score in zip(rows, static_scores):
+                features = self.store.features(row['product_id'])
+                learned = self.model.score(features) if features is not None else 0.0
+                blended.append(static_score / scale + self.model.blend * math.tanh(learned))
+        except Exception as e:
+            self.fallbacks += 1
+            logger.warning(f"Learned ranking failed, using static order: {e}")
+            return False
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms > self.budget_ms:
+            self.fallbacks += 1
+            logger.warning(
+                f"Learned ranking took {elapsed_ms:.2f}ms (budget {self.budget_ms}ms), using static order"
+            )
+            return False
+
+        for row, static_score, score in zip(rows, static_scores, blended):
+            row['static_score'] = static_score
+            row[score_key] = score
+        return True
+
+
+# ============================================================================
+# Training
+# ============================================================================
+
+def skip_above_pairs(impressions: Iterable[Tuple[int, int, int, bool]]) -> Iterator[Tuple[int, int]]:
+    """
+    (preferred_product_id, other_product_id) pairs from impressions
+
+    Impressions are (query_id, product_id, rank_position, clicked), grouped by
+    query_id. Each clicked product is preferred over every unclicked product
+    ranked above it, and over the next unclicked product below it.
+    """
+    def pairs_for(group: List[Tuple[int, int, bool]]) -> Iterator[Tuple[int, int]]:
+        group.sort()
+        for index, (_, product_id, clicked) in enumerate(group):
+            if not clicked:
+                continue
+            for _, other_id, other_clicked in group[:index]:
+                if not other_clicked:
+                    yield product_id, other_id
+            for _, other_id, other_clicked in group[index + 1:]:
+                if not other_clicked:
+                    yield product_id, other_id
+                    break
+
+    current_query = None
+    group: List[Tuple[int, int, bool]] = []
+    for query_id, product_id, rank_position, clicked in impressions:
+        if query_id != current_query:
+            yield from pairs_for(group)
+            current_query = query_id
+            group = []
+        group.append((rank_position, product_id, bool(clicked)))
+    yield from pairs_for(group)
+
+
+def train_pairwise(
+    pairs: Sequence[Tuple[Sequence[float], Sequence[float]]],
+    means: Sequence[float],
+    scales: Sequence[float],
+    epochs: int = 10,
+    learning_rate: float = 0.05,
+    l2: float = 0.001,
+    seed: int = 42,
+) -> List[float]:
+    """
+    Pairwise logistic regression (RankNet with a linear scorer) by SGD
+
+    Each pair is (preferred features, other features); minimizes
+    log(1 + exp(-(w·x_preferred - w·x_other))) on standardized features.
+    """
+    width = len(means)
+    diffs = [
+        [((a - mean) - (b - mean)) / scale for a, b, mean, scale in zip(preferred, other, means, scales)]
+        for preferred, other in pairs
+    ]
+    weights = [0.0] * width
+    rng = random.Random(seed)
+
+    for epoch in range(epochs):
+        rng.shuffle(diffs)
+        rate = learning_rate / (1 + epoch)
+        for diff in diffs:
+            margin = sum(w * d for w, d in zip(weights, diff))
+            gradient = -1.0 / (1.0 + math.exp(min(margin, 50.0)))
+            for j in range(width):
+                weights[j] -= rate * (gradient * diff[j] + l2 * weights[j])
+    return weights
+
+
+def pairwise_accuracy(
+    weights: Sequence[float],
+    pairs: Sequence[Tuple[Sequence[float], Sequence[float]]],
+    means: Sequence[float],
+    scales: Sequence[float],
+) -> float:
+    """Share of pairs the model orders correctly"""
+    if not pairs:
+        return 0.0
+    model = LinearRankingModel(list(FEATURE_NAMES), list(means), list(scales), list(weights))
+    correct = sum(1 for preferred, other in pairs if model.score(preferred) > model.score(other))
+    return correct / len(pairs)
+
+
+def read_impressions(path: str) -> List[Tuple[int, int, int, bool]]:
+    """(query_id, product_id, rank_position, clicked) from an LTR export Parquet file"""
+    import pyarrow.parquet as pq
+
+    impressions: List[Tuple[int, int, int, bool]] = []
+    parquet = pq.ParquetFile(path)
+    for batch in parquet.iter_batches(columns=["query_id", "product_id", "rank_position", "clicked"]):
+        columns = batch.to_pydict()
+        impressions.extend(zip(
+            columns["query_id"], columns["product_id"], columns["rank_position"], columns["clicked"]
+        ))
+    return impressions
+
+
+def _group_by_query(
+    impressions: Iterable[Tuple[int, int, int, bool]]
+) -> Iterator[Tuple[int, List[Tuple[int, int, int, bool]]]]:
+    current_query = None
+    group: List[Tuple[int, int, int, bool]] = []
+    for impression in impressions:
+        if impression[0] != current_query:
+            if group:
+                yield current_query, group
+            current_query = impression[0]
+            group = []
+        group.append(impression)
+    if group:
+        yield current_query, group
+
+
+def build_model(
+    impressions: Sequence[Tuple[int, int, int, bool]],
+    store: ProductFeatureStore,
+    holdout: float = 0.2,
+    blend: float = 0.3,
+    epochs: int = 10,
+) -> LinearRankingModel:
+    """Train on skip-above pairs, holding out the last `holdout` share of queries"""
+    query_ids = sorted({impression[0] for impression in impressions})
+    cutoff = query_ids[int(len(query_ids) * (1 - holdout))] if query_ids and holdout > 0 else None
+
+    train_pairs = []
+    test_pairs = []
+    for query_id, group in _group_by_query(impressions):
+        target = test_pairs if cutoff is not None and query_id >= cutoff else train_pairs
+        for preferred_id, other_id in skip_above_pairs(group):
+            preferred = store.features(preferred_id)
+            other = store.features(other_id)
+            if preferred is not None and other is not None:
+                target.append((preferred, other))
+
+    means, scales = store.column_stats()
+    print(f"Training on {len(train_pairs):,} pairs ({len(test_pairs):,} held out)")
+    weights = train_pairwise(train_pairs, means, scales, epochs=epochs)
+
+    metrics = {
+        "train_pairs": float(len(train_pairs)),
+        "test_pairs": float(len(test_pairs)),
+        "train_pairwise_accuracy": pairwise_accuracy(weights, train_pairs, means, scales),
+        "test_pairwise_accuracy": pairwise_accuracy(weights, test_pairs, means, scales),
+    }
+    trained_at = datetime.now(timezone.utc)
+    return LinearRankingModel(
+        feature_names=list(store.feature_names),
+        means=means,
+        scales=scales,
+        weights=weights,
+        blend=blend,
+        version=f"linear-{trained_at:%Y%m%d%H%M}",
+        trained_at=trained_at.isoformat(),
+        metrics=metrics,
+    )
+
+
+def main():
+    """Train the learned ranker from an LTR export"""
+    parser = argparse.ArgumentParser(description="Train the learned ranking model")
+    parser.add_argument("--input", type=str, required=True, help="LTR export Parquet file")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="models/learned_ranker.json",
+        help="Model JSON path (LEARNED_RANKER_MODEL in the search API)"
+    )
+    parser.add_argument("--blend", type=float, default=0.3, help="Weight of the learned score vs the static score")
+    parser.add_argument("--epochs", type=int, default=10, help="SGD epochs")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of latest queries held out")
+
+    args = parser.parse_args()
+
+    from src.config.database import get_postgres_connection
+
+    print("\n" + "=" * 80)
+    print("LEARNED RANKER TRAINING")
+    print("=" * 80)
+
+    impressions = read_impressions(args.input)
+    print(f"Loaded {len(impressions):,} impressions from {args.input}")
+
+    store = ProductFeatureStore()
+    with get_postgres_connection() as conn:
+        count = store.load(conn)
+    print(f"Loaded features for {count:,} products")
+
+    model = build_model(impressions, store, holdout=args.holdout, blend=args.blend, epochs=args.epochs)
+    model.save(args.output)
+
+    print("\nWeights:")
+    for name, weight in zip(model.feature_names, model.weights):
+        print(f"  {name:<24} {weight:+.4f}")
+    print(f"\nTrain pairwise accuracy: {model.metrics['train_pairwise_accuracy']:.3f}")
+    print(f"Test pairwise accuracy:  {model.metrics['test_pairwise_accuracy']:.3f}")
+    print(f"Saved {model.version} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Learning-to-Rank Training Set Export
+
+Purpose: Stream (search, product, rank, clicked, features) rows to Parquet
+for ranker training. One row per impression, taken from the int4[] of
+returned product ids on search_query_log, labelled with clicks from
+search_click_log and joined to analytics_features.product_ml_features.
+`viewed` marks the products the client reported as seen through /events
+(search_impression_log); it is NULL for searches with no reported views.
+
+Rows are read through a server-side cursor and written one row group per
+chunk, so memory stays at `chunk_size` rows regardless of the date range.
+Rows are ordered by query_id, rank_position: consecutive rows with the same
+query_id form one ranking group.
+
+Usage:
+    python -m src.ml.ltr_export --since=2025-10-01 --output=ltr_train.parquet
+    python -m src.ml.ltr_export --since=2025-10-01 --until=2025-10-15 --all-queries
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.config.database import get_postgres_connection
+
+# product_ml_features columns exported as model inputs: (name, SQL cast, Arrow type).
+# Casting in SQL keeps NUMERIC values from arriving as Decimal.
+FEATURE_COLUMNS = (
+    ("text_length", "integer", pa.int32()),
+    ("has_ukrainian", "boolean", pa.bool_()),
+    ("has_english", "boolean", pa.bool_()),
+    ("has_analogue_flag", "smallint", pa.int8()),
+    ("has_image_flag", "smallint", pa.int8()),
+    ("for_sale_flag", "smallint", pa.int8()),
+    ("web_flag", "smallint", pa.int8()),
+    ("has_component_flag", "smallint", pa.int8()),
+    ("weight_category_encoded", "smallint", pa.int8()),
+    ("multilingual_status_encoded", "smallint", pa.int8()),
+    ("weight_normalized", "real", pa.float32()),
+    ("age_days", "real", pa.float32()),
+    ("days_since_update", "real", pa.float32()),
+    ("recency_score", "real", pa.float32()),
+    ("completeness_score", "real", pa.float32()),
+)
+
+SCHEMA = pa.schema(
+    [
+        ("query_id", pa.int64()),
+        ("searched_at", pa.timestamp("ms", tz="UTC")),
+        ("query_text", pa.string()),
+        ("query_type", pa.string()),
+        ("result_count", pa.int32()),
+        ("product_id", pa.int64()),
+        ("rank_position", pa.int32()),
+        ("click_count", pa.int32()),
+        ("clicked", pa.bool_()),
+        ("viewed", pa.bool_()),
+    ]
+    + [(name, arrow_type) for name, _, arrow_type in FEATURE_COLUMNS]
+)
+
+
+@dataclass
+class ExportStats:
+    """Statistics for an export run"""
+    rows: int = 0
+    clicked_rows: int = 0
+    chunks: int = 0
+    queries: int = 0
+    start_time: float = 0.0
+    end_time: float = 0.0
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.end_time - self.start_time
+
+    def print_summary(self, output: str) -> None:
+        ctr = 100.0 * self.clicked_rows / self.rows if self.rows else 0.0
+        print("\n" + "=" * 80)
+        print("LTR EXPORT SUMMARY")
+        print("=" * 80)
+        print(f"Output:            {output}")
+        print(f"Impressions:       {self.rows:,}")
+        print(f"Clicked:           {self.clicked_rows:,} ({ctr:.2f}% CTR)")
+        print(f"Ranking groups:    {self.queries:,}")
+        print(f"Row groups:        {self.chunks:,}")
+        print(f"Duration:          {self.duration_seconds:.1f}s")
+        print("=" * 80)
+
+
+def build_export_query(only_clicked_queries: bool = True) -> str:
+    """
+    SQL for the impression export
+
+    Clicks and reported views are read up to one day past `until`, so an
+    event shortly after a search near the end of the window still labels it.
+    """
+    feature_select = ",\n            ".join(
+        f"f.{name}::{sql_type} AS {name}" for name, sql_type, _ in FEATURE_COLUMNS
+    )
+    clicked_filter = """
+            AND EXISTS (
+                SELECT 1 FROM analytics_features.search_click_log cl
+                WHERE cl.query_id = ql.query_id
+                  AND cl.clicked_at >= %(since)s
+                  AND cl.clicked_at < %(click_until)s
+            )""" if only_clicked_queries else ""
+
+    return f"""
+        WITH impressions AS (
+            SELECT
+                ql.query_id,
+                ql.timestamp AS searched_at,
+                ql.query_text,
+                ql.query_type,
+                ql.result_count,
+                r.product_id::BIGINT AS product_id,
+                ql.result_offset + r.ordinality::INTEGER AS rank_position
+            FROM analytics_features.search_query_log ql
+            CROSS JOIN LATERAL unnest(ql.result_product_ids) WITH ORDINALITY AS r(product_id, ordinality)
+            WHERE ql.timestamp >= %(since)s
+              AND ql.timestamp < %(until)s
+              AND ql.result_product_ids IS NOT NULL{clicked_filter}
+        ),
+        clicks AS (
+            SELECT query_id, product_id, COUNT(*) AS click_count
+            FROM analytics_features.search_click_log
+            WHERE clicked_at >= %(since)s
+              AND clicked_at < %(click_until)s
+            GROUP BY query_id, product_id
+        ),
+        views AS (
+            SELECT DISTINCT query_id, product_id
+            FROM analytics_features.search_impression_log
+            WHERE impressed_at >= %(since)s
+              AND impressed_at < %(click_until)s
+        ),
+        reported AS (
+            SELECT DISTINCT query_id FROM views
+        )
+        SELECT
+            i.query_id,
+            i.searched_at,
+            i.query_text,
+            i.query_type,
+            i.result_count,
+            i.product_id,
+            i.rank_position,
+            COALESCE(c.click_count, 0) AS click_count,
+            c.click_count IS NOT NULL AS clicked,
+            CASE WHEN r.query_id IS NOT NULL THEN v.product_id IS NOT NULL END AS viewed,
+            {feature_select}
+        FROM impressions i
+        LEFT JOIN clicks c ON c.query_id = i.query_id AND c.product_id = i.product_id
+        LEFT JOIN reported r ON r.query_id = i.query_id
+        LEFT JOIN views v ON v.query_id = i.query_id AND v.product_id = i.product_id
+        LEFT JOIN analytics_features.product_ml_features f ON f.product_id = i.product_id
+        ORDER BY i.query_id, i.rank_position
+    """
+
+
+def rows_to_table(rows: Sequence[Sequence[Any]]) -> pa.Table:
+    """Convert a fetched chunk (tuples in SCHEMA order) to an Arrow table"""
+    columns: List[List[Any]] = [[] for _ in SCHEMA]
+    for row in rows:
+        for index, value in enumerate(row):
+            columns[index].append(value)
+    return pa.Table.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, SCHEMA)],
+        schema=SCHEMA,
+    )
+
+
+def export_training_set(
+    output: str,
+    since: datetime,
+    until: datetime,
+    chunk_size: int = 50000,
+    only_clicked_queries: bool = True,
+    compression: str = "zstd",
+) -> ExportStats:
+    """
+    Stream impressions in [since, until) into a Parquet file
+
+    Args:
+        output: Parquet file path
+        since: Inclusive lower bound on search time
+        until: Exclusive upper bound on search time
+        chunk_size: Rows per fetch and per Parquet row group
+        only_clicked_queries: Skip searches without any click (usual LTR practice)
+        compression: Parquet codec
+    """
+    stats = ExportStats(start_time=time.time())
+    params: Dict[str, Any] = {
+        "since": since,
+        "until": until,
+        "click_until": until + timedelta(days=1),
+    }
+
+    print(f"Exporting impressions {since:%Y-%m-%d} .. {until:%Y-%m-%d} -> {output}")
+
+    last_query_id: Optional[int] = None
+    with get_postgres_connection() as conn:
+        cursor = conn.cursor(name="ltr_export")
+        cursor.itersize = chunk_size
+        cursor.execute(build_export_query(only_clicked_queries), params)
+
+        with pq.ParquetWriter(output, SCHEMA, compression=compression) as writer:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+
+                table = rows_to_table(rows)
+                writer.write_table(table, row_group_size=chunk_size)
+
+                for row in rows:
+                    if row[0] != last_query_id:
+                        stats.queries += 1
+                        last_query_id = row[0]
+                stats.rows += len(rows)
+                stats.clicked_rows += sum(1 for row in rows if row[8])
+                stats.chunks += 1
+                print(f"  Wrote {stats.rows:,} rows ({stats.chunks} row group(s))")
+
+        cursor.close()
+
+    stats.end_time = time.time()
+    return stats
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.combine(date.fromisoformat(value), datetime.min.time())
+
+
+def main():
+    """Main entry point for LTR training set export"""
+    parser = argparse.ArgumentParser(description="Export learning-to-rank training set to Parquet")
+    parser.add_argument(
+        "--since",
+        type=str,
+        help="First search date to export (YYYY-MM-DD, default: 30 days ago)"
+    )
+    parser.add_argument(
+        "--until",
+        type=str,
+        help="Day after the last search date to export (YYYY-MM-DD, default: today)"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="ltr_train.parquet",
+        help="Output Parquet file"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=50000,
+        help="Rows per fetch / Parquet row group"
+    )
+    parser.add_argument(
+        "--all-queries",
+        action="store_true",
+        help="Include searches without any click"
+    )
+
+    args = parser.parse_args()
+
+    until = _parse_date(args.until) if args.until else _parse_date(date.today().isoformat())
+    since = _parse_date(args.since) if args.since else until - timedelta(days=30)
+
+    print("\n" + "=" * 80)
+    print("LEARNING-TO-RANK TRAINING SET EXPORT")
+    print("=" * 80)
+
+    stats = export_training_set(
+        output=args.output,
+        since=since,
+        until=until,
+        chunk_size=args.chunk_size,
+        only_clicked_queries=not args.all_queries,
+    )
+    stats.print_summary(args.output)
+
+
+if __name__ == "__main__":
+    main()
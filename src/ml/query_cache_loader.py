@@ -93,7 +93,10 @@ def load_model_for_caching(device: str) -> SentenceTransformer:
 
 def fetch_popular_queries_from_analytics(limit: int = 1000) -> List[str]:
     """
-    Fetch most popular search queries from search analytics table
+    Fetch most popular search queries from the search analytics rollups
+
+    Reads analytics_features.search_query_totals (maintained by
+    refresh_search_rollups()), so the cost is independent of log volume.
 
     Args:
         limit: Maximum number of queries to fetch
@@ -105,11 +108,10 @@ def fetch_popular_queries_from_analytics(limit: int = 1000) -> List[str]:
         cursor = conn.cursor()
 
         cursor.execute("""
-            SELECT query_text, COUNT(*) as search_count
-            FROM analytics_features.search_analytics
-            WHERE query_text IS NOT NULL
-                AND LENGTH(query_text) > 2
-            GROUP BY query_text
+            SELECT query_text, SUM(query_count) as search_count
+            FROM analytics_features.search_query_totals
+            WHERE LENGTH(query_text) > 2
+            GROUP BY query_hash, query_text
             ORDER BY search_count DESC
             LIMIT %s
         """, (limit,))
@@ -0,0 +1,109 @@
+"""
+Periodic Snapshot Refresh
+
+Shared reload loop for the in-memory serving structures (ranking feature
+store, facet, suggest and typo indexes). Each of them builds a new snapshot
+in load(conn) and publishes it with a single reference assignment, so a
+daemon thread can reload it while requests keep reading the previous one.
+A failed reload is logged and the previous snapshot stays in place.
+
+Usage:
+    class FacetIndex(SnapshotRefresh):
+        refresh_label = "Facet index"
+
+        def load(self, conn) -> int:
+            cursor = conn.cursor()
+            cursor.execute(FACET_SQL)
+            return self.load_rows(fetch_tuples(cursor))
+
+    index = load_and_refresh(FacetIndex(), connect, interval_seconds=300)
+    ...
+    index.stop_refresh()
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any, Callable, Iterator, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+S = TypeVar("S", bound="SnapshotRefresh")
+
+
+def as_tuple(row: Any) -> Tuple[Any, ...]:
+    """Plain or RealDictCursor row -> tuple in column order"""
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+
+def fetch_tuples(cursor, fetch_size: int = 50000) -> Iterator[Tuple[Any, ...]]:
+    """Rows of the executed query as tuples, fetched `fetch_size` at a time"""
+    while True:
+        chunk = cursor.fetchmany(fetch_size)
+        if not chunk:
+            break
+        for row in chunk:
+            yield as_tuple(row)
+
+
+class SnapshotRefresh:
+    """
+    Mixin: reload via load(conn) every `refresh_interval` seconds on a daemon thread
+
+    Subclasses implement load(conn) and set refresh_label (used in logs and
+    the thread name) and refresh_interval.
+    """
+
+    refresh_label = "Snapshot"
+    refresh_interval = 300.0
+
+    _refresh_stop: Optional[threading.Event] = None
+    _refresh_thread: Optional[threading.Thread] = None
+
+    def load(self, conn) -> int:
+        raise NotImplementedError
+
+    def reload(self, connect: Callable[[], Any]) -> int:
+        """Load once on a new connection, closed afterwards"""
+        conn = connect()
+        try:
+            return self.load(conn)
+        finally:
+            conn.close()
+
+    def start_refresh(self, connect: Callable[[], Any], interval_seconds: Optional[float] = None) -> None:
+        """Reload every `interval_seconds` on a daemon thread (each load opens its own connection)"""
+        if self._refresh_thread is not None:
+            return
+        interval = self.refresh_interval if interval_seconds is None else interval_seconds
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.reload(connect)
+                except Exception as e:
+                    logger.warning(f"{self.refresh_label} refresh failed, keeping previous snapshot: {e}")
+
+        self._refresh_stop = stop
+        self._refresh_thread = threading.Thread(
+            target=run,
+            name=f"{self.refresh_label.lower().replace(' ', '-')}-refresh",
+            daemon=True,
+        )
+        self._refresh_thread.start()
+
+    def stop_refresh(self) -> None:
+        if self._refresh_stop is not None:
+            self._refresh_stop.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join(timeout=5)
+            self._refresh_thread = None
+
+
+def load_and_refresh(snapshot: S, connect: Callable[[], Any], interval_seconds: Optional[float] = None) -> S:
+    """Load `snapshot` now, then keep it refreshed in the background"""
+    snapshot.reload(connect)
+    snapshot.start_refresh(connect, interval_seconds)
+    return snapshot
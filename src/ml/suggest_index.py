@@ -0,0 +1,269 @@
+"""
+In-Memory Suggest Index
+
+Prefix index for typeahead over vendor codes, original numbers,
+product_keyword_cache keywords and top logged queries, weighted by
+popularity. Lookups never touch Postgres.
+
+Keys are normalized like the search preprocessor's code variants (dots,
+dashes, slashes and whitespace removed, case-folded), so "sem1-bp" and
+"SEM1 BP" complete the same codes. Sorted keys are packed into one string
+with an offsets array; a prefix maps to a contiguous key range found with
+two bisects, and the top-k by weight within the range comes from a max
+segment tree, so a lookup is O(k log n) regardless of how many keys share
+the prefix.
+
+Usage:
+    index = SuggestIndex()
+    index.load(conn)
+    index.suggest("sem1", limit=10)
+    # [Suggestion(text='SEM1BP001', kind='vendor_code', score=1.62), ...]
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import math
+import re
+import time
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.ml.snapshot_refresh import SnapshotRefresh, as_tuple, fetch_tuples
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of each source; the in-source score (0..1) is added on top
+KIND_BOOSTS: Dict[str, float] = {
+    "query": 1.0,
+    "vendor_code": 0.8,
+    "original_number": 0.6,
+    "keyword": 0.5,
+}
+KINDS = tuple(KIND_BOOSTS)
+
+PRODUCT_CODES_SQL = """
+    SELECT
+        p.vendor_code,
+        p.main_original_number,
+        COALESCE(pop.popularity_score, 0)::real
+    FROM staging_marts.dim_product p
+    LEFT JOIN analytics_features.product_popularity_scores pop ON pop.product_id = p.product_id
+"""
+
+KEYWORDS_SQL = """
+    SELECT keyword, frequency
+    FROM analytics_features.product_keyword_cache
+    WHERE LENGTH(keyword) >= 3
+"""
+
+# Queries that mostly returned nothing are not worth suggesting
+TOP_QUERIES_SQL = """
+    SELECT MIN(query_text), SUM(query_count)
+    FROM analytics_features.search_query_totals
+    WHERE LENGTH(query_text) >= 4
+    GROUP BY query_hash
+    HAVING SUM(query_count) >= %s
+       AND SUM(zero_result_count) * 2 < SUM(query_count)
+    ORDER BY SUM(query_count) DESC
+    LIMIT %s
+"""
+
+_KEY_STRIP = re.compile(r'[.\-/\s]')
+_KEY_END = chr(0x10FFFF)
+
+
+def suggest_key(text: str) -> str:
+    """Normalized lookup key for a suggestion or a typed prefix"""
+    return _KEY_STRIP.sub('', text).casefold()
+
+
+@dataclass
+class Suggestion:
+    text: str
+    kind: str
+    score: float
+
+
+class _PackedStrings:
+    """Read-only sequence of strings stored as one str plus offsets"""
+
+    def __init__(self, strings: Sequence[str]):
+        self._data = "".join(strings)
+        self._offsets = array('i', [0])
+        position = 0
+        for value in strings:
+            position += len(value)
+            self._offsets.append(position)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return self._data[self._offsets[index]:self._offsets[index + 1]]
+
+
+@dataclass
+class _SuggestSnapshot:
+    keys: _PackedStrings
+    texts: _PackedStrings
+    kinds: bytes
+    weights: array
+    tree: array  # max segment tree over weights: leaf i at tree[size + i]
+    size: int
+    loaded_at: float
+
+
+class SuggestIndex(SnapshotRefresh):
+    """Prefix -> top suggestions by weight, swapped atomically on reload"""
+
+    refresh_label = "Suggest index"
+    refresh_interval = 600.0
+
+    def __init__(self, max_queries: int = 50000, min_query_count: int = 2):
+        self.max_queries = max_queries
+        self.min_query_count = min_query_count
+        self._snapshot: Optional[_SuggestSnapshot] = None
+
+    @property
+    def size(self) -> int:
+        snapshot = self._snapshot
+        return len(snapshot.keys) if snapshot else 0
+
+    def load_entries(self, entries: Iterable[Tuple[str, str, float]]) -> int:
+        """
+        Rebuild from (text, kind, score) entries, score in 0..1
+
+        Entries that normalize to the same key keep the highest weight.
+        """
+        best: Dict[str, Tuple[float, str, int]] = {}
+        for text, kind, score in entries:
+            if not text:
+                continue
+            text = text.strip()
+            key = suggest_key(text)
+            if not key:
+                continue
+            weight = KIND_BOOSTS[kind] + min(max(float(score), 0.0), 1.0)
+            current = best.get(key)
+            if current is None or weight > current[0]:
+                best[key] = (weight, text, KINDS.index(kind))
+
+        keys = sorted(best)
+        weights = array('f', (best[key][0] for key in keys))
+        size = 1
+        while size < max(len(keys), 1):
+            size *= 2
+        tree = array('i', [-1]) * (2 * size)
+        for index in range(len(keys)):
+            tree[size + index] = index
+        for node in range(size - 1, 0, -1):
+            tree[node] = self._better(weights, tree[2 * node], tree[2 * node + 1])
+
+        self._snapshot = _SuggestSnapshot(
+            keys=_PackedStrings(keys),
+            texts=_PackedStrings([best[key][1] for key in keys]),
+            kinds=bytes(best[key][2] for key in keys),
+            weights=weights,
+            tree=tree,
+            size=size,
+            loaded_at=time.time(),
+        )
+        return len(keys)
+
+    def load(self, conn, fetch_size: int = 50000) -> int:
+        """Reload from dim_product, product_keyword_cache and search_query_totals"""
+        start = time.time()
+        cursor = conn.cursor()
+        try:
+            entries: List[Tuple[str, str, float]] = []
+
+            cursor.execute(PRODUCT_CODES_SQL)
+            for vendor_code, original_number, popularity in fetch_tuples(cursor, fetch_size):
+                entries.append((vendor_code, "vendor_code", popularity))
+                entries.append((original_number, "original_number", popularity))
+
+            cursor.execute(KEYWORDS_SQL)
+            entries.extend(_log_scaled(cursor.fetchall(), "keyword"))
+
+            cursor.execute(TOP_QUERIES_SQL, (self.min_query_count, self.max_queries))
+            entries.extend(_log_scaled(cursor.fetchall(), "query"))
+        finally:
+            cursor.close()
+
+        count = self.load_entries(entries)
+        logger.info(f"Loaded suggest index with {count:,} keys in {time.time() - start:.1f}s")
+        return count
+
+    # ------------------------------------------------------------------
+    # Query side
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _better(weights: array, left: int, right: int) -> int:
+        if left < 0:
+            return right
+        if right < 0:
+            return left
+        return right if weights[right] > weights[left] else left
+
+    def _range_max(self, snapshot: _SuggestSnapshot, lo: int, hi: int) -> int:
+        """Index of the heaviest key in [lo, hi), or -1 if empty"""
+        tree, weights = snapshot.tree, snapshot.weights
+        best = -1
+        lo += snapshot.size
+        hi += snapshot.size
+        while lo < hi:
+            if lo & 1:
+                best = self._better(weights, best, tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                best = self._better(weights, best, tree[hi])
+            lo >>= 1
+            hi >>= 1
+        return best
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Suggestion]:
+        """Top `limit` suggestions whose key starts with the normalized prefix"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("Suggest index not loaded")
+
+        key = suggest_key(prefix)
+        if not key or limit <= 0:
+            return []
+
+        lo = bisect_left(snapshot.keys, key)
+        hi = bisect_left(snapshot.keys, key + _KEY_END, lo)
+
+        results: List[Suggestion] = []
+        heap: List[Tuple[float, int, int, int]] = []
+
+        def push(start: int, end: int) -> None:
+            if start < end:
+                best = self._range_max(snapshot, start, end)
+                heapq.heappush(heap, (-snapshot.weights[best], best, start, end))
+
+        push(lo, hi)
+        while heap and len(results) < limit:
+            weight, best, start, end = heapq.heappop(heap)
+            results.append(Suggestion(
+                text=snapshot.texts[best],
+                kind=KINDS[snapshot.kinds[best]],
+                score=round(-weight, 4),
+            ))
+            push(start, best)
+            push(best + 1, end)
+        return results
+
+
+def _log_scaled(rows: Sequence[Sequence[Any]], kind: str) -> List[Tuple[str, str, float]]:
+    """(text, count) rows -> entries scored log(1 + count) / log(1 + max count)"""
+    rows = [as_tuple(row) for row in rows]
+    top = max((float(count or 0) for _, count in rows), default=0.0)
+    scale = math.log1p(top) or 1.0
+    return [(text, kind, math.log1p(float(count or 0)) / scale) for text, count in rows]
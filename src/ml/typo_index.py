@@ -0,0 +1,262 @@
+"""
+In-Memory Typo Index (symmetric delete)
+
+Edit-distance candidates for vendor codes, original numbers and catalog
+keywords, used by /search as a fallback when exact and substring matching
+return nothing (e.g. a code with one wrong or transposed character).
+
+Symmetric delete: every vocabulary term is indexed under the strings made by
+deleting up to `max_distance` characters from its first `prefix_length`
+characters; a query term generates the same deletes, and any shared delete
+is a candidate, verified with the optimal string alignment (Damerau)
+distance. Substitutions, insertions, deletions and adjacent transpositions
+are all found without scanning the vocabulary.
+
+Deletes are stored as one sorted array('q') of (hash << 20 | term number),
+so the index is 8 bytes per delete and a lookup is one bisect per delete.
+
+Usage:
+    index = TypoIndex()
+    index.load(conn)
+    index.candidates("SEM1BP01O")    # [TypoCandidate(text='SEM1-BP-010', distance=1, ...)]
+    index.correct_query("колодкі SEM1BP01O")
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+import time
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from src.ml.snapshot_refresh import SnapshotRefresh, as_tuple, fetch_tuples
+
+logger = logging.getLogger(__name__)
+
+VOCABULARY_SQL = """
+    SELECT p.vendor_code, COALESCE(pop.popularity_score, 0)::real
+    FROM staging_marts.dim_product p
+    LEFT JOIN analytics_features.product_popularity_scores pop ON pop.product_id = p.product_id
+    UNION ALL
+    SELECT p.main_original_number, COALESCE(pop.popularity_score, 0)::real
+    FROM staging_marts.dim_product p
+    LEFT JOIN analytics_features.product_popularity_scores pop ON pop.product_id = p.product_id
+    WHERE p.main_original_number IS NOT NULL
+"""
+
+KEYWORDS_SQL = """
+    SELECT keyword, frequency
+    FROM analytics_features.product_keyword_cache
+    WHERE LENGTH(keyword) >= 4
+"""
+
+_KEY_STRIP = re.compile(r'[.\-/\s]')
+_ID_BITS = 20
+_HASH_MASK = (1 << (63 - _ID_BITS)) - 1
+
+
+def typo_key(text: str) -> str:
+    """Normalized form compared by edit distance (same as the search code variants)"""
+    return _KEY_STRIP.sub('', text).upper()
+
+
+def _deletes(key: str, max_distance: int) -> Set[str]:
+    """`key` plus every string made by deleting up to `max_distance` characters"""
+    result = {key}
+    frontier = {key}
+    for _ in range(max_distance):
+        frontier = {word[:i] + word[i + 1:] for word in frontier if len(word) > 1 for i in range(len(word))}
+        result |= frontier
+    return result
+
+
+def damerau_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance, or max_distance + 1 once it is exceeded"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+
+@dataclass
+class TypoCandidate:
+    text: str
+    distance: int
+    score: float
+
+
+@dataclass
+class _TypoSnapshot:
+    keys: List[str]
+    texts: List[str]
+    scores: array
+    deletes: array
+    loaded_at: float
+
+
+class TypoIndex(SnapshotRefresh):
+    """Symmetric-delete index over normalized terms, swapped atomically on reload"""
+
+    refresh_label = "Typo index"
+    refresh_interval = 3600.0
+
+    def __init__(self, max_distance: int = 1, prefix_length: int = 10,
+                 min_term_length: int = 4, max_candidates: int = 2000):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.min_term_length = min_term_length
+        self.max_candidates = max_candidates
+        self._snapshot: Optional[_TypoSnapshot] = None
+
+    @property
+    def size(self) -> int:
+        snapshot = self._snapshot
+        return len(snapshot.keys) if snapshot else 0
+
+    def load_entries(self, entries: Iterable[Tuple[str, float]]) -> int:
+        """
+        Rebuild from (text, score) entries
+
+        Texts that normalize to the same key keep the highest score.
+        """
+        best: Dict[str, Tuple[float, str]] = {}
+        for text, score in entries:
+            if not text:
+                continue
+            text = text.strip()
+            key = typo_key(text)
+            if len(key) < self.min_term_length:
+                continue
+            current = best.get(key)
+            if current is None or score > current[0]:
+                best[key] = (float(score), text)
+
+        keys = sorted(best)
+        if len(keys) >= 1 << _ID_BITS:
+            raise ValueError(f"Typo index supports at most {1 << _ID_BITS:,} terms, got {len(keys):,}")
+
+        packed = []
+        for term_id, key in enumerate(keys):
+            for delete in _deletes(key[:self.prefix_length], self.max_distance):
+                packed.append((hash(delete) & _HASH_MASK) << _ID_BITS | term_id)
+        packed.sort()
+
+        self._snapshot = _TypoSnapshot(
+            keys=keys,
+            texts=[best[key][1] for key in keys],
+            scores=array('f', (best[key][0] for key in keys)),
+            deletes=array('q', packed),
+            loaded_at=time.time(),
+        )
+        return len(keys)
+
+    def load(self, conn, fetch_size: int = 50000) -> int:
+        """Reload from dim_product codes and product_keyword_cache"""
+        start = time.time()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(VOCABULARY_SQL)
+            entries: List[Tuple[str, float]] = list(fetch_tuples(cursor, fetch_size))
+
+            cursor.execute(KEYWORDS_SQL)
+            keywords = [as_tuple(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+        top = max((float(frequency or 0) for _, frequency in keywords), default=0.0)
+        scale = math.log1p(top) or 1.0
+        entries.extend((keyword, math.log1p(float(frequency or 0)) / scale) for keyword, frequency in keywords)
+
+        count = self.load_entries(entries)
+        logger.info(f"Loaded typo index with {count:,} terms in {time.time() - start:.1f}s")
+        return count
+
+    # ------------------------------------------------------------------
+    # Query side
+    # ------------------------------------------------------------------
+
+    def _term_ids(self, snapshot: _TypoSnapshot, delete: str) -> Iterable[int]:
+        deletes = snapshot.deletes
+        base = (hash(delete) & _HASH_MASK) << _ID_BITS
+        index = bisect_left(deletes, base)
+        end = base + (1 << _ID_BITS)
+        while index < len(deletes) and deletes[index] < end:
+            yield deletes[index] & ((1 << _ID_BITS) - 1)
+            index += 1
+
+    def candidates(self, term: str, max_distance: Optional[int] = None, limit: int = 5) -> List[TypoCandidate]:
+        """
+        Vocabulary terms within `max_distance` edits of `term`
+
+        Ordered by distance, then score. An exact match is returned alone
+        with distance 0.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("Typo index not loaded")
+
+        key = typo_key(term)
+        if len(key) < self.min_term_length:
+            return []
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+
+        checked: Set[int] = set()
+        found: List[Tuple[int, float, int]] = []
+        for delete in _deletes(key[:self.prefix_length], max_distance):
+            if len(checked) >= self.max_candidates:
+                break
+            for term_id in self._term_ids(snapshot, delete):
+                if term_id in checked:
+                    continue
+                checked.add(term_id)
+                candidate = snapshot.keys[term_id]
+                distance = 0 if candidate == key else damerau_distance(key, candidate, max_distance)
+                if distance == 0:
+                    return [TypoCandidate(snapshot.texts[term_id], 0, snapshot.scores[term_id])]
+                if distance <= max_distance:
+                    found.append((distance, -snapshot.scores[term_id], term_id))
+                if len(checked) >= self.max_candidates:
+                    break
+
+        found.sort()
+        return [
+            TypoCandidate(snapshot.texts[term_id], distance, -neg_score)
+            for distance, neg_score, term_id in found[:limit]
+        ]
+
+    def correct_query(self, query: str) -> Optional[str]:
+        """
+        Query with each unknown term replaced by its closest vocabulary term
+
+        Terms of 8+ characters may be corrected at distance 2 when the index
+        is built for it. Returns None when nothing was corrected.
+        """
+        corrected: List[str] = []
+        changed = False
+        for token in query.split():
+            max_distance = 2 if len(typo_key(token)) >= 8 else 1
+            matches = self.candidates(token, max_distance=max_distance, limit=1)
+            if matches and matches[0].distance > 0:
+                corrected.append(matches[0].text)
+                changed = True
+            else:
+                corrected.append(token)
+        return " ".join(corrected) if changed else None
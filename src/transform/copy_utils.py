@@ -0,0 +1,78 @@
+"""
+Helpers for streaming rows into PostgreSQL with COPY FROM STDIN (text format).
+
+Rows are produced lazily by a generator and fed to cursor.copy_expert through
+a file-like adapter, so a whole batch is never materialised as one string.
+"""
+
+import io
+from typing import Any, Iterable, Iterator, Optional, Sequence
+
+COPY_NULL = "\\N"
+
+
+def copy_text_value(value: Optional[Any]) -> str:
+    """Escape one value for COPY text format (NULL -> \\N)."""
+    if value is None:
+        return COPY_NULL
+    text = value if isinstance(value, str) else str(value)
+    return (
+        text.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_text_line(values: Sequence[Optional[Any]]) -> str:
+    """Format one row as a tab-separated COPY text line."""
+    return "\t".join(copy_text_value(v) for v in values) + "\n"
+
+
+class CopyLineStream(io.RawIOBase):
+    """Read-only byte stream over an iterator of COPY text lines."""
+
+    def __init__(self, lines: Iterable[str]):
+        self._lines: Iterator[str] = iter(lines)
+        self._buffer = b""
+        self.rows = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                line = next(self._lines)
+            except StopIteration:
+                break
+            self._buffer += line.encode("utf-8")
+            self.rows += 1
+
+        if size < 0:
+            chunk, self._buffer = self._buffer, b""
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    def readline(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+
+def copy_rows(cursor, table: str, columns: Sequence[str], lines: Iterable[str]) -> int:
+    """
+    COPY text lines into `table` and return the number of rows sent.
+
+    Args:
+        cursor: Open cursor (transaction handled by the caller)
+        table: Target table, already quoted/qualified
+        columns: Target column names
+        lines: Lines produced by copy_text_line
+    """
+    stream = CopyLineStream(lines)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT text)",
+        stream,
+        size=1024 * 1024,
+    )
+    return stream.rows
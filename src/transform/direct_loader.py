@@ -1,16 +1,35 @@
 """
-Direct loader: MinIO JSONL → PostgreSQL bronze table (no Spark needed).
-Reads CDC events from MinIO and loads them into a PostgreSQL table for dbt processing.
+Direct loader: MinIO landing objects → PostgreSQL bronze table (no Spark needed).
+Reads CDC events from MinIO (Parquet, gzip JSONL or JSONL) and loads them into a PostgreSQL table for dbt processing.
+
+Re-runs are O(new files): every loaded object is recorded in bronze.load_manifest
+(key + ETag) in the same transaction as its rows, and listed objects already in
+the manifest are skipped without being read. New objects are stream-decoded and
+COPY'd into a temp table on their own connection, several files in parallel,
+then merged into the bronze table with ON CONFLICT DO NOTHING.
 """
 
 import json
 import os
-from datetime import datetime
-from typing import Any, Dict, List
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 
 import boto3
 import psycopg2
-from psycopg2.extras import Json, execute_values
+
+from src.ingestion.utils.landing_writer import is_landing_object, read_landing_object
+from src.transform.copy_utils import copy_rows, copy_text_line
+
+BRONZE_COLUMNS = (
+    "kafka_topic",
+    "kafka_partition",
+    "kafka_offset",
+    "kafka_timestamp",
+    "kafka_key",
+    "cdc_payload",
+    "batch_file",
+)
 
 
 def get_s3_client():
@@ -41,7 +60,7 @@ def get_pg_connection():
 
 
 def create_bronze_table(conn):
-    """Create bronze.product_cdc table if it doesn't exist."""
+    """Create bronze.product_cdc and the load manifest if they don't exist."""
     with conn.cursor() as cur:
         # Create schema
         cur.execute("CREATE SCHEMA IF NOT EXISTS bronze;")
@@ -73,27 +92,51 @@ def create_bronze_table(conn):
             ON bronze.product_cdc(ingested_at);
         """)
 
+        # One row per loaded object; written in the same transaction as its rows
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS bronze.load_manifest (
+                bucket VARCHAR(255) NOT NULL,
+                object_key VARCHAR(1024) NOT NULL,
+                etag VARCHAR(255) NOT NULL,
+                target_table VARCHAR(255) NOT NULL,
+                record_count BIGINT NOT NULL,
+                rows_inserted BIGINT NOT NULL,
+                load_seconds NUMERIC(10, 3),
+                loaded_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (bucket, object_key)
+            );
+        """)
+
         conn.commit()
         print("✓ Created bronze.product_cdc table")
 
 
-def read_jsonl_from_minio(s3_client, bucket: str, key: str) -> List[Dict[str, Any]]:
-    """Read JSONL file from MinIO and parse into list of dicts."""
-    print(f"Reading s3://{bucket}/{key}")
+def list_new_objects(s3_client, conn, bucket: str, prefix: str) -> List[Tuple[str, str]]:
+    """
+    List landing objects not yet in the manifest (or whose ETag changed).
 
-    obj = s3_client.get_object(Bucket=bucket, Key=key)
-    content = obj["Body"].read().decode("utf-8")
+    Only listing metadata is read; processed objects are never downloaded.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT object_key, etag FROM bronze.load_manifest WHERE bucket = %s AND object_key LIKE %s",
+            (bucket, prefix.replace("%", "\\%").replace("_", "\\_") + "%"),
+        )
+        loaded = dict(cur.fetchall())
 
-    records = []
-    for line in content.strip().split("\n"):
-        if line:
-            records.append(json.loads(line))
+    new_objects: List[Tuple[str, str]] = []
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            key, etag = obj["Key"], obj["ETag"].strip('"')
+            if is_landing_object(key) and loaded.get(key) != etag:
+                new_objects.append((key, etag))
 
-    return records
+    return new_objects
 
 
-def transform_record(record: Dict[str, Any], batch_file: str) -> tuple:
-    """Transform CDC record for PostgreSQL insertion."""
+def transform_record(record: Dict[str, Any], batch_file: str) -> str:
+    """Transform CDC record into a COPY text line for the bronze columns."""
     # Parse key if it's a string
     key = record.get("key")
     if isinstance(key, str):
@@ -102,49 +145,81 @@ def transform_record(record: Dict[str, Any], batch_file: str) -> tuple:
         except json.JSONDecodeError:
             pass
 
-    return (
+    return copy_text_line((
         record.get("topic"),
         record.get("partition"),
         record.get("offset"),
         record.get("timestamp"),
-        Json(key) if key else None,
-        Json(record.get("value")),
+        json.dumps(key) if key else None,
+        json.dumps(record.get("value")),
         batch_file,
-    )
+    ))
 
 
-def load_to_postgres(conn, records: List[Dict[str, Any]], batch_file: str):
-    """Bulk load records into PostgreSQL."""
-    if not records:
-        print("No records to load")
-        return
+def _copy_lines(records: Iterable[Dict[str, Any]], batch_file: str) -> Iterator[str]:
+    for record in records:
+        yield transform_record(record, batch_file)
 
-    values = [transform_record(r, batch_file) for r in records]
 
-    with conn.cursor() as cur:
-        execute_values(
-            cur,
-            """
-            INSERT INTO bronze.product_cdc
-                (kafka_topic, kafka_partition, kafka_offset, kafka_timestamp,
-                 kafka_key, cdc_payload, batch_file)
-            VALUES %s
-            ON CONFLICT (kafka_topic, kafka_partition, kafka_offset) DO NOTHING
-            """,
-            values,
-            page_size=1000,
-        )
+def load_object(s3_client, bucket: str, key: str, etag: str, target_table: str) -> Tuple[int, int]:
+    """
+    Load one landing object on its own connection.
+
+    Rows are streamed from MinIO into a temp table with COPY, merged into the
+    bronze table, and the manifest row is written in the same transaction.
+
+    Returns:
+        (records read, rows inserted)
+    """
+    start_time = time.time()
+    conn = get_pg_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TEMP TABLE load_batch ON COMMIT DROP AS
+                SELECT {', '.join(BRONZE_COLUMNS)} FROM bronze.{target_table} WITH NO DATA
+            """)
+
+            records = read_landing_object(s3_client, bucket, key)
+            record_count = copy_rows(cur, "load_batch", BRONZE_COLUMNS, _copy_lines(records, key))
+
+            cur.execute(f"""
+                INSERT INTO bronze.{target_table} ({', '.join(BRONZE_COLUMNS)})
+                SELECT {', '.join(BRONZE_COLUMNS)} FROM load_batch
+                ON CONFLICT (kafka_topic, kafka_partition, kafka_offset) DO NOTHING
+            """)
+            rows_inserted = cur.rowcount
+
+            cur.execute("""
+                INSERT INTO bronze.load_manifest
+                    (bucket, object_key, etag, target_table, record_count, rows_inserted, load_seconds)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (bucket, object_key) DO UPDATE SET
+                    etag = EXCLUDED.etag,
+                    target_table = EXCLUDED.target_table,
+                    record_count = EXCLUDED.record_count,
+                    rows_inserted = EXCLUDED.rows_inserted,
+                    load_seconds = EXCLUDED.load_seconds,
+                    loaded_at = NOW()
+            """, (bucket, key, etag, target_table, record_count, rows_inserted, round(time.time() - start_time, 3)))
 
         conn.commit()
-        print(f"✓ Loaded {cur.rowcount} new records (duplicates skipped)")
+        return record_count, rows_inserted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
 
 def main():
     """Main ETL process."""
     bucket = os.getenv("MINIO_RAW_BUCKET", "cord-raw")
     prefix = os.getenv("BRONZE_INPUT_PREFIX", "product/raw")
+    target_table = os.getenv("BRONZE_TARGET_TABLE", "product_cdc")
+    workers = int(os.getenv("BRONZE_LOAD_WORKERS", "4"))
 
-    print(f"Starting bronze load from s3://{bucket}/{prefix}/")
+    print(f"Starting bronze load from s3://{bucket}/{prefix}/ into bronze.{target_table}")
 
     # Initialize clients
     s3 = get_s3_client()
@@ -154,29 +229,50 @@ def main():
         # Create table
         create_bronze_table(conn)
 
-        # List all JSONL files
-        result = s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
-        files = [obj["Key"] for obj in result.get("Contents", []) if obj["Key"].endswith(".jsonl")]
+        # List landing files not yet in the manifest
+        files = list_new_objects(s3, conn, bucket, prefix)
 
         if not files:
-            print(f"No JSONL files found in s3://{bucket}/{prefix}/")
+            print(f"No new landing files in s3://{bucket}/{prefix}/")
             return
 
-        print(f"Found {len(files)} file(s) to process")
+        print(f"Found {len(files)} new file(s) to process with {workers} worker(s)")
 
+        start_time = time.time()
         total_records = 0
-        for file_key in files:
-            records = read_jsonl_from_minio(s3, bucket, file_key)
-            load_to_postgres(conn, records, file_key)
-            total_records += len(records)
-
-        print(f"\n✓ Bronze load complete: {total_records} total records processed")
+        total_inserted = 0
+        failed = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(load_object, s3, bucket, key, etag, target_table): key
+                for key, etag in files
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    record_count, rows_inserted = future.result()
+                except Exception as error:
+                    failed += 1
+                    print(f"✗ Failed to load s3://{bucket}/{key}: {error}")
+                    continue
+                total_records += record_count
+                total_inserted += rows_inserted
+                print(f"✓ {key}: {record_count} records, {rows_inserted} new")
+
+        elapsed = max(time.time() - start_time, 1e-9)
+        print(
+            f"\n✓ Bronze load complete: {total_records} records from {len(files) - failed} file(s), "
+            f"{total_inserted} new, {total_records / elapsed:,.0f} records/s"
+        )
 
         # Show summary
         with conn.cursor() as cur:
-            cur.execute("SELECT COUNT(*) FROM bronze.product_cdc")
+            cur.execute(f"SELECT COUNT(*) FROM bronze.{target_table}")
             count = cur.fetchone()[0]
-            print(f"✓ bronze.product_cdc now contains {count} records")
+            print(f"✓ bronze.{target_table} now contains {count} records")
+
+        if failed:
+            raise RuntimeError(f"{failed} file(s) failed to load; they will be retried on the next run")
 
     finally:
         conn.close()
@@ -6,6 +6,9 @@ Requires the following environment variables:
 - MINIO_ENDPOINT (default: http://localhost:9000)
 - MINIO_ACCESS_KEY / MINIO_SECRET_KEY (default: minioadmin)
 - MINIO_RAW_BUCKET (default: cord-raw)
+- BRONZE_INPUT_PREFIX (default: product/raw, the landing writer prefix)
+- BRONZE_INPUT_FORMAT (default: LANDING_FORMAT or parquet; parquet reads landing_writer
+  output with its fixed schema, jsonl / jsonl.gz read the JSON landing formats)
 - BRONZE_OUTPUT_PATH (default: /tmp/bronze/product_cdc)
 """
 
@@ -41,11 +44,22 @@ def configure_spark() -> SparkSession:
 
 def read_raw_batches(spark: SparkSession) -> DataFrame:
     bucket = os.getenv("MINIO_RAW_BUCKET", "cord-raw")
-    prefix = os.getenv("BRONZE_INPUT_PREFIX", "product/raw")
-    path = f"s3a://{bucket}/{prefix}/*.jsonl"
+    prefix = os.getenv("BRONZE_INPUT_PREFIX", "product/raw").rstrip("/")
+    input_format = os.getenv("BRONZE_INPUT_FORMAT", os.getenv("LANDING_FORMAT", "parquet"))
+
+    # The landing writer nests objects under {prefix}/topic=.../date=.../
+    path = f"s3a://{bucket}/{prefix}/"
+    reader = spark.read.option("recursiveFileLookup", "true")
+
+    if input_format == "parquet":
+        # The schema is stored in the files
+        print(f"Reading CDC Parquet from {path}")
+        df = reader.option("pathGlobFilter", "*.parquet").parquet(path)
+    else:
+        # Matches .jsonl and .jsonl.gz (decompressed by extension)
+        print(f"Reading CDC JSON from {path}")
+        df = reader.option("pathGlobFilter", "*.jsonl*").json(path)
 
-    print(f"Reading CDC data from {path}")
-    df = spark.read.json(path)
     return df.withColumn("input_file", input_file_name())
 
 
@@ -76,7 +90,7 @@ def main():
         df = read_raw_batches(spark)
 
         if df.rdd.isEmpty():
-            print("❌ No raw JSON batches found in MinIO")
+            print("❌ No raw CDC batches found in MinIO")
             return
 
         print(f"✅ Found CDC data, schema:")
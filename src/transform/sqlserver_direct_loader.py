@@ -2,16 +2,36 @@
 Direct SQL Server to PostgreSQL Bronze Loader
 Purpose: Bulk load products directly from SQL Server to Bronze layer, bypassing Kafka
 Date: 2025-10-19
+
+Default path streams every row into an UNLOGGED staging table with
+COPY FROM STDIN and merges it into bronze in one INSERT ... SELECT.
+Envelopes are built from a precomputed prefix/suffix around the row JSON.
+Use --insert for the original execute_batch path, --parallel=N to extract
+ID ranges over N SQL Server connections (sqlserver_parallel_extract).
+
+COPY loads key bronze rows by (topic, -1, ID) rather than synthetic offsets,
+so re-loading a product updates its row instead of appending a duplicate.
+--delta pulls only rows changed since the stored watermark (rowversion
+column when the table has one, otherwise [Updated]) as op "u" envelopes.
 """
 
 import pymssql
 import psycopg2
 from psycopg2.extras import execute_batch
 import json
-from datetime import datetime
+from datetime import date, datetime, time as time_of_day
+from decimal import Decimal
 from uuid import UUID
 import base64
 import sys
+import time
+
+from src.transform.copy_utils import copy_rows, copy_text_line
+from src.transform.sqlserver_parallel_extract import PRODUCT_COLUMNS, convert_batch, parallel_extract, select_list
+
+# kafka_partition used for direct loads; never produced by Kafka, so rows
+# keyed (topic, DIRECT_LOAD_PARTITION, ID) can't collide with Debezium events
+DIRECT_LOAD_PARTITION = -1
 
 # SQL Server connection details
 SQLSERVER_CONFIG = {
@@ -56,16 +76,26 @@ def create_bronze_table(pg_conn):
         ON bronze.product_cdc USING gin(cdc_payload);
     """)
 
+    # Delta watermark per source table (see fetch_changed_rows)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bronze.sqlserver_watermarks (
+            source_table VARCHAR(255) PRIMARY KEY,
+            watermark_column VARCHAR(255) NOT NULL,
+            watermark_kind VARCHAR(20) NOT NULL,
+            watermark_value VARCHAR(64) NOT NULL,
+            rows_loaded BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """)
+
     pg_conn.commit()
     cursor.close()
     print("✅ Bronze table ready")
 
 
-def fetch_products_from_sqlserver(batch_size=5000):
-    """Fetch all products from SQL Server in batches"""
-    print(f"📡 Connecting to SQL Server: {SQLSERVER_CONFIG['host']}")
-
-    conn = pymssql.connect(
+def sqlserver_connect():
+    """Open a pymssql connection to the source database"""
+    return pymssql.connect(
         server=SQLSERVER_CONFIG['host'],
         port=SQLSERVER_CONFIG['port'],
         user=SQLSERVER_CONFIG['user'],
@@ -73,6 +103,13 @@ def fetch_products_from_sqlserver(batch_size=5000):
         database=SQLSERVER_CONFIG['database']
     )
 
+
+def fetch_products_from_sqlserver(batch_size=5000):
+    """Fetch all products from SQL Server in batches"""
+    print(f"📡 Connecting to SQL Server: {SQLSERVER_CONFIG['host']}")
+
+    conn = sqlserver_connect()
+
     cursor = conn.cursor(as_dict=True)
 
     # Get total count first
@@ -81,20 +118,8 @@ def fetch_products_from_sqlserver(batch_size=5000):
     print(f"📊 Total products in SQL Server: {total_count:,}")
 
     # Fetch all products
-    query = """
-        SELECT
-            [ID], [Created], [Deleted], [Description], [HasAnalogue],
-            [HasImage], [IsForSale], [IsForWeb], [IsForZeroSale],
-            [MainOriginalNumber], [MeasureUnitID], [Name], [NetUID],
-            [OrderStandard], [PackingStandard], [Size], [UCGFEA],
-            [Updated], [VendorCode], [Volume], [Weight], [HasComponent],
-            [Image], [Top], [DescriptionPL], [DescriptionUA], [NamePL],
-            [NameUA], [SourceAmgID], [SourceFenixID], [SearchDescriptionPL],
-            [SearchNamePL], [NotesPL], [NotesUA], [SearchDescriptionUA],
-            [SearchNameUA], [SearchSize], [SearchVendorCode],
-            [SearchDescription], [SearchName], [SearchSynonymsPL],
-            [SearchSynonymsUA], [SynonymsPL], [SynonymsUA], [Standard],
-            [ParentAmgID], [ParentFenixID], [SourceAmgCode], [SourceFenixCode]
+    query = f"""
+        SELECT {select_list(PRODUCT_COLUMNS)}
         FROM dbo.Product
         ORDER BY ID
     """
@@ -139,6 +164,303 @@ def fetch_products_from_sqlserver(batch_size=5000):
     print(f"✅ Fetched all {total_fetched:,} products from SQL Server")
 
 
+def _json_default(value):
+    """JSON fallback for SQL Server types (same encodings as fetch_products_from_sqlserver)"""
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+    if isinstance(value, (date, time_of_day)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('utf-8')
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class EnvelopeTemplate:
+    """
+    Debezium envelope with everything but the row precomputed
+
+    The static schema/source/op parts are serialized once; each row only
+    costs one json.dumps of its own values:
+        envelope_json = prefix + row_json + suffix
+
+    op is "r" for snapshot reads and "u" for delta pulls.
+    """
+
+    _ROW_MARKER = "__ROW__"
+
+    def __init__(self, table="Product", schema="dbo", database="ConcordDb", server="cord", op="r"):
+        self.topic = f"{server}.{database}.{schema}.{table}"
+        ts_ms = int(datetime.utcnow().timestamp() * 1000)
+
+        envelope = {
+            "schema": {
+                "type": "struct",
+                "fields": [],
+                "optional": False,
+                "name": f"{self.topic}.Envelope"
+            },
+            "payload": {
+                "before": None,
+                "after": self._ROW_MARKER,
+                "source": {
+                    "version": "2.1.0.Final",
+                    "connector": "sqlserver",
+                    "name": server,
+                    "ts_ms": ts_ms,
+                    "snapshot": "true" if op == "r" else "false",
+                    "db": database,
+                    "schema": schema,
+                    "table": table,
+                    "change_lsn": None,
+                    "commit_lsn": "00001ed0:00004b2e:0001"
+                },
+                "op": op,
+                "ts_ms": ts_ms,
+                "transaction": None
+            }
+        }
+
+        self.prefix, self.suffix = json.dumps(envelope).split(json.dumps(self._ROW_MARKER))
+
+    def render(self, row):
+        return self.prefix + json.dumps(row, default=_json_default) + self.suffix
+
+
+def load_to_bronze_copy(pg_conn, batches, template=None, bronze_table="product_cdc",
+                        key_column="ID", commit=True):
+    """
+    Bulk load row batches into bronze via COPY and a single merge
+
+    All batches are streamed through one COPY into a session temp table (no
+    WAL, private to this connection so concurrent loads of the same table
+    cannot clobber each other), then merged into bronze.<bronze_table> in
+    one statement. Rows
+    are keyed (topic, DIRECT_LOAD_PARTITION, <key_column>): a product already
+    in bronze is updated only when its row image changed.
+
+    Args:
+        pg_conn: PostgreSQL connection
+        batches: Iterable of row-dict batches (e.g. fetch_products_from_sqlserver())
+        template: EnvelopeTemplate for the source table (defaults to dbo.Product)
+        bronze_table: Target table in the bronze schema
+        key_column: Source primary key, stored as kafka_offset
+        commit: Commit after the merge (False lets the caller add to the transaction)
+
+    Returns:
+        Tuple of (rows copied, rows inserted or changed)
+    """
+    template = template or EnvelopeTemplate()
+    staging_table = f"{bronze_table}_staging"
+    cursor = pg_conn.cursor()
+
+    cursor.execute(f"""
+        CREATE TEMP TABLE {staging_table} (
+            kafka_topic VARCHAR(255),
+            kafka_partition INT,
+            kafka_offset BIGINT,
+            cdc_payload JSONB NOT NULL
+        ) ON COMMIT DROP
+    """)
+
+    def lines():
+        for batch in batches:
+            for row in batch:
+                yield copy_text_line((template.topic, DIRECT_LOAD_PARTITION, row[key_column], template.render(row)))
+
+    start_time = time.time()
+    copied = copy_rows(
+        cursor,
+        staging_table,
+        ("kafka_topic", "kafka_partition", "kafka_offset", "cdc_payload"),
+        lines(),
+    )
+    print(f"  📥 Copied {copied:,} rows into {staging_table} in {time.time() - start_time:.1f}s")
+
+    cursor.execute(f"""
+        INSERT INTO bronze.{bronze_table} (kafka_topic, kafka_partition, kafka_offset, cdc_payload)
+        SELECT kafka_topic, kafka_partition, kafka_offset, cdc_payload
+        FROM {staging_table}
+        ON CONFLICT (kafka_topic, kafka_partition, kafka_offset) DO UPDATE
+        SET cdc_payload = EXCLUDED.cdc_payload,
+            ingested_at = NOW()
+        WHERE bronze.{bronze_table}.cdc_payload->'payload'->'after'
+              IS DISTINCT FROM EXCLUDED.cdc_payload->'payload'->'after'
+    """)
+    inserted = cursor.rowcount
+    # Dropped now rather than at commit, so a caller holding the transaction
+    # open (commit=False) can load the same table again
+    cursor.execute(f"DROP TABLE {staging_table}")
+
+    if commit:
+        pg_conn.commit()
+    cursor.close()
+
+    return copied, inserted
+
+
+class Watermark:
+    """
+    High-water mark for incremental pulls of one SQL Server table
+
+    kind is "rowversion" (compared as BIGINT, strictly greater) or "datetime"
+    on [Updated] (compared with >=, so rows sharing the boundary timestamp are
+    re-read; the bronze merge makes those no-ops). Rows that were never
+    updated have a NULL [Updated]; with a fallback_column ([Created]) they
+    are compared, and advance the watermark, by that column instead.
+    """
+
+    def __init__(self, source_table, column, kind, value=None, fallback_column=None):
+        self.source_table = source_table
+        self.column = column
+        self.kind = kind
+        self.value = value
+        self.fallback_column = fallback_column
+        self.rows_loaded = 0
+
+    def advance(self, value):
+        if value is not None and (self.value is None or value > self.value):
+            self.value = value
+
+    def serialize(self):
+        return str(self.value) if self.kind == "rowversion" else self.value.isoformat()
+
+    def expression(self):
+        """SQL Server expression compared with (and selected to advance) the watermark"""
+        if self.kind == "rowversion":
+            return f"CAST([{self.column}] AS BIGINT)"
+        if self.fallback_column:
+            return f"COALESCE([{self.column}], [{self.fallback_column}])"
+        return f"[{self.column}]"
+
+    def predicate(self):
+        """WHERE clause (and params) selecting rows changed since the watermark"""
+        if self.kind == "rowversion":
+            # Rows below MIN_ACTIVE_ROWVERSION() are committed; anything above may still roll in
+            upper = f"[{self.column}] < MIN_ACTIVE_ROWVERSION()"
+            if self.value is None:
+                return f"WHERE {upper}", ()
+            return f"WHERE {self.expression()} > %s AND {upper}", (self.value,)
+        if self.value is None:
+            return "", ()
+        return f"WHERE {self.expression()} >= %s", (self.value,)
+
+
+def detect_watermark(ss_conn, schema="dbo", table="Product"):
+    """Pick the table's rowversion column if it has one, otherwise [Updated] (falling back to [Created])"""
+    cursor = ss_conn.cursor()
+    cursor.execute("""
+        SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+    """, (schema, table))
+    columns = dict(cursor.fetchall())
+    cursor.close()
+    rowversion = next((name for name, data_type in columns.items() if data_type in ('timestamp', 'rowversion')), None)
+    if rowversion:
+        return Watermark(f"{schema}.{table}", rowversion, "rowversion")
+    return Watermark(f"{schema}.{table}", "Updated", "datetime",
+                     fallback_column="Created" if "Created" in columns else None)
+
+
+def load_watermark(pg_conn, watermark):
+    """Fill watermark.value from bronze.sqlserver_watermarks (None on first run)"""
+    cursor = pg_conn.cursor()
+    cursor.execute("""
+        SELECT watermark_column, watermark_kind, watermark_value
+        FROM bronze.sqlserver_watermarks WHERE source_table = %s
+    """, (watermark.source_table,))
+    row = cursor.fetchone()
+    cursor.close()
+
+    # A watermark recorded against another column (e.g. before a rowversion was added) is ignored
+    if row and (row[0], row[1]) == (watermark.column, watermark.kind):
+        value = row[2]
+        watermark.value = int(value) if watermark.kind == "rowversion" else datetime.fromisoformat(value)
+    return watermark
+
+
+def save_watermark(cursor, watermark):
+    cursor.execute("""
+        INSERT INTO bronze.sqlserver_watermarks
+            (source_table, watermark_column, watermark_kind, watermark_value, rows_loaded)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (source_table) DO UPDATE SET
+            watermark_column = EXCLUDED.watermark_column,
+            watermark_kind = EXCLUDED.watermark_kind,
+            watermark_value = EXCLUDED.watermark_value,
+            rows_loaded = bronze.sqlserver_watermarks.rows_loaded + EXCLUDED.rows_loaded,
+            updated_at = NOW()
+    """, (watermark.source_table, watermark.column, watermark.kind,
+          watermark.serialize(), watermark.rows_loaded))
+
+
+def fetch_changed_rows(ss_conn, watermark, columns=PRODUCT_COLUMNS, batch_size=5000):
+    """
+    Yield converted batches of rows changed since the watermark
+
+    The watermark is advanced in memory as rows are read; persist it with
+    save_watermark only once the rows are in bronze. Hard deletes are not
+    visible to a watermark pull (soft deletes via [Deleted] are).
+    """
+    where, params = watermark.predicate()
+    # The compared expression is selected too, so rows with a NULL [Updated] still advance it
+    select = select_list(columns) + f", {watermark.expression()}"
+
+    cursor = ss_conn.cursor()
+    source = ".".join(f"[{part}]" for part in watermark.source_table.split("."))
+    cursor.execute(f"SELECT {select} FROM {source} {where}", params)
+
+    watermark_index = len(columns)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        watermark.advance(max((row[watermark_index] for row in rows if row[watermark_index] is not None), default=None))
+        watermark.rows_loaded += len(rows)
+        yield convert_batch(columns, [row[:len(columns)] for row in rows])
+
+    cursor.close()
+
+
+def run_delta(pg_conn, schema="dbo", table="Product"):
+    """
+    Incremental load: pull rows changed since the last run into bronze
+
+    The first run (no watermark yet) reads the whole table as a snapshot.
+    Bronze rows and the new watermark commit in one transaction.
+
+    Returns:
+        Tuple of (rows pulled, rows inserted or changed)
+    """
+    ss_conn = sqlserver_connect()
+    try:
+        watermark = load_watermark(pg_conn, detect_watermark(ss_conn, schema, table))
+        first_run = watermark.value is None
+        print(
+            f"🔖 Watermark on [{watermark.column}] ({watermark.kind}): "
+            f"{'none, loading full snapshot' if first_run else watermark.serialize()}"
+        )
+
+        template = EnvelopeTemplate(table=table, schema=schema, op="r" if first_run else "u")
+        copied, changed = load_to_bronze_copy(
+            pg_conn, fetch_changed_rows(ss_conn, watermark), template=template, commit=False
+        )
+
+        if watermark.value is not None:
+            cursor = pg_conn.cursor()
+            save_watermark(cursor, watermark)
+            cursor.close()
+        pg_conn.commit()
+
+        print(f"🔖 New watermark: {watermark.serialize() if watermark.value is not None else 'unchanged'}")
+        return copied, changed
+    finally:
+        ss_conn.close()
+
+
 def load_to_bronze(pg_conn, products, batch_offset):
     """Load products to Bronze layer as CDC events"""
     cursor = pg_conn.cursor()
@@ -223,19 +545,36 @@ def main():
     total_loaded = 0
     batch_number = 0
     global_offset = 0
+    use_copy = "--insert" not in sys.argv
+    delta = "--delta" in sys.argv
+    parallel = next((int(arg.split("=", 1)[1]) for arg in sys.argv if arg.startswith("--parallel=")), 0)
 
-    print("🔄 Starting data transfer...")
+    print(f"🔄 Starting data transfer ({'delta' if delta else 'COPY + merge' if use_copy else 'batched INSERT'})...")
     print()
 
     try:
-        for batch in fetch_products_from_sqlserver(batch_size=5000):
-            batch_number += 1
-            loaded = load_to_bronze(pg_conn, batch, global_offset)
-            total_loaded += loaded
-            global_offset += len(batch)
-
-            if batch_number % 10 == 0:
-                print(f"  ✅ Batch {batch_number}: Loaded {total_loaded:,} products")
+        if delta:
+            start_time = time.time()
+            total_loaded, inserted = run_delta(pg_conn)
+            print(f"  ✅ Delta: {total_loaded:,} changed rows, {inserted:,} written in {time.time() - start_time:.1f}s")
+        elif use_copy:
+            start_time = time.time()
+            if parallel:
+                print(f"📡 Extracting from SQL Server {SQLSERVER_CONFIG['host']} over {parallel} connections")
+                batches = parallel_extract(sqlserver_connect, workers=parallel, batch_size=5000)
+            else:
+                batches = fetch_products_from_sqlserver(batch_size=5000)
+            total_loaded, inserted = load_to_bronze_copy(pg_conn, batches)
+            print(f"  ✅ Merged {inserted:,} new or changed CDC events in {time.time() - start_time:.1f}s")
+        else:
+            for batch in fetch_products_from_sqlserver(batch_size=5000):
+                batch_number += 1
+                loaded = load_to_bronze(pg_conn, batch, global_offset)
+                total_loaded += loaded
+                global_offset += len(batch)
+
+                if batch_number % 10 == 0:
+                    print(f"  ✅ Batch {batch_number}: Loaded {total_loaded:,} products")
 
         print()
         print("=" * 80)
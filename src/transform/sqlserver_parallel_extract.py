@@ -0,0 +1,310 @@
+"""
+Range-partitioned parallel extraction from SQL Server
+
+Splits the ID space of a table into ranges using MIN/MAX/COUNT, pulls the
+ranges concurrently over N connections and hands converted batches to the
+bronze writer through a bounded queue (so extraction never runs more than
+`queue_size` batches ahead of the load).
+
+Connections come from a factory, so any DB-API driver works; the loader
+uses pymssql, tests use sqlite3. Rows are converted once per batch:
+datetimes -> epoch ms (Debezium format), dates/times -> ISO strings,
+UUIDs -> str, bytes -> base64.
+
+Usage:
+    from src.transform.sqlserver_parallel_extract import parallel_extract
+    for batch in parallel_extract(connect, workers=4):
+        ...
+"""
+
+import base64
+import math
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, time as time_of_day
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+PRODUCT_COLUMNS = (
+    "ID", "Created", "Deleted", "Description", "HasAnalogue",
+    "HasImage", "IsForSale", "IsForWeb", "IsForZeroSale",
+    "MainOriginalNumber", "MeasureUnitID", "Name", "NetUID",
+    "OrderStandard", "PackingStandard", "Size", "UCGFEA",
+    "Updated", "VendorCode", "Volume", "Weight", "HasComponent",
+    "Image", "Top", "DescriptionPL", "DescriptionUA", "NamePL",
+    "NameUA", "SourceAmgID", "SourceFenixID", "SearchDescriptionPL",
+    "SearchNamePL", "NotesPL", "NotesUA", "SearchDescriptionUA",
+    "SearchNameUA", "SearchSize", "SearchVendorCode",
+    "SearchDescription", "SearchName", "SearchSynonymsPL",
+    "SearchSynonymsUA", "SynonymsPL", "SynonymsUA", "Standard",
+    "ParentAmgID", "ParentFenixID", "SourceAmgCode", "SourceFenixCode",
+)
+
+
+def select_list(columns: Sequence[str]) -> str:
+    """Bracket-quoted column list for a SQL Server SELECT"""
+    return ", ".join(f"[{column}]" for column in columns)
+
+
+def _datetime_ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+def _bytes_b64(value: bytes) -> str:
+    return base64.b64encode(value).decode('utf-8')
+
+
+_CONVERTERS: Dict[type, Callable[[Any], Any]] = {
+    datetime: _datetime_ms,
+    date: date.isoformat,
+    time_of_day: time_of_day.isoformat,
+    UUID: str,
+    bytes: _bytes_b64,
+    Decimal: float,
+}
+
+
+def convert_batch(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+    """
+    Convert a fetched batch of tuples into JSON-ready row dicts
+
+    The converter for each column is picked once per batch from its first
+    non-NULL value; columns that need no conversion are copied as-is.
+    """
+    converters: List[Tuple[int, Callable[[Any], Any]]] = []
+    for index in range(len(columns)):
+        for row in rows:
+            value = row[index]
+            if value is not None:
+                converter = _CONVERTERS.get(type(value))
+                if converter is not None:
+                    converters.append((index, converter))
+                break
+
+    batch = []
+    for row in rows:
+        values = list(row)
+        for index, converter in converters:
+            if values[index] is not None:
+                values[index] = converter(values[index])
+        batch.append(dict(zip(columns, values)))
+    return batch
+
+
+def plan_ranges(min_id: int, max_id: int, total_rows: int, workers: int,
+                rows_per_range: int = 50000) -> List[Tuple[int, int]]:
+    """
+    Split [min_id, max_id] into inclusive ID ranges
+
+    Uses at least one range per worker and enough ranges that each holds
+    roughly `rows_per_range` rows (assuming uniform density), so a worker
+    that draws a sparse range picks up the next one instead of idling.
+    """
+    if total_rows <= 0 or min_id is None or max_id is None:
+        return []
+
+    count = max(workers, math.ceil(total_rows / rows_per_range))
+    span = max_id - min_id + 1
+    step = max(1, math.ceil(span / count))
+
+    ranges = []
+    start = min_id
+    while start <= max_id:
+        end = min(start + step - 1, max_id)
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+
+@dataclass
+class WorkerStats:
+    """Per-worker extraction progress"""
+    worker_id: int
+    rows: int = 0
+    batches: int = 0
+    ranges: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+class _WorkerFailed:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_WORKER_DONE = object()
+
+
+class ParallelExtractor:
+    """
+    Pull a table over N connections by ID range
+
+    Args:
+        connect: Zero-argument factory returning a DB-API connection
+        table: Source table (e.g. "dbo.Product")
+        columns: Columns to select; the first must be the integer key
+        workers: Number of concurrent connections
+        batch_size: Rows per fetchmany / per yielded batch
+        queue_size: Max batches buffered ahead of the consumer
+        placeholder: Driver parameter marker ("%s" for pymssql, "?" for sqlite3)
+        progress_every: Print progress every N rows in total (0 disables)
+    """
+
+    def __init__(self, connect: Callable[[], Any], table: str = "dbo.Product",
+                 columns: Sequence[str] = PRODUCT_COLUMNS, workers: int = 4,
+                 batch_size: int = 5000, queue_size: int = 8, placeholder: str = "%s",
+                 rows_per_range: int = 50000, progress_every: int = 50000):
+        self.connect = connect
+        self.table = table
+        self.columns = tuple(columns)
+        self.key = self.columns[0]
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.placeholder = placeholder
+        self.rows_per_range = rows_per_range
+        self.progress_every = progress_every
+
+        self.stats = [WorkerStats(worker_id) for worker_id in range(self.workers)]
+        self.total_rows = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def table_stats(self) -> Tuple[Optional[int], Optional[int], int]:
+        """MIN/MAX of the key column and row count"""
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT MIN([{self.key}]), MAX([{self.key}]), COUNT(*) FROM {self.table}"
+            )
+            min_id, max_id, count = cursor.fetchone()
+            cursor.close()
+            return min_id, max_id, count
+        finally:
+            conn.close()
+
+    def _put(self, output: "queue.Queue", item: Any) -> bool:
+        # Blocks while the queue is full, but gives up once the consumer stops
+        while not self._stop.is_set():
+            try:
+                output.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _progress(self, rows: int) -> None:
+        with self._lock:
+            before = self.total_rows
+            self.total_rows += rows
+            if self.progress_every and before // self.progress_every != self.total_rows // self.progress_every:
+                rates = ", ".join(
+                    f"w{s.worker_id}={s.rows_per_second:,.0f}/s" for s in self.stats
+                )
+                print(f"  📥 Extracted {self.total_rows:,} rows ({rates})")
+
+    def _run_worker(self, stats: WorkerStats, ranges: "queue.Queue", output: "queue.Queue") -> None:
+        query = (
+            f"SELECT {select_list(self.columns)} FROM {self.table} "
+            f"WHERE [{self.key}] BETWEEN {self.placeholder} AND {self.placeholder} "
+            f"ORDER BY [{self.key}]"
+        )
+        start_time = time.time()
+        try:
+            conn = self.connect()
+            try:
+                cursor = conn.cursor()
+                while not self._stop.is_set():
+                    try:
+                        low, high = ranges.get_nowait()
+                    except queue.Empty:
+                        break
+
+                    cursor.execute(query, (low, high))
+                    while True:
+                        rows = cursor.fetchmany(self.batch_size)
+                        if not rows:
+                            break
+                        batch = convert_batch(self.columns, rows)
+                        stats.rows += len(batch)
+                        stats.batches += 1
+                        stats.seconds = time.time() - start_time
+                        if not self._put(output, batch):
+                            return
+                        self._progress(len(batch))
+                    stats.ranges += 1
+                cursor.close()
+            finally:
+                conn.close()
+        except BaseException as error:
+            self._put(output, _WorkerFailed(error))
+        finally:
+            stats.seconds = time.time() - start_time
+            self._put(output, _WORKER_DONE)
+
+    def batches(self) -> Iterator[List[Dict[str, Any]]]:
+        """Yield converted batches as workers produce them (not in ID order)"""
+        min_id, max_id, total = self.table_stats()
+        planned = plan_ranges(min_id, max_id, total, self.workers, self.rows_per_range)
+        print(
+            f"📊 {self.table}: {total:,} rows, IDs {min_id}..{max_id}, "
+            f"{len(planned)} range(s) over {self.workers} connection(s)"
+        )
+        if not planned:
+            return
+
+        ranges: "queue.Queue" = queue.Queue()
+        for id_range in planned:
+            ranges.put(id_range)
+        output: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+
+        self._stop.clear()
+        threads = [
+            threading.Thread(
+                target=self._run_worker,
+                args=(stats, ranges, output),
+                name=f"sqlserver-extract-{stats.worker_id}",
+                daemon=True,
+            )
+            for stats in self.stats
+        ]
+        for thread in threads:
+            thread.start()
+
+        running = len(threads)
+        try:
+            while running:
+                item = output.get()
+                if item is _WORKER_DONE:
+                    running -= 1
+                elif isinstance(item, _WorkerFailed):
+                    raise item.error
+                else:
+                    yield item
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.print_summary()
+
+    def print_summary(self) -> None:
+        for stats in self.stats:
+            print(
+                f"  ✅ Worker {stats.worker_id}: {stats.rows:,} rows in {stats.ranges} range(s), "
+                f"{stats.seconds:.1f}s ({stats.rows_per_second:,.0f} rows/s)"
+            )
+        print(f"✅ Extracted {self.total_rows:,} rows from {self.table}")
+
+
+def parallel_extract(connect: Callable[[], Any], workers: int = 4, batch_size: int = 5000,
+                     **kwargs) -> Iterator[List[Dict[str, Any]]]:
+    """Convenience wrapper: ParallelExtractor(...).batches()"""
+    return ParallelExtractor(connect, workers=workers, batch_size=batch_size, **kwargs).batches()
@@ -0,0 +1,380 @@
+"""
+Metadata-driven SQL Server -> PostgreSQL bronze sync
+Purpose: Sync any list of SQL Server tables into bronze.<table>_cdc without a hand-written loader per table
+Date: 2025-10-19
+
+Everything per table comes from INFORMATION_SCHEMA and partition stats:
+columns and types, integer primary key, rowversion/[Updated] watermark
+column, row count and average row size. From that the engine:
+
+1. Creates bronze.<snake_table>_cdc (same layout as the Kafka bronze router)
+2. Skips extraction for empty tables (their bronze table and model still exist,
+   so dbt compiles and picks rows up once the table fills)
+3. Sizes fetch batches per table from the average row size
+4. Pulls rows changed since the table's watermark (full table on first run)
+   and merges them with the sqlserver_direct_loader COPY path, keyed by the
+   primary key so re-runs never duplicate rows
+5. Syncs several tables at once, each worker on its own connections
+6. Optionally writes dbt staging models + schema.yml using the generator in
+   scripts/generate_product_staging_models.py
+
+Usage (from the repo root):
+    python -m src.transform.sqlserver_table_sync                       # client/sales tables
+    python -m src.transform.sqlserver_table_sync --group=all-client-sales --workers=6
+    python -m src.transform.sqlserver_table_sync --tables=dbo.Client,dbo.RetailClient --models
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import psycopg2
+
+from scripts.generate_product_staging_models import (
+    generate_dbt_model,
+    generate_schema_yml,
+    map_sql_type_to_pg,
+    table_snake_case,
+)
+from src.transform.sqlserver_direct_loader import (
+    POSTGRES_CONFIG,
+    EnvelopeTemplate,
+    Watermark,
+    fetch_changed_rows,
+    load_to_bronze_copy,
+    load_watermark,
+    save_watermark,
+    sqlserver_connect,
+)
+from src.transform.sqlserver_parallel_extract import convert_batch, select_list
+
+# Phases 1-4 of CLIENT_SALES_SYNC_PLAN.md plus the (currently empty) core sales/order tables
+CLIENT_SALES_TABLES = [
+    'Client', 'RetailClient', 'OrganizationClient', 'ClientBankDetails', 'ClientAgreement',
+    'SaleInvoiceDocument', 'SaleInvoiceNumber',
+    'ClientType', 'ClientTypeRole', 'SaleBaseShiftStatus', 'PerfectClient',
+    'ClientBankDetailAccountNumber', 'ClientBankDetailIbanNo', 'ClientInRole',
+    'OrganizationClientAgreement', 'ClientSubClient',
+    'SupplyOrder', 'SupplyOrderItem', 'SupplyOrderPaymentDeliveryProtocolKey',
+    'SupplyOrderDeliveryDocument', 'SupplyOrderNumber',
+    'ClientTypeTranslation', 'ClientTypeRoleTranslation',
+    'PerfectClientTranslation', 'PerfectClientValueTranslation',
+    'Sale', 'SaleReturn', 'SaleReturnItem', 'Order', 'OrderItem',
+]
+
+# Same name patterns as query_client_sales_tables.py (101 tables)
+CLIENT_SALES_PATTERNS = ['%Client%', '%Customer%', '%Sale%', '%Order%', '%Invoice%', '%Cart%', '%Buyer%', '%Purchase%']
+
+ROWVERSION_TYPES = ('timestamp', 'rowversion')
+INTEGER_TYPES = ('bigint', 'int', 'smallint', 'tinyint')
+
+# Per-table fetch sizing: aim for ~TARGET_BATCH_BYTES per batch
+TARGET_BATCH_BYTES = 8 * 1024 * 1024
+MIN_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 50000
+DEFAULT_BATCH_SIZE = 5000
+
+DBT_OUTPUT_DIR = Path(__file__).resolve().parents[2] / "dbt" / "models" / "staging" / "client_sales"
+
+
+@dataclass
+class TableSpec:
+    """Everything the engine needs to know about one source table"""
+    schema: str
+    table: str
+    columns: List[Dict] = field(default_factory=list)
+    key_column: Optional[str] = None
+    rowversion_column: Optional[str] = None
+    row_count: int = 0
+    avg_row_bytes: Optional[float] = None
+
+    @property
+    def source_table(self) -> str:
+        return f"{self.schema}.{self.table}"
+
+    @property
+    def model_name(self) -> str:
+        return table_snake_case(self.table)
+
+    @property
+    def bronze_table(self) -> str:
+        return f"{self.model_name}_cdc"
+
+    @property
+    def column_names(self) -> List[str]:
+        # rowversion is binary and only used as the watermark
+        return [c['name'] for c in self.columns if c['type'] not in ROWVERSION_TYPES]
+
+    @property
+    def batch_size(self) -> int:
+        if not self.avg_row_bytes:
+            return DEFAULT_BATCH_SIZE
+        return int(min(MAX_BATCH_SIZE, max(MIN_BATCH_SIZE, TARGET_BATCH_BYTES / self.avg_row_bytes)))
+
+    def watermark(self) -> Optional[Watermark]:
+        if self.rowversion_column:
+            return Watermark(self.source_table, self.rowversion_column, "rowversion")
+        if 'Updated' in self.column_names:
+            fallback = "Created" if 'Created' in self.column_names else None
+            return Watermark(self.source_table, "Updated", "datetime", fallback_column=fallback)
+        return None
+
+
+def list_tables(ss_conn, patterns: Sequence[str], schema: str = "dbo") -> List[str]:
+    """Base tables whose name matches any LIKE pattern"""
+    cursor = ss_conn.cursor()
+    cursor.execute(f"""
+        SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_TYPE = 'BASE TABLE' AND TABLE_SCHEMA = %s
+          AND ({' OR '.join(['TABLE_NAME LIKE %s'] * len(patterns))})
+        ORDER BY TABLE_NAME
+    """, (schema, *patterns))
+    tables = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return tables
+
+
+def describe_tables(ss_conn, tables: Sequence[str], schema: str = "dbo") -> List[TableSpec]:
+    """Build TableSpecs from INFORMATION_SCHEMA and partition stats (one round trip per catalog view)"""
+    specs = {table: TableSpec(schema, table) for table in tables}
+    if not specs:
+        return []
+    placeholders = ", ".join(["%s"] * len(specs))
+    cursor = ss_conn.cursor()
+
+    cursor.execute(f"""
+        SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, IS_NULLABLE
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({placeholders})
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """, (schema, *specs))
+    for table, column, data_type, nullable in cursor.fetchall():
+        spec = specs[table]
+        spec.columns.append({
+            'name': column,
+            'type': data_type,
+            'pg_type': map_sql_type_to_pg(data_type),
+            'nullable': nullable == 'YES',
+        })
+        if data_type in ROWVERSION_TYPES:
+            spec.rowversion_column = column
+
+    # Single-column integer primary keys become the stable bronze key
+    cursor.execute(f"""
+        SELECT k.TABLE_NAME, MIN(k.COLUMN_NAME), COUNT(*)
+        FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS t
+        JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE k
+          ON k.CONSTRAINT_NAME = t.CONSTRAINT_NAME AND k.TABLE_SCHEMA = t.TABLE_SCHEMA
+        WHERE t.CONSTRAINT_TYPE = 'PRIMARY KEY' AND t.TABLE_SCHEMA = %s AND k.TABLE_NAME IN ({placeholders})
+        GROUP BY k.TABLE_NAME
+    """, (schema, *specs))
+    for table, column, key_columns in cursor.fetchall():
+        spec = specs[table]
+        types = {c['name']: c['type'] for c in spec.columns}
+        if key_columns == 1 and types.get(column) in INTEGER_TYPES:
+            spec.key_column = column
+
+    # Row counts and sizes from partition stats (no table scans)
+    cursor.execute(f"""
+        SELECT t.name, SUM(s.row_count), SUM(s.used_page_count) * 8192
+        FROM sys.dm_db_partition_stats s
+        JOIN sys.tables t ON t.object_id = s.object_id
+        WHERE SCHEMA_NAME(t.schema_id) = %s AND t.name IN ({placeholders}) AND s.index_id IN (0, 1)
+        GROUP BY t.name
+    """, (schema, *specs))
+    for table, row_count, used_bytes in cursor.fetchall():
+        spec = specs[table]
+        spec.row_count = int(row_count or 0)
+        spec.avg_row_bytes = used_bytes / row_count if row_count else None
+
+    cursor.close()
+
+    missing = [table for table, spec in specs.items() if not spec.columns]
+    for table in missing:
+        print(f"⚠️  {schema}.{table} not found in SQL Server")
+    return [spec for spec in specs.values() if spec.columns]
+
+
+def create_bronze_table(pg_conn, spec: TableSpec):
+    """bronze.<table>_cdc with the Kafka bronze router's layout"""
+    cursor = pg_conn.cursor()
+    cursor.execute("CREATE SCHEMA IF NOT EXISTS bronze")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS bronze.{spec.bronze_table} (
+            id BIGSERIAL PRIMARY KEY,
+            kafka_topic VARCHAR(255),
+            kafka_partition INT,
+            kafka_offset BIGINT,
+            kafka_timestamp BIGINT,
+            kafka_key JSONB,
+            cdc_payload JSONB,
+            ingested_at TIMESTAMP DEFAULT NOW(),
+            batch_file VARCHAR(500),
+            UNIQUE(kafka_topic, kafka_partition, kafka_offset)
+        )
+    """)
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{spec.bronze_table}_ingested ON bronze.{spec.bronze_table}(ingested_at)"
+    )
+    pg_conn.commit()
+    cursor.close()
+
+
+def _fetch_all_rows(ss_conn, spec: TableSpec):
+    """Full-table pull for tables without a watermark column"""
+    cursor = ss_conn.cursor()
+    cursor.execute(f"SELECT {select_list(spec.column_names)} FROM [{spec.schema}].[{spec.table}]")
+    while True:
+        rows = cursor.fetchmany(spec.batch_size)
+        if not rows:
+            break
+        yield convert_batch(spec.column_names, rows)
+    cursor.close()
+
+
+def sync_table(spec: TableSpec) -> Dict:
+    """Sync one table on its own SQL Server and PostgreSQL connections"""
+    start_time = time.time()
+    result = {'table': spec.source_table, 'rows': 0, 'written': 0, 'status': 'ok'}
+
+    pg_conn = psycopg2.connect(**POSTGRES_CONFIG)
+    try:
+        create_bronze_table(pg_conn, spec)
+
+        if spec.key_column is None:
+            result['status'] = 'skipped: no single-column integer primary key'
+            return result
+        if spec.row_count == 0:
+            result['status'] = 'skipped: empty'
+            return result
+
+        ss_conn = sqlserver_connect()
+        try:
+            watermark = spec.watermark()
+            if watermark is not None:
+                load_watermark(pg_conn, watermark)
+                first_run = watermark.value is None
+                batches = fetch_changed_rows(ss_conn, watermark, spec.column_names, spec.batch_size)
+            else:
+                first_run = True
+                batches = _fetch_all_rows(ss_conn, spec)
+
+            template = EnvelopeTemplate(table=spec.table, schema=spec.schema, op="r" if first_run else "u")
+            result['rows'], result['written'] = load_to_bronze_copy(
+                pg_conn, batches, template=template, bronze_table=spec.bronze_table,
+                key_column=spec.key_column, commit=False,
+            )
+
+            if watermark is not None and watermark.value is not None:
+                cursor = pg_conn.cursor()
+                save_watermark(cursor, watermark)
+                cursor.close()
+            pg_conn.commit()
+        finally:
+            ss_conn.close()
+    except Exception as e:
+        pg_conn.rollback()
+        result['status'] = f'failed: {e}'
+    finally:
+        pg_conn.close()
+        result['seconds'] = time.time() - start_time
+
+    return result
+
+
+def write_staging_models(specs: Sequence[TableSpec], output_dir: Path = DBT_OUTPUT_DIR):
+    """Generate stg_<table>.sql + schema.yml for synced tables"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    table_configs = []
+    for spec in specs:
+        if spec.key_column is None:
+            continue
+        columns = [c for c in spec.columns if c['type'] not in ROWVERSION_TYPES]
+        model_sql = generate_dbt_model(
+            spec.table,
+            columns,
+            key_column=spec.key_column,
+            soft_delete='Deleted' in spec.column_names,
+            epoch_ms_datetimes=True,
+        )
+        (output_dir / f"stg_{spec.model_name}.sql").write_text(model_sql, encoding='utf-8')
+        table_configs.append({
+            'table_name': spec.table,
+            'model_name': spec.model_name,
+            'column_count': len(columns),
+        })
+
+    (output_dir / "schema.yml").write_text(generate_schema_yml(table_configs), encoding='utf-8')
+    print(f"✅ Generated {len(table_configs)} staging models in {output_dir}")
+
+
+def _arg(name: str, default: Optional[str] = None) -> Optional[str]:
+    prefix = f"--{name}="
+    return next((arg[len(prefix):] for arg in sys.argv if arg.startswith(prefix)), default)
+
+
+def main():
+    """Main execution function"""
+    print("=" * 80)
+    print("🚀 SQL Server → PostgreSQL Bronze Table Sync")
+    print("=" * 80)
+    print()
+
+    workers = int(_arg("workers", os.getenv("TABLE_SYNC_WORKERS", "4")))
+    group = _arg("group", "client-sales")
+    tables_arg = _arg("tables")
+
+    ss_conn = sqlserver_connect()
+    try:
+        if tables_arg:
+            tables = [name.split(".", 1)[-1] for name in tables_arg.split(",") if name]
+        elif group == "all-client-sales":
+            tables = list_tables(ss_conn, CLIENT_SALES_PATTERNS)
+        else:
+            tables = CLIENT_SALES_TABLES
+        specs = describe_tables(ss_conn, tables)
+    finally:
+        ss_conn.close()
+
+    print(f"📊 {len(specs)} table(s), {sum(s.row_count for s in specs):,} rows, {workers} worker(s)")
+    print()
+
+    if "--models" in sys.argv:
+        write_staging_models(specs)
+        print()
+
+    # Largest tables first so one big table doesn't start last
+    specs = sorted(specs, key=lambda s: s.row_count, reverse=True)
+    start_time = time.time()
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(sync_table, spec) for spec in specs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            icon = "✅" if result['status'] == 'ok' else "⏭️ " if result['status'].startswith('skipped') else "❌"
+            print(
+                f"  {icon} {result['table']:<50} {result['rows']:>9,} rows "
+                f"{result['written']:>9,} written {result['seconds']:6.1f}s  {result['status']}"
+            )
+
+    failed = [r for r in results if r['status'].startswith('failed')]
+    print()
+    print("=" * 80)
+    print(
+        f"🎉 Synced {sum(r['rows'] for r in results):,} rows from {len(results) - len(failed)} table(s) "
+        f"in {time.time() - start_time:.1f}s"
+    )
+    print("=" * 80)
+
+    if failed:
+        print(f"❌ {len(failed)} table(s) failed; their watermarks were not advanced")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,18 @@
-from src.ml.embedding_pipeline_v2 import build_text
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from src.ml import embedding_index, embedding_pipeline_v2
+from src.ml.embedding_pipeline_v2 import (
+    PerformanceMetrics,
+    PipelineCheckpoint,
+    build_text,
+    dedupe_texts_by_length,
+    process_batch,
+    run_pipeline,
+)
 
 
 def test_build_text_includes_rich_product_context():
@@ -53,3 +67,144 @@ def test_build_text_ignores_empty_values():
 
     # Expect no double separators or stray prefixes
     assert result == ""
+
+
+def test_dedupe_texts_by_length_orders_unique_texts():
+    texts = ["bb", "a", "cccc", "a", "bb"]
+
+    unique_texts, positions = dedupe_texts_by_length(texts)
+
+    assert unique_texts == ["a", "bb", "cccc"]
+    assert [unique_texts[slot] for slot in positions] == texts
+
+
+def test_process_batch_encodes_each_text_once_and_restores_order():
+    class FakeVector(list):
+        def tolist(self):
+            return list(self)
+
+    class FakeModel:
+        def __init__(self):
+            self.calls = []
+
+        def encode(self, texts, **kwargs):
+            self.calls.append(list(texts))
+            return [FakeVector([float(len(text))]) for text in texts]
+
+    products = [
+        {"product_id": 1, "name": "Brake Pad Set", "supplier_name": "MG26"},
+        {"product_id": 2, "name": "Disc"},
+        {"product_id": 3, "name": "Brake Pad Set", "supplier_name": "MG26"},
+        {"product_id": 4, "name": None},
+    ]
+    model = FakeModel()
+    metrics = PerformanceMetrics()
+
+    product_ids, embeddings = process_batch(products, model, 32, metrics)
+
+    expected_texts = [build_text(p) for p in products[:3]]
+    assert len(model.calls) == 1
+    assert sorted(model.calls[0], key=len) == model.calls[0]
+    assert len(model.calls[0]) == 2
+    assert product_ids == [1, 2, 3]
+    assert embeddings == [[float(len(text))] for text in expected_texts]
+    assert metrics.products_processed == 3
+    assert metrics.texts_encoded == 2
+
+
+class _RecordingConnection:
+    def __init__(self):
+        self.statements = []
+        self.rowcount = 3
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        self.statements.append(str(query))
+
+
+def test_shadow_refresh_rejects_limit():
+    with pytest.raises(ValueError, match="partial table"):
+        run_pipeline(incremental=False, limit=100, shadow=True)
+
+
+def test_shadow_refresh_also_locks_the_live_model(monkeypatch):
+    attempted = []
+
+    @contextmanager
+    def connection(**kwargs):
+        yield _RecordingConnection()
+
+    def acquire(conn, model_id):
+        attempted.append(model_id)
+        return not model_id.endswith("MiniLM-L6-v2")  # an incremental run holds the live lock
+
+    monkeypatch.setattr(embedding_pipeline_v2, "get_settings", lambda: SimpleNamespace(
+        ml=SimpleNamespace(embedding_model="all-MiniLM-L6-v2")))
+    monkeypatch.setattr(embedding_pipeline_v2, "get_postgres_connection", connection)
+    monkeypatch.setattr(embedding_pipeline_v2, "acquire_pipeline_lock", acquire)
+
+    with pytest.raises(RuntimeError, match="retry the shadow refresh"):
+        run_pipeline(incremental=False, shadow=True)
+    assert attempted == ["all-MiniLM-L6-v2:shadow", "all-MiniLM-L6-v2"]
+
+
+def test_swap_replays_live_changes_under_lock_before_renaming(monkeypatch):
+    conn = _RecordingConnection()
+
+    @contextmanager
+    def connection(**kwargs):
+        yield conn
+
+    monkeypatch.setattr(embedding_index, "get_postgres_connection", connection)
+
+    assert embedding_index.swap_shadow_table() == 3
+
+    statements = conn.statements
+    lock = next(i for i, s in enumerate(statements) if "EXCLUSIVE MODE" in s)
+    replay = next(i for i, s in enumerate(statements) if "INSERT INTO" in s)
+    first_rename = next(i for i, s in enumerate(statements) if "RENAME TO" in s)
+    assert lock < replay < first_rename
+    assert "product_embeddings_shadow" in statements[replay]
+
+
+def test_failed_upsert_keeps_the_pre_chunk_cursor(monkeypatch):
+    start = datetime(2026, 10, 1)
+    products = [
+        {"product_id": pid, "updated_at": datetime(2026, 10, 2), "name": f"Колодка {pid}"}
+        for pid in (11, 12, 13, 14)
+    ]
+    saved = []
+    upserted = []
+
+    @contextmanager
+    def connection(**kwargs):
+        yield _RecordingConnection()
+
+    def upsert(product_ids, embeddings, checkpoint, version, table):
+        upserted.append(checkpoint.last_product_id)
+        if len(upserted) == 2:
+            raise RuntimeError("server closed the connection unexpectedly")
+
+    monkeypatch.setattr(embedding_pipeline_v2, "get_settings", lambda: SimpleNamespace(ml=SimpleNamespace(
+        embedding_model="all-MiniLM-L6-v2", embedding_chunk_size=2, batch_size=2)))
+    monkeypatch.setattr(embedding_pipeline_v2, "get_postgres_connection", connection)
+    monkeypatch.setattr(embedding_pipeline_v2, "acquire_pipeline_lock", lambda conn, model_id: True)
+    monkeypatch.setattr(embedding_pipeline_v2, "detect_device", lambda: "cpu")
+    monkeypatch.setattr(embedding_pipeline_v2, "load_model", lambda device: None)
+    monkeypatch.setattr(embedding_pipeline_v2, "resolve_checkpoint", lambda incremental, model_id: PipelineCheckpoint(
+        run_id="run-1", model_id=model_id, run_mode="incremental", source_watermark=start, last_product_id=10))
+    monkeypatch.setattr(embedding_pipeline_v2, "fetch_products_incremental", lambda **kwargs: products)
+    monkeypatch.setattr(embedding_pipeline_v2, "process_batch", lambda chunk, model, batch_size, metrics: (
+        [p["product_id"] for p in chunk], [[0.0] for _ in chunk]))
+    monkeypatch.setattr(embedding_pipeline_v2, "upsert_embeddings_batch", upsert)
+    monkeypatch.setattr(embedding_pipeline_v2, "save_checkpoint",
+                        lambda checkpoint: saved.append((checkpoint.status, checkpoint.last_product_id,
+                                                         checkpoint.products_committed)))
+
+    with pytest.raises(RuntimeError, match="connection"):
+        run_pipeline(incremental=True)
+
+    assert upserted == [12, 14]
+    assert saved[-1] == ("failed", 12, 2)
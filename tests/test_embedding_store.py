@@ -0,0 +1,144 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from src.ml import embedding_store
+from src.ml.embedding_store import (
+    activate_version,
+    build_version_index,
+    get_active_embeddings_table,
+    get_active_version,
+    register_version,
+    version_table_name,
+)
+
+
+class FakeRegistry:
+    """Just enough of the version registry tables for embedding_store"""
+
+    def __init__(self):
+        self.versions = {}
+        self.active = None
+        self.statements = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def execute(self, query, params=()):
+        text = " ".join(str(query).split())
+        self.db.statements.append(text)
+        versions = self.db.versions
+        self.result = []
+
+        if "INSERT INTO analytics_features.embedding_model_versions" in text:
+            model_version, model_name, dim, table = params
+            versions.setdefault(model_version, {
+                "model_version": model_version, "model_name": model_name,
+                "embedding_dim": dim, "table_name": table, "status": "building",
+            })
+        elif "FROM analytics_features.embedding_active_version" in text:
+            if self.db.active:
+                self.result = [versions[self.db.active]]
+        elif "FROM analytics_features.embedding_model_versions WHERE model_version" in text:
+            self.result = [versions[params[0]]] if params[0] in versions else []
+        elif "SET status = 'ready' WHERE status = 'active'" in text:
+            for row in versions.values():
+                if row["status"] == "active" and row["model_version"] != params[0]:
+                    row["status"] = "ready"
+        elif "SET status = 'active'" in text:
+            versions[params[0]]["status"] = "active"
+        elif "SET status = 'ready', ready_at" in text:
+            if versions[params[0]]["status"] == "building":
+                versions[params[0]]["status"] = "ready"
+        elif "INSERT INTO analytics_features.embedding_active_version" in text:
+            self.db.active = params[0]
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    db = FakeRegistry()
+
+    @contextmanager
+    def connection(**kwargs):
+        yield db
+
+    settings = SimpleNamespace(ml=SimpleNamespace(
+        embedding_model="sentence-transformers/all-MiniLM-L6-v2",
+        embedding_dimension=384,
+    ))
+    monkeypatch.setattr(embedding_store, "get_postgres_connection", connection)
+    monkeypatch.setattr(embedding_store, "get_settings", lambda: settings)
+    monkeypatch.setitem(embedding_store._active_cache, "expires_at", 0.0)
+    return db
+
+
+def test_register_creates_version_table_and_is_idempotent(registry):
+    version = register_version("MiniLM-Q8 2026.10")
+
+    assert version.table_name == version_table_name("MiniLM-Q8 2026.10") == "product_embeddings_minilm_q8_2026_10"
+    assert version.status == "building"
+    assert any("CREATE TABLE IF NOT EXISTS" in statement for statement in registry.statements)
+
+    assert register_version("MiniLM-Q8 2026.10") == version
+    with pytest.raises(ValueError):
+        register_version("MiniLM-Q8 2026.10", embedding_dim=768)
+
+
+def test_activate_swaps_pointer_and_resolves_active_table(registry):
+    assert get_active_version() is None
+    assert "product_embeddings'" in str(get_active_embeddings_table())
+
+    register_version("v1")
+    with pytest.raises(ValueError, match="build its index first"):
+        activate_version("v1")
+
+    registry.versions["v1"]["status"] = "ready"
+    activate_version("v1")
+    register_version("v2")
+    registry.versions["v2"]["status"] = "ready"
+    activate_version("v2")
+
+    assert registry.active == "v2"
+    assert registry.versions["v1"]["status"] == "ready"
+    assert get_active_version().model_version == "v2"
+    assert "product_embeddings_v2" in str(get_active_embeddings_table())
+
+
+def test_activate_rejects_version_built_with_another_encoder(registry):
+    register_version("mpnet-2026-10", model_name="sentence-transformers/all-mpnet-base-v2", embedding_dim=768)
+    registry.versions["mpnet-2026-10"]["status"] = "ready"
+
+    with pytest.raises(ValueError, match="queries are encoded with"):
+        activate_version("mpnet-2026-10")
+    assert registry.active is None
+
+    activate_version("mpnet-2026-10", "sentence-transformers/all-mpnet-base-v2", 768)
+    assert registry.active == "mpnet-2026-10"
+
+
+def test_build_index_drops_leftover_index_before_building(registry):
+    register_version("v1")
+
+    version = build_version_index("v1")
+
+    statements = [s for s in registry.statements if "INDEX CONCURRENTLY" in s]
+    assert "DROP INDEX CONCURRENTLY IF EXISTS" in statements[0]
+    assert "CREATE INDEX CONCURRENTLY" in statements[1] and "IF NOT EXISTS" not in statements[1]
+    assert version.status == "ready"
+
+    activate_version("v1")
+    with pytest.raises(ValueError, match="being served"):
+        build_version_index("v1")
@@ -0,0 +1,120 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+from src.ml import embedding_worker
+from src.ml.embedding_pipeline_v2 import build_text
+from src.ml.embedding_worker import BronzeCdcSource, MicroBatcher, parse_change_event, product_from_cdc
+
+
+def _envelope(op, after=None, before=None, ts_ms=1760000000000):
+    return {
+        "schema": {},
+        "payload": {
+            "op": op,
+            "before": before,
+            "after": after,
+            "source": {"ts_ms": ts_ms},
+        },
+    }
+
+
+def test_parse_change_event_handles_updates_and_deletes():
+    after = {"ID": 42, "Name": "Brake Pad Set", "Deleted": False}
+
+    update = parse_change_event(_envelope("u", after=after), position=7)
+    assert update.product_id == 42
+    assert update.deleted is False
+    assert update.after == after
+    assert update.source_ts_ms == 1760000000000
+
+    hard_delete = parse_change_event(_envelope("d", before={"ID": 42}), position=8)
+    assert hard_delete.product_id == 42
+    assert hard_delete.deleted is True
+
+    soft_delete = parse_change_event(_envelope("u", after={"ID": 42, "Deleted": True}), position=9)
+    assert soft_delete.deleted is True
+
+    assert parse_change_event(None, position=10) is None
+    assert parse_change_event(_envelope("u", after={"Name": "no id"}), position=11) is None
+
+
+def test_product_from_cdc_matches_dim_product_derivations():
+    product = product_from_cdc({
+        "ID": 42,
+        "VendorCode": "MG26823",
+        "Name": "Brake Pad Set",
+        "NameUA": "Колодки гальмівні",
+        "NamePL": None,
+        "Weight": 2.5,
+        "IsForSale": True,
+    })
+
+    assert product["product_id"] == 42
+    assert product["supplier_name"] == "MG26"
+    assert product["multilingual_status"] == "Partial"
+    assert product["weight_category"] == "Medium (1-10kg)"
+    assert "Supplier: MG26" in build_text(product)
+
+
+def test_micro_batcher_debounces_and_keeps_latest_change():
+    batcher = MicroBatcher(max_batch_size=10, debounce_seconds=2.0)
+    first = parse_change_event(_envelope("u", after={"ID": 1, "Name": "old"}), position=1)
+    second = parse_change_event(_envelope("u", after={"ID": 1, "Name": "new"}), position=2)
+
+    batcher.add([first], now=100.0)
+    batcher.add([second], now=101.0)
+
+    assert len(batcher) == 1
+    assert not batcher.ready(now=101.5)
+    assert batcher.ready(now=102.0)
+
+    drained = batcher.drain()
+    assert [event.after["Name"] for event in drained] == ["new"]
+    assert not batcher.ready(now=200.0)
+
+
+def test_micro_batcher_flushes_when_full():
+    batcher = MicroBatcher(max_batch_size=2, debounce_seconds=60.0)
+    events = [
+        parse_change_event(_envelope("c", after={"ID": product_id}), position=product_id)
+        for product_id in (1, 2)
+    ]
+
+    batcher.add(events, now=0.0)
+
+    assert batcher.ready(now=0.0)
+
+
+def test_bronze_source_follows_ingested_at_so_in_place_updates_are_seen(monkeypatch):
+    loaded = datetime(2026, 10, 19, 12, 0, 0)
+    reloaded = datetime(2026, 10, 19, 13, 0, 0)
+    calls = []
+
+    class Cursor:
+        def execute(self, query, params=None):
+            calls.append(params)
+
+        def fetchall(self):
+            if calls[-1]["position_ts"] == loaded:
+                # Row 5 was re-loaded in place: same id, later ingested_at
+                return [(5, _envelope("u", after={"ID": 42}), reloaded)]
+            return []
+
+    @contextmanager
+    def connection():
+        class Conn:
+            def cursor(self):
+                return Cursor()
+        yield Conn()
+
+    monkeypatch.setattr(embedding_worker, "get_postgres_connection", connection)
+    source = BronzeCdcSource.__new__(BronzeCdcSource)
+    source.lookback_seconds = 900.0
+    source.position, source.position_ts = 9, loaded
+
+    events = source.poll(100)
+
+    assert [event.product_id for event in events] == [42]
+    assert calls[0]["position"] == 9 and calls[0]["limit"] == 100
+    assert (source.position_ts, source.position) == (reloaded, 5)
+    assert source.poll(100) == []
@@ -0,0 +1,56 @@
+import pytest
+
+from src.ml.facet_index import FacetIndex
+
+# product_id, supplier_name, is_available, in_stock, is_for_sale, is_for_web, has_image
+ROWS = [
+    (10, "SEM1", True, True, True, True, False),
+    (20, "SEM1", False, False, True, False, True),
+    (30, "FEBI", True, True, False, True, True),
+    (40, "FEBI", True, True, True, True, True),
+    (50, None, False, False, False, False, False),
+]
+
+
+@pytest.fixture
+def index():
+    facet_index = FacetIndex()
+    assert facet_index.load_rows(reversed(ROWS)) == len(ROWS)
+    return facet_index
+
+
+def test_filter_ors_within_facet_and_ands_across(index):
+    candidates = [40, 10, 30, 20, 50, 99]
+
+    assert index.filter(candidates, {"supplier_name": {"SEM1"}}) == [10, 20]
+    assert index.filter(candidates, {"supplier_name": {"SEM1", "FEBI"}, "is_for_sale": {"true"}}) == [40, 10, 20]
+    assert index.filter(candidates, {"in_stock": {"true"}, "has_image": {"true"}}) == [40, 30]
+    assert index.filter(candidates, {"supplier_name": {"BOSCH"}}) == []
+    assert index.filter(candidates, {}) == candidates
+
+
+def test_facet_counts_are_disjunctive(index):
+    counts = index.facet_counts([10, 20, 30, 40, 50], {"supplier_name": {"SEM1"}})
+
+    # Supplier counts ignore the supplier filter itself
+    assert counts["supplier_name"] == {"FEBI": 2, "SEM1": 2}
+    # Other facets are counted within SEM1 only
+    assert counts["is_for_sale"] == {"true": 2}
+    assert counts["has_image"] == {"false": 1, "true": 1}
+
+
+def test_value_array_counts_match_posting_counts(index):
+    dense = FacetIndex(value_array_min_values=0)
+    dense.load_rows(ROWS)
+    candidates = [10, 20, 30, 40, 50, 99]
+
+    for filters in ({}, {"supplier_name": {"SEM1"}}, {"is_for_sale": {"true"}, "has_image": {"true"}}):
+        assert dense.facet_counts(candidates, filters) == index.facet_counts(candidates, filters)
+
+
+def test_matching_ids_cover_the_whole_catalogue(index):
+    filters = {"supplier_name": {"SEM1", "FEBI"}, "is_for_sale": {"true"}}
+
+    assert index.matching_ids(filters) == [10, 20, 40]
+    assert index.match_count(filters) == 3
+    assert index.matching_ids({}) == [10, 20, 30, 40, 50]
@@ -0,0 +1,72 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("kafka")
+pytest.importorskip("boto3")
+
+# ingestion modules import each other as top-level packages (run from src/)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from ingestion.services.kafka_bronze_router import bronze_table_for_topic, normalize_envelope
+from scripts.generate_product_staging_models import table_snake_case
+
+
+@pytest.mark.parametrize("topic, table", [
+    ("cord.dbo.Product", "product_cdc"),
+    ("cord.ConcordDb.dbo.ProductAvailability", "product_availability_cdc"),
+    ("cord.ConcordDb.dbo.ProductAvailabilityCartLimits", "product_availability_cart_limits_cdc"),
+    ("cord.ConcordDb.dbo.MeasureUnit", "measure_unit_cdc"),
+    ("cord.ConcordDb.dbo.ProductSKU", "product_sku_cdc"),
+    ("cord.ConcordDb.dbo.SKUProduct", "sku_product_cdc"),
+])
+def test_bronze_table_for_topic(topic, table):
+    assert bronze_table_for_topic(topic) == table
+
+
+@pytest.mark.parametrize("table", ["ProductAvailabilityCartLimits", "ProductSKU", "SKUProduct", "ProductSubGroup"])
+def test_router_and_staging_models_agree_on_bronze_tables(table):
+    # The generated staging models read the <model>_cdc tables the router writes
+    assert bronze_table_for_topic(f"cord.ConcordDb.dbo.{table}") == f"{table_snake_case(table)}_cdc"
+
+
+def test_bronze_table_for_topic_rejects_unsafe_names():
+    with pytest.raises(ValueError):
+        bronze_table_for_topic("cord.dbo.Product;DROP")
+    with pytest.raises(ValueError):
+        bronze_table_for_topic("cord.dbo.")
+
+
+def test_full_envelopes_pass_through():
+    envelope = {"schema": {"type": "struct"}, "payload": {"op": "c", "after": {"ID": 1}}}
+    assert normalize_envelope(envelope, 1760870400000) is envelope
+
+    bare = {"op": "u", "before": {"ID": 1}, "after": {"ID": 1, "Name": "Фільтр"}}
+    assert normalize_envelope(bare, None) == {"payload": bare}
+
+    assert normalize_envelope(None, 1760870400000) is None
+    assert normalize_envelope("raw", 1760870400000) == "raw"
+
+
+def test_flattened_rows_are_wrapped_and_deletes_rewritten():
+    updated = normalize_envelope(
+        {"ID": 5, "Name": "Колодка", "__op": "u", "__table": "Product", "__source_ts_ms": 1760870400123,
+         "__deleted": "false"},
+        1760870400999,
+    )
+    assert updated == {
+        "payload": {
+            "op": "u",
+            "before": None,
+            "after": {"ID": 5, "Name": "Колодка"},
+            "source": {"ts_ms": 1760870400123, "table": "Product"},
+        }
+    }
+
+    deleted = normalize_envelope({"ID": 5, "__op": "u", "__deleted": "true"}, 1760870400999)
+    assert deleted["payload"]["op"] == "d"
+    assert deleted["payload"]["after"] == {"ID": 5}
+    assert deleted["payload"]["source"] == {"ts_ms": 1760870400999, "table": None}
+
+    assert normalize_envelope({"ID": 6}, None)["payload"]["op"] == "u"
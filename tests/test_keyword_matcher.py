@@ -0,0 +1,34 @@
+import random
+
+from src.ml.keyword_matcher import KeywordMatcher
+
+
+def test_find_returns_overlapping_and_nested_keywords():
+    matcher = KeywordMatcher(["he", "she", "his", "hers", "she", "", "  "])
+
+    assert len(matcher) == 4
+    assert matcher.find("uSHErs") == ["she", "he", "hers"]
+    assert matcher.find("ahishers") == ["his", "she", "he", "hers"]
+    assert matcher.find("xyz") == []
+
+
+def test_matches_substring_semantics_on_cyrillic_keywords():
+    keywords = ["колодка", "гальмівн", "диск", "ск"]
+    matcher = KeywordMatcher(keywords)
+    query = "Колодка гальмівна та диск"
+
+    assert matcher.contains_any(query)
+    assert not matcher.contains_any("фільтр масляний")
+    assert sorted(matcher.find(query)) == sorted(k for k in keywords if k in query.lower())
+
+    rng = random.Random(7)
+    alphabet = "абвгдеск "
+    for _ in range(200):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert set(matcher.find(text)) == {k for k in keywords if k in text}
+
+
+def test_empty_matcher_matches_nothing():
+    matcher = KeywordMatcher([])
+    assert matcher.find("колодка") == []
+    assert not matcher.contains_any("колодка")
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("boto3")
+
+from src.ingestion.utils.landing_writer import envelope_row, record_from_row
+
+
+def _record(value, key='{"ID": 42}', headers=None):
+    return {
+        "topic": "cord.dbo.Product",
+        "partition": 3,
+        "offset": 1017,
+        "timestamp": 1760870400000,
+        "key": key,
+        "value": value,
+        "headers": headers or [],
+    }
+
+
+def test_debezium_envelope_round_trips_without_schema_block():
+    payload = {
+        "op": "u",
+        "ts_ms": 1760870400123,
+        "before": {"ID": 42, "Name": "Колодка"},
+        "after": {"ID": 42, "Name": "Колодка гальмівна"},
+        "source": {"ts_ms": 1760870400000, "table": "Product"},
+    }
+    record = _record({"schema": {"type": "struct"}, "payload": payload}, headers=[["trace", "abc"]])
+
+    row = envelope_row(record)
+    assert row["op"] == "u"
+    assert row["source_ts_ms"] == 1760870400000
+    assert row["raw_value"] is None
+
+    assert record_from_row(row) == _record({"payload": payload}, headers=[["trace", "abc"]])
+
+
+def test_tombstones_and_raw_values_round_trip():
+    tombstone = _record(None)
+    assert record_from_row(envelope_row(tombstone)) == tombstone
+
+    unwrapped = _record([1, 2, 3], key={"ID": 7})
+    restored = record_from_row(envelope_row(unwrapped))
+    assert restored["value"] == [1, 2, 3]
+    assert restored["key"] == '{"ID": 7}'
+
+    text = _record("not json")
+    assert record_from_row(envelope_row(text))["value"] == "not json"
@@ -0,0 +1,86 @@
+from src.ml.learned_ranker import (
+    FEATURE_NAMES,
+    LearnedRanker,
+    LinearRankingModel,
+    ProductFeatureStore,
+    skip_above_pairs,
+    train_pairwise,
+)
+
+
+def _row(product_id, popularity, for_sale=1.0):
+    features = [0.0] * len(FEATURE_NAMES)
+    features[FEATURE_NAMES.index("popularity_score")] = popularity
+    features[FEATURE_NAMES.index("is_for_sale")] = for_sale
+    return (product_id, *features)
+
+
+def _model(popularity_weight, blend=0.5):
+    weights = [0.0] * len(FEATURE_NAMES)
+    weights[FEATURE_NAMES.index("popularity_score")] = popularity_weight
+    return LinearRankingModel(
+        feature_names=list(FEATURE_NAMES),
+        means=[0.0] * len(FEATURE_NAMES),
+        scales=[1.0] * len(FEATURE_NAMES),
+        weights=weights,
+        blend=blend,
+    )
+
+
+def test_feature_store_looks_up_by_product_id():
+    store = ProductFeatureStore()
+    assert store.load_rows([_row(30, 0.9), _row(10, 0.1), _row(20, 0.5)]) == 3
+
+    assert store.features(20)[FEATURE_NAMES.index("popularity_score")] == 0.5
+    assert store.features(15) is None
+    assert store.features(99) is None
+
+
+def test_rerank_promotes_popular_product_within_budget():
+    store = ProductFeatureStore()
+    store.load_rows([_row(1, 0.0), _row(2, 1.0)])
+    ranker = LearnedRanker(_model(popularity_weight=5.0), store, budget_ms=1000)
+
+    rows = [
+        {"product_id": 1, "final_score": 100.0},
+        {"product_id": 2, "final_score": 90.0},
+        {"product_id": 3, "final_score": 80.0},  # not in the store: static score only
+    ]
+    assert ranker.rerank(rows) is True
+
+    rows.sort(key=lambda r: -r["final_score"])
+    assert [row["product_id"] for row in rows] == [2, 1, 3]
+    assert rows[0]["static_score"] == 90.0
+
+
+def test_rerank_falls_back_when_budget_exceeded_or_store_empty():
+    rows = [{"product_id": 1, "final_score": 10.0}, {"product_id": 2, "final_score": 5.0}]
+
+    empty = LearnedRanker(_model(1.0), ProductFeatureStore())
+    assert empty.rerank(rows) is False
+
+    store = ProductFeatureStore()
+    store.load_rows([_row(1, 0.0), _row(2, 1.0)])
+    strict = LearnedRanker(_model(1.0), store, budget_ms=0.0)
+    assert strict.rerank(rows) is False
+    assert strict.fallbacks == 1
+    assert rows[0]["final_score"] == 10.0 and "static_score" not in rows[0]
+
+
+def test_skip_above_pairs_and_pairwise_training():
+    impressions = [
+        (1, 100, 1, False),
+        (1, 200, 2, False),
+        (1, 300, 3, True),
+        (1, 400, 4, False),
+        (1, 500, 5, False),
+        (2, 100, 1, True),
+        (2, 200, 2, False),
+    ]
+    assert list(skip_above_pairs(impressions)) == [(300, 100), (300, 200), (300, 400), (100, 200)]
+
+    # Clicked products are always the more popular one
+    pairs = [([0.9, 0.0], [0.1, 0.0]), ([0.8, 1.0], [0.2, 1.0]), ([0.7, 0.0], [0.3, 1.0])] * 20
+    weights = train_pairwise(pairs, means=[0.5, 0.5], scales=[0.3, 0.5], epochs=5)
+    assert weights[0] > 0
+    assert abs(weights[0]) > abs(weights[1])
@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from src.ml.ltr_export import FEATURE_COLUMNS, SCHEMA, build_export_query, rows_to_table
+
+
+def test_export_query_selects_schema_columns_in_order():
+    query = build_export_query()
+    outer_select = query[query.rindex("SELECT"):]
+
+    positions = [outer_select.index(f"{name}") for name in SCHEMA.names]
+    assert positions == sorted(positions)
+    assert "unnest(ql.result_product_ids)" in query
+    assert "search_impression_log" in query
+    assert "EXISTS" in query
+    assert "EXISTS" not in build_export_query(only_clicked_queries=False)
+
+
+def test_rows_to_table_builds_typed_columns():
+    searched_at = datetime(2026, 10, 1, 12, 30, tzinfo=timezone.utc)
+    features = tuple(None for _ in FEATURE_COLUMNS)
+    rows = [
+        (7, searched_at, "колодки sem1", "natural_language", 42, 1001, 1, 2, True, True) + features,
+        (7, searched_at, "колодки sem1", "natural_language", 42, 1002, 2, 0, False, None) + features,
+    ]
+
+    table = rows_to_table(rows)
+
+    assert table.schema == SCHEMA
+    assert table.num_rows == 2
+    assert table.column("product_id").to_pylist() == [1001, 1002]
+    assert table.column("clicked").to_pylist() == [True, False]
+    assert table.column("viewed").to_pylist() == [True, None]
+    assert table.column("text_length").null_count == 2
+    assert rows_to_table([]).num_rows == 0
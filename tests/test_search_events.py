@@ -0,0 +1,122 @@
+import pytest
+
+from src.api.search_events import SearchEventWriter, build_event
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = -1
+
+    def execute(self, sql):
+        self.conn.statements.append(sql)
+        rows = self.conn.staged
+        if "search_click_log" in sql and "INSERT" in sql:
+            self.rowcount = self._valid(rows, "click")
+        elif "search_impression_log" in sql:
+            self.rowcount = self._valid(rows, "impression")
+        elif "search_feedback_log" in sql:
+            self.rowcount = self._valid(rows, "feedback")
+        else:
+            self.rowcount = -1
+
+    def _valid(self, rows, event_type):
+        return sum(1 for row in rows if row[0] == event_type and int(row[1]) in self.conn.known_searches)
+
+    def copy_expert(self, sql, stream, size=8192):
+        data = stream.read().decode("utf-8")
+        self.conn.staged = [line.split("\t") for line in data.splitlines()]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, known_searches):
+        self.known_searches = set(known_searches)
+        self.statements = []
+        self.staged = []
+        self.commits = 0
+        self.autocommit = True
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BrokenConnection(FakeConnection):
+    def cursor(self):
+        raise RuntimeError("server closed the connection unexpectedly")
+
+
+def test_build_event_checks_required_fields():
+    assert build_event("click", 7, product_id=42, rank_position=1).query_id == 7
+
+    with pytest.raises(ValueError):
+        build_event("view", 7, product_id=42)
+    with pytest.raises(ValueError):
+        build_event("impression", 7)
+    with pytest.raises(ValueError):
+        build_event("feedback", 7, feedback_type="great")
+
+
+def test_flush_writes_batch_in_one_transaction_and_counts_unknown_searches():
+    conn = FakeConnection(known_searches={1, 2})
+    writer = SearchEventWriter(lambda: conn, batch_size=100)
+
+    events = [build_event("impression", 1, product_id=p, rank_position=p) for p in range(1, 21)]
+    events.append(build_event("click", 1, product_id=3, rank_position=3))
+    events.append(build_event("click", 99, product_id=5, rank_position=5))
+    events.append(build_event("feedback", 2, feedback_type="helpful", feedback_comment="tab\there"))
+
+    assert writer.enqueue(events) == len(events)
+    assert writer.flush() == len(events)
+
+    assert conn.commits == 1
+    assert len(conn.staged) == len(events)
+    assert conn.staged[-1][5] == "tab\\there"
+    assert any("UPDATE analytics_features.search_query_log" in sql for sql in conn.statements)
+    assert writer.stats.written == 22
+    assert writer.stats.rejected == 1
+    assert writer.pending() == 0
+
+
+def test_enqueue_drops_when_queue_is_full():
+    writer = SearchEventWriter(lambda: FakeConnection(()), batch_size=10, max_queue=3)
+
+    accepted = writer.enqueue([build_event("click", 1, product_id=p) for p in range(5)])
+
+    assert accepted == 3
+    assert writer.stats.dropped == 2
+
+
+def test_failed_batch_is_retried_on_a_new_connection():
+    connections = iter([BrokenConnection(()), FakeConnection(known_searches={1})])
+    writer = SearchEventWriter(lambda: next(connections), batch_size=10)
+    writer.enqueue([build_event("click", 1, product_id=p) for p in range(3)])
+
+    assert writer.flush() == 0
+    assert writer.pending() == 3
+    assert writer.stats.failed == 0
+
+    assert writer.flush() == 3
+    assert writer.stats.written == 3
+    assert writer.pending() == 0
+
+
+def test_failed_batch_is_dropped_once_retries_are_exhausted():
+    writer = SearchEventWriter(lambda: BrokenConnection(()), batch_size=10, max_retries=1)
+    writer.enqueue([build_event("click", 1, product_id=p) for p in range(3)])
+
+    assert writer.flush() == 0
+    assert writer.flush() == 3
+    assert writer.stats.failed == 3
+    assert writer.pending() == 0
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from src.ml.facet_index import FacetIndex
+from src.ml.learned_ranker import ProductFeatureStore
+from src.ml.snapshot_refresh import SnapshotRefresh, fetch_tuples, load_and_refresh
+from src.ml.suggest_index import SuggestIndex
+from src.ml.typo_index import TypoIndex
+
+
+class FakeConnection:
+    def __init__(self, rows=None, fail=False):
+        self.rows = rows or []
+        self.fail = fail
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def fetchmany(self, size):
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+
+class CountingSnapshot(SnapshotRefresh):
+    refresh_label = "Counting snapshot"
+
+    def __init__(self):
+        self.loads = 0
+        self.snapshot = None
+        self.reloaded = threading.Event()
+
+    def load(self, conn) -> int:
+        if conn.fail:
+            raise RuntimeError("connection reset")
+        self.loads += 1
+        self.snapshot = list(conn.rows)
+        if self.loads > 1:
+            self.reloaded.set()
+        return len(self.snapshot)
+
+
+def test_fetch_tuples_reads_plain_and_dict_rows_in_chunks():
+    cursor = FakeCursor([(1, "a"), {"id": 2, "name": "b"}, (3, "c")])
+
+    assert list(fetch_tuples(cursor, fetch_size=2)) == [(1, "a"), (2, "b"), (3, "c")]
+
+
+def test_refresh_reloads_in_background_and_keeps_snapshot_on_failure():
+    connections = []
+
+    def connect():
+        # Second connection fails: the first snapshot must survive it
+        conn = FakeConnection(rows=[len(connections)], fail=len(connections) == 1)
+        connections.append(conn)
+        return conn
+
+    snapshot = load_and_refresh(CountingSnapshot(), connect, interval_seconds=0.01)
+    assert snapshot.snapshot == [0]
+
+    assert snapshot.reloaded.wait(2)
+    snapshot.stop_refresh()
+
+    assert snapshot.snapshot[0] >= 2
+    assert all(conn.closed for conn in connections)
+    assert snapshot._refresh_thread is None
+
+
+@pytest.mark.parametrize("query", [
+    lambda: FacetIndex().filter([1], {"supplier_name": {"SEM1"}}),
+    lambda: SuggestIndex().suggest("sem1"),
+    lambda: TypoIndex().candidates("SEM1BP010"),
+])
+def test_indexes_raise_until_first_load(query):
+    with pytest.raises(RuntimeError):
+        query()
+
+
+def test_feature_store_has_no_features_until_first_load():
+    store = ProductFeatureStore()
+    assert store.size == 0
+    assert store.features(1) is None
@@ -0,0 +1,84 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("pymssql")
+
+from src.transform.sqlserver_direct_loader import EnvelopeTemplate, Watermark, fetch_changed_rows
+
+
+class FakeSqlServer:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.executed = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=()):
+        self.executed.append((" ".join(sql.split()), params))
+
+    def fetchmany(self, size):
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+def test_watermark_predicates():
+    since = datetime(2026, 10, 1, 12, 0)
+
+    assert Watermark("dbo.Product", "Updated", "datetime").predicate() == ("", ())
+    assert Watermark("dbo.Product", "Updated", "datetime", since).predicate() == ("WHERE [Updated] >= %s", (since,))
+    assert Watermark("dbo.Product", "Updated", "datetime", since, fallback_column="Created").predicate() == (
+        "WHERE COALESCE([Updated], [Created]) >= %s", (since,)
+    )
+
+    assert Watermark("dbo.Product", "RowVersion", "rowversion").predicate() == (
+        "WHERE [RowVersion] < MIN_ACTIVE_ROWVERSION()", ()
+    )
+    assert Watermark("dbo.Product", "RowVersion", "rowversion", 1500).predicate() == (
+        "WHERE CAST([RowVersion] AS BIGINT) > %s AND [RowVersion] < MIN_ACTIVE_ROWVERSION()", (1500,)
+    )
+
+
+def test_rows_never_updated_advance_the_watermark_by_created():
+    columns = ["ID", "Created", "Updated"]
+    since = datetime(2026, 10, 1)
+    created = datetime(2026, 10, 3)
+    updated = datetime(2026, 10, 2)
+    source = FakeSqlServer([
+        (1, datetime(2026, 9, 1), updated, updated),
+        (2, created, None, created),
+    ])
+    watermark = Watermark("dbo.Product", "Updated", "datetime", since, fallback_column="Created")
+
+    batches = list(fetch_changed_rows(source, watermark, columns=columns, batch_size=1))
+
+    sql, params = source.executed[0]
+    assert sql.endswith("COALESCE([Updated], [Created]) FROM [dbo].[Product] WHERE COALESCE([Updated], [Created]) >= %s")
+    assert params == (since,)
+    assert [row["ID"] for batch in batches for row in batch] == [1, 2]
+    assert watermark.value == created
+    assert watermark.rows_loaded == 2
+
+
+def test_envelope_template_matches_full_serialization():
+    updated = datetime(2026, 10, 1, 8, 30)
+    row = {"ID": 7, "Name": "Колодка", "Weight": Decimal("1.25"), "Updated": updated}
+
+    snapshot = json.loads(EnvelopeTemplate().render(row))
+    assert snapshot["payload"]["after"] == {
+        "ID": 7, "Name": "Колодка", "Weight": 1.25, "Updated": int(updated.timestamp() * 1000),
+    }
+    assert snapshot["payload"]["op"] == "r"
+    assert snapshot["payload"]["source"]["snapshot"] == "true"
+    assert snapshot["schema"]["name"] == "cord.ConcordDb.dbo.Product.Envelope"
+
+    delta = json.loads(EnvelopeTemplate(table="Client", op="u").render({"ID": 1}))
+    assert delta["payload"]["op"] == "u"
+    assert delta["payload"]["source"]["snapshot"] == "false"
+    assert delta["payload"]["source"]["table"] == "Client"
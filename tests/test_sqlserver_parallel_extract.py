@@ -0,0 +1,79 @@
+import sqlite3
+from datetime import datetime, timezone
+from uuid import UUID
+
+import pytest
+
+from src.transform.sqlserver_parallel_extract import ParallelExtractor, convert_batch, plan_ranges
+
+COLUMNS = ("ID", "Name", "Image", "Updated")
+
+
+def _sqlite_source(tmp_path, ids):
+    path = str(tmp_path / "source.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Product (ID INTEGER PRIMARY KEY, Name TEXT, Image BLOB, Updated TEXT)")
+    conn.executemany(
+        "INSERT INTO Product VALUES (?, ?, ?, ?)",
+        [(i, f"Product {i}", b"\x00\x01", None) for i in ids],
+    )
+    conn.commit()
+    conn.close()
+    return lambda: sqlite3.connect(path, check_same_thread=False)
+
+
+def test_plan_ranges_covers_id_space_without_overlap():
+    ranges = plan_ranges(10, 1009, total_rows=1000, workers=3, rows_per_range=100)
+
+    assert ranges[0][0] == 10
+    assert ranges[-1][1] == 1009
+    assert len(ranges) >= 10
+    for (_, prev_end), (start, _) in zip(ranges, ranges[1:]):
+        assert start == prev_end + 1
+
+    assert plan_ranges(None, None, 0, workers=4) == []
+    assert plan_ranges(5, 5, 1, workers=4) == [(5, 5)]
+
+
+def test_convert_batch_encodes_sqlserver_types():
+    updated = datetime(2025, 10, 19, tzinfo=timezone.utc)
+    net_uid = UUID("12345678-1234-5678-1234-567812345678")
+
+    batch = convert_batch(
+        ("ID", "Updated", "NetUID", "Image"),
+        [(1, None, None, None), (2, updated, net_uid, b"\xff")],
+    )
+
+    assert batch[0] == {"ID": 1, "Updated": None, "NetUID": None, "Image": None}
+    assert batch[1] == {
+        "ID": 2,
+        "Updated": int(updated.timestamp() * 1000),
+        "NetUID": str(net_uid),
+        "Image": "/w==",
+    }
+
+
+def test_parallel_extractor_reads_every_row_once(tmp_path):
+    ids = list(range(1, 500)) + list(range(10000, 10050))
+    connect = _sqlite_source(tmp_path, ids)
+
+    extractor = ParallelExtractor(
+        connect, table="Product", columns=COLUMNS, workers=3,
+        batch_size=40, queue_size=2, placeholder="?", rows_per_range=100,
+    )
+    rows = [row for batch in extractor.batches() for row in batch]
+
+    assert sorted(row["ID"] for row in rows) == ids
+    assert rows[0]["Image"] == "AAE="
+    assert sum(stats.rows for stats in extractor.stats) == len(ids)
+    assert extractor.total_rows == len(ids)
+
+
+def test_parallel_extractor_propagates_worker_errors(tmp_path):
+    connect = _sqlite_source(tmp_path, range(1, 50))
+
+    extractor = ParallelExtractor(
+        connect, table="Product", columns=("ID", "Missing"), workers=2, placeholder="?",
+    )
+    with pytest.raises(sqlite3.OperationalError):
+        list(extractor.batches())
@@ -0,0 +1,36 @@
+import pytest
+
+from src.ml.suggest_index import SuggestIndex, suggest_key
+
+ENTRIES = [
+    ("SEM1-BP-001", "vendor_code", 0.2),
+    ("SEM1BP002", "vendor_code", 0.9),
+    ("SEM1 BP 001", "original_number", 0.0),  # same key as SEM1-BP-001, lower weight
+    ("sem1 brake pads", "query", 0.5),
+    ("FEBI-1234", "vendor_code", 1.0),
+    ("гальмівні колодки", "keyword", 1.0),
+    ("", "keyword", 1.0),
+]
+
+
+@pytest.fixture
+def index():
+    suggest_index = SuggestIndex()
+    assert suggest_index.load_entries(ENTRIES) == 5
+    return suggest_index
+
+
+def test_suggest_ranks_prefix_matches_by_weight(index):
+    suggestions = index.suggest("sem1-b")
+
+    assert [s.text for s in suggestions] == ["SEM1BP002", "sem1 brake pads", "SEM1-BP-001"]
+    assert [s.kind for s in suggestions] == ["vendor_code", "query", "vendor_code"]
+    assert suggestions[1].score == pytest.approx(1.5)
+
+
+def test_suggest_normalizes_prefix_and_respects_limit(index):
+    assert suggest_key(" Sem1 / BP.0 ") == "sem1bp0"
+    assert [s.text for s in index.suggest("SEM1 BP 0", limit=1)] == ["SEM1BP002"]
+    assert [s.text for s in index.suggest("ГАЛЬМ")] == ["гальмівні колодки"]
+    assert index.suggest("bosch") == []
+    assert index.suggest(" - ") == []
@@ -0,0 +1,40 @@
+import pytest
+
+from src.ml.typo_index import TypoIndex, damerau_distance
+
+ENTRIES = [
+    ("SEM1-BP-010", 0.2),
+    ("SEM1-BP-011", 0.9),
+    ("FEBI-12345678", 0.5),
+    ("колодка", 1.0),
+    ("abc", 1.0),  # shorter than min_term_length
+]
+
+
+@pytest.fixture
+def index():
+    typo_index = TypoIndex(max_distance=2)
+    assert typo_index.load_entries(ENTRIES) == 4
+    return typo_index
+
+
+def test_damerau_distance_counts_transposition_as_one_edit():
+    assert damerau_distance("SEM1BP010", "SEM1BP100", 2) == 1
+    assert damerau_distance("SEM1BP010", "SEM1BP0", 2) == 2
+    assert damerau_distance("SEM1BP010", "XXX", 2) == 3
+
+
+def test_candidates_find_substitution_transposition_and_exact(index):
+    # Substitution: both codes are one edit away, the more popular comes first
+    assert [c.text for c in index.candidates("sem1bp01x")] == ["SEM1-BP-011", "SEM1-BP-010"]
+    # Transposition past the indexed prefix
+    assert [(c.text, c.distance) for c in index.candidates("FEBI-12345687")] == [("FEBI-12345678", 1)]
+    # Exact match short-circuits
+    assert [(c.text, c.distance) for c in index.candidates("sem1 bp 011")] == [("SEM1-BP-011", 0)]
+    assert index.candidates("ZZZZ9999") == []
+
+
+def test_correct_query_replaces_unknown_terms_only(index):
+    assert index.correct_query("колодкa FEBI12435687") == "колодка FEBI-12345678"
+    assert index.correct_query("колодка SEM1-BP-011") is None
+    assert index.correct_query("abc") is None